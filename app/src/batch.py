@@ -0,0 +1,54 @@
+import os
+import traceback
+from functools import partial
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# Falha de um documento: o item de entrada e a mensagem de erro (com traceback)
+BatchFailure = namedtuple("BatchFailure", ["item", "error"])
+
+def _guarded(func, item):
+    """Executa func(item) devolvendo (ok, resultado ou erro) em vez de propagar a exceção"""
+    try:
+        return True, func(item)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+
+def run_batch(func, items, workers=None, chunksize=1):
+    """Executa func sobre cada item em um pool de processos.
+
+    Os resultados voltam na mesma ordem dos itens, independentemente da ordem
+    de conclusão, para que as saídas sejam determinísticas. Uma exceção em um
+    documento não interrompe os demais: ela é devolvida em `failures`.
+    `func` precisa ser uma função de módulo (serializável pelo pickle).
+
+    Retorna (results, failures), onde results é uma lista de (item, resultado)
+    apenas dos itens bem-sucedidos.
+    """
+    items = list(items)
+    workers = workers or os.cpu_count() or 1
+    task = partial(_guarded, func)
+
+    # Sem ganho em abrir processos para um único documento
+    if workers == 1 or len(items) <= 1:
+        outcomes = map(task, items)
+        return _collect(items, outcomes)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        outcomes = list(executor.map(task, items, chunksize=chunksize))
+    return _collect(items, outcomes)
+
+def _collect(items, outcomes):
+    results, failures = [], []
+    for item, (ok, value) in zip(items, outcomes):
+        if ok:
+            results.append((item, value))
+        else:
+            failures.append(BatchFailure(item, value))
+    return results, failures
+
+def report_failures(failures):
+    """Exibe as falhas por documento"""
+    for failure in failures:
+        error = failure.error.splitlines()[0]
+        print(f"[✘] Falha ao processar {failure.item}: {error}")
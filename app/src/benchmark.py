@@ -0,0 +1,269 @@
+import os
+import sys
+import json
+import time
+import math
+import random
+import argparse
+import platform
+import tempfile
+from paths import data_path
+from preprocess_legislation import extract_articles, extract_publication_date
+from preprocess_references import process_content, tag_references
+from legislation_map import extract_legislation_references, analyze_file
+
+BENCHMARK_DIR = data_path("benchmarks")
+DEFAULT_SIZES = (0.25, 1.0, 4.0)  # Tamanho dos textos sintéticos, em MB
+DEFAULT_REPEAT = 3
+REGRESSION_THRESHOLD = 0.10  # Lentidão relativa ao baseline considerada regressão
+MIN_SECONDS = 1e-6  # Tempos do baseline abaixo disso (ex.: arredondados para 0) não servem de referência
+
+MONTHS = ["janeiro", "fevereiro", "março", "abril", "maio", "junho", "julho", "agosto",
+          "setembro", "outubro", "novembro", "dezembro"]
+
+# Cabeçalhos nos formatos de data de DATE_PATTERNS
+HEADERS = [
+    "RESOLUÇÃO DA DIRETORIA COLEGIADA - RDC Nº {n}, DE {d} DE {MONTH} DE {y}",
+    "RESOLUÇÃO - RE Nº {n}, DE {dd}/{mm}/{y}",
+    "PORTARIA Nº {n}, DE {d} DE {MONTH} DE {y}",
+    "INSTRUÇÃO NORMATIVA - IN Nº {n}, DE {d} DE {MONTH} DE {y}",
+    "NOTA TÉCNICA CONJUNTA {nn}/{y} - GGMED/ANVISA {d}, de {month} de {y}",
+]
+
+# Citações em todas as formas de legislation_map.CITATION_FORMS e de preprocess_references.REFERENCE_PATTERNS
+CITATIONS = [
+    "RDC nº {n}/{y}",
+    "RDC nº {n}, de {d} de {month} de {y}",
+    "RDC nº {n}, de {d} de {month}, de {y}",
+    "RE nº {n}, de {d} de {month}, de {y}",
+    "Lei nº {n}, de {d} de {month} de {y}",
+    "Lei nº {n}/{y}",
+    "Lei nº {thousands}, de {d} de {month} de {y}",
+    "IN nº {n}/{y}",
+    "Instrução Normativa nº {n}, de {d} de {month} de {y}",
+    "Instrução Normativa nº {n}/{y}",
+    "Portaria nº {n}/{y}",
+    "Portaria nº {n}/MS",
+    "Portaria nº {n} da ANVISA, de {d} de {month} de {y}",
+    "Nota Técnica Conjunta {nn}/{y} - GGMED/ANVISA, de {d} de {month} de {y}",
+    "Nota Técnica nº {nn}-{nnn}/{y}",
+    "RDC n° {n}/{y}",
+    "Resolução da Diretoria Colegiada nº {n}, de {d} de {month} de {y}",
+    "Resolução RDC nº {n} DE {dd}/{mm}/{y}",
+    "Resolução ANVISA/DC Nº {n} DE {dd}/{mm}/{y}",
+    "Decreto nº {thousands}, de {d} de {month} de {y}",
+    "Constituição da República Federativa do Brasil, de 5 de outubro de 1988",
+]
+
+# Termos de relação de legislation_map (revoga, complementa, cita)
+CLAUSES = [
+    "Fica revogada a {citation}.",
+    "Esta Resolução complementa a {citation}, no que couber.",
+    "Os requisitos devem ser cumpridos conforme {citation}.",
+    "Aplica-se o disposto nos termos da {citation}.",
+    "Esta norma não substitui a {citation}.",
+    "Os procedimentos de fabricação devem ser validados e registrados pelo responsável técnico.",
+    "O estabelecimento deve manter documentação atualizada das etapas de produção e controle de qualidade.",
+]
+
+# Art\.\s*\d{1,3} (preprocess_legislation.TOP_MARKER) só reconhece artigos até 999; textos maiores
+# têm unidades mais longas (mais frases), não mais artigos
+MAX_ARTICLES = 999
+UNIT_BYTES = 500  # Tamanho médio aproximado de um artigo com uma frase por unidade
+
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X", "XI", "XII", "XIII", "XIV", "XV"]
+
+def _fill(template, rng):
+    day, month, year = rng.randint(1, 28), rng.randint(1, 12), rng.randint(1976, 2024)
+    return template.format(
+        n=rng.randint(1, 999), nn=f"{rng.randint(1, 99):02d}", nnn=f"{rng.randint(1, 999):03d}",
+        thousands=f"{rng.randint(1, 12)}.{rng.randint(0, 999):03d}", d=day, dd=f"{day:02d}", mm=f"{month:02d}",
+        month=MONTHS[month - 1], MONTH=MONTHS[month - 1].upper(), y=year,
+    )
+
+def _sentence(rng, citation_rate, count=1):
+    clauses = []
+    for _ in range(count):
+        clause = rng.choice(CLAUSES[:5]) if rng.random() < citation_rate else rng.choice(CLAUSES[5:])
+        clauses.append(clause.format(citation=_fill(rng.choice(CITATIONS), rng)))
+    return " ".join(clauses)
+
+def generate_legislation(size_mb=1.0, seed=0, citation_rate=0.5):
+    """Gera um texto sintético no formato das normas da ANVISA com cerca de size_mb MB.
+
+    O texto tem cabeçalho datado, CAPÍTULOs, Seções, artigos com parágrafos
+    (§ e Parágrafo único) e incisos, ANEXOs no final e citações em todas as
+    formas que os padrões dos estágios reconhecem; citation_rate é a fração
+    de frases com citação. A saída é determinística para o mesmo seed.
+    No máximo MAX_ARTICLES artigos são gerados: acima de ~0.5 MB cada
+    caput, parágrafo e inciso recebe mais frases, e o que faltar para o
+    tamanho pedido vai para os ANEXOs.
+    Retorna (texto, número de artigos).
+    """
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    lines = [_fill(rng.choice(HEADERS), rng), "Dispõe sobre as Boas Práticas de Fabricação de Medicamentos."]
+    size = sum(len(line.encode("utf-8")) + 1 for line in lines)
+    articles = 0
+    per_unit = max(1, math.ceil(target / (MAX_ARTICLES * UNIT_BYTES)))  # Frases por unidade
+
+    def sentence():
+        return _sentence(rng, citation_rate, per_unit)
+
+    def add(line):
+        nonlocal size
+        lines.append(line)
+        size += len(line.encode("utf-8")) + 1
+
+    chapter = 0
+    while size < target and articles < MAX_ARTICLES:
+        chapter += 1
+        add(f"CAPÍTULO {ROMAN[(chapter - 1) % len(ROMAN)]}")
+        add("DAS DISPOSIÇÕES GERAIS")
+        for section in range(1, rng.randint(2, 4)):
+            add(f"Seção {ROMAN[section - 1]}")
+            add("Dos Requisitos")
+            for _ in range(min(rng.randint(3, 8), MAX_ARTICLES - articles)):
+                articles += 1
+                marker = f"Art. {articles}º" if articles < 10 else f"Art. {articles}."
+                add(f"{marker} {sentence()}")
+                for i in range(rng.choice((0, 0, 3, 5))):
+                    add(f"{ROMAN[i]} - {sentence()[:-1]};")
+                paragraphs = rng.choice((0, 1, 2, 3))
+                if paragraphs == 1:
+                    add(f"Parágrafo único. {sentence()}")
+                    continue
+                for p in range(1, paragraphs + 1):
+                    add(f"§ {p}º {sentence()}")
+                    for i in range(rng.choice((0, 2))):
+                        add(f"{ROMAN[i]} - {sentence()[:-1]};")
+
+    for annex in range(3):
+        add(f"ANEXO {ROMAN[annex]}")
+        add(sentence())
+        while annex == 2 and size < target:  # Completa o tamanho se o limite de artigos foi atingido antes
+            add(sentence())
+    return "\n".join(lines) + "\n", articles
+
+def _best_time(func, repeat, setup=None):
+    """Menor tempo de parede entre `repeat` execuções (menos sensível a ruído que a média)"""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _format(value):
+    return "-" if value is None else f"{value:.1f}"
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, seed=0):
+    """Mede cada estágio sobre textos sintéticos de cada tamanho.
+
+    Retorna {"meta": {...}, "results": {"<função>@<tamanho>MB": {seconds, mb_per_s, us_per_article}}}.
+    O cache de tag_references é limpo antes de cada repetição, para que
+    process_content seja medido a frio.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size_mb in sizes:
+            text, article_count = generate_legislation(size_mb, seed)
+            megabytes = len(text.encode("utf-8")) / (1024 * 1024)
+            # analyze_file recebe o caminho de um texto, como em analyze_legislation_references
+            text_path = os.path.join(tmp_dir, f"RDC_{int(size_mb * 1000)}_2024.txt")
+            with open(text_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            articles = extract_articles(text)
+
+            cases = [
+                ("extract_publication_date", lambda: extract_publication_date(text), None),
+                ("extract_articles", lambda: extract_articles(text), None),
+                ("process_content", lambda: process_content(articles), tag_references.cache_clear),
+                ("extract_legislation_references", lambda: extract_legislation_references(text), None),
+                ("analyze_file", lambda: analyze_file(text_path), None),
+            ]
+            for name, func, setup in cases:
+                seconds = _best_time(func, repeat, setup)
+                result = results[f"{name}@{size_mb:g}MB"] = {
+                    "seconds": seconds,
+                    "mb_per_s": megabytes / seconds if seconds else None,
+                    "us_per_article": seconds * 1e6 / article_count if article_count else None,
+                }
+                print(f"[✔] {name} ({size_mb:g} MB, {article_count} artigos): {seconds * 1000:.1f} ms, "
+                      f"{_format(result['mb_per_s'])} MB/s, {_format(result['us_per_article'])} µs/artigo")
+
+    meta = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sizes": list(sizes),
+        "repeat": repeat,
+        "seed": seed,
+    }
+    return {"meta": meta, "results": results}
+
+def save_results(report, name, benchmark_dir=BENCHMARK_DIR):
+    """Grava o resultado como <benchmark_dir>/<name>.json"""
+    os.makedirs(benchmark_dir, exist_ok=True)
+    path = os.path.join(benchmark_dir, f"{name}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    print(f"[✔] Resultados salvos em {path}")
+    return path
+
+def load_results(name, benchmark_dir=BENCHMARK_DIR):
+    with open(os.path.join(benchmark_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def compare_results(report, baseline, threshold=REGRESSION_THRESHOLD):
+    """Compara com um baseline; retorna a lista de medições mais lentas que o limite.
+
+    Cada linha mostra a razão tempo atual / tempo do baseline (< 1 é mais rápido).
+    Medições com tempo do baseline abaixo de MIN_SECONDS não são comparadas.
+    """
+    regressions = []
+    for key, current in report["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            print(f"[…] {key}: sem medição no baseline")
+            continue
+        if not previous["seconds"] or previous["seconds"] < MIN_SECONDS:
+            print(f"[…] {key}: tempo do baseline ({previous['seconds']} s) pequeno demais para comparar")
+            continue
+        ratio = current["seconds"] / previous["seconds"]
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            print(f"[✘] {key}: {ratio:.2f}x o baseline ({previous['seconds'] * 1000:.1f} -> {current['seconds'] * 1000:.1f} ms)")
+        else:
+            print(f"[✔] {key}: {ratio:.2f}x o baseline")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dos estágios de regex sobre um corpus sintético.")
+    parser.add_argument("--sizes", type=float, nargs="+", default=DEFAULT_SIZES, help="tamanhos dos textos, em MB")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="repetições por medição (vale a menor)")
+    parser.add_argument("--seed", type=int, default=0, help="semente do gerador")
+    parser.add_argument("--save", metavar="NOME", help=f"grava os resultados em {BENCHMARK_DIR}/NOME.json")
+    parser.add_argument("--compare", metavar="NOME", help="compara com um resultado gravado (ex.: baseline)")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="lentidão tolerada (0.10 = 10%%)")
+    parser.add_argument("--generate", metavar="ARQUIVO", help="apenas grava um texto sintético de --sizes[0] MB")
+    args = parser.parse_args(argv)
+
+    if args.generate:
+        text, article_count = generate_legislation(args.sizes[0], args.seed)
+        with open(args.generate, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[✔] Texto sintético gravado em {args.generate} ({article_count} artigos)")
+        return 0
+
+    report = run_benchmarks(args.sizes, args.repeat, args.seed)
+    if args.save:
+        save_results(report, args.save)
+    if args.compare:
+        return 1 if compare_results(report, load_results(args.compare), args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from paths import data_path
+
+BLOB_DIR = data_path("blobs")
+CHUNK_SIZE = 1 << 16
+
+class BlobStore:
+    """Armazena documentos brutos (PDF, HTML) pelo SHA-256 do conteúdo.
+
+    Estrutura em root:
+      objects/ab/cdef...   - conteúdo bruto, gravado uma única vez por hash
+      converted/ab/cdef... - texto convertido de cada blob (por versão de conversão)
+      refs.json            - nome lógico -> hash atual e histórico de versões
+
+    Conteúdos idênticos com nomes diferentes ocupam um único blob e são
+    convertidos uma única vez; versões antigas de um documento continuam
+    disponíveis pelo histórico.
+    """
+
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        self.refs_path = os.path.join(root, "refs.json")
+        self._lock = threading.Lock()
+        self._blob_locks = {}
+        self.refs = {}
+        if os.path.exists(self.refs_path):
+            with open(self.refs_path, "r", encoding="utf-8") as f:
+                self.refs = json.load(f)
+
+    def _path(self, kind, sha256, suffix=""):
+        return os.path.join(self.root, kind, sha256[:2], f"{sha256[2:]}{suffix}")
+
+    def path(self, sha256):
+        """Caminho do conteúdo bruto de um blob"""
+        return self._path("objects", sha256)
+
+    def has(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def put_stream(self, chunks):
+        """Grava os blocos de bytes como blob; retorna (sha256, tamanho, caminho).
+
+        O conteúdo é gravado em um arquivo temporário enquanto o hash é
+        calculado; se o blob já existe o temporário é descartado.
+        """
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        tmp_path = os.path.join(self.root, "tmp", f"{threading.get_ident()}-{time.monotonic_ns()}.part")
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            blob_path = self.path(sha256)
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(tmp_path, blob_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return sha256, size, blob_path
+
+    def put_bytes(self, data):
+        return self.put_stream([data])
+
+    def lock(self, sha256):
+        """Trava de um blob, para que conteúdos duplicados baixados ao mesmo tempo sejam convertidos uma vez"""
+        with self._lock:
+            return self._blob_locks.setdefault(sha256, threading.Lock())
+
+    def conversion_path(self, sha256, version):
+        return self._path("converted", sha256, f".v{version}.txt")
+
+    def get_conversion(self, sha256, version):
+        """Texto convertido do blob nessa versão da conversão, ou None"""
+        path = self.conversion_path(sha256, version)
+        return path if os.path.exists(path) else None
+
+    def put_conversion(self, sha256, version, text_path):
+        """Guarda uma cópia do texto convertido do blob"""
+        path = self.conversion_path(sha256, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        shutil.copyfile(text_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def ref(self, name, sha256, **fields):
+        """Aponta o nome lógico para o blob; uma versão nova entra no histórico"""
+        with self._lock:
+            entry = self.refs.setdefault(name, {"current": None, "history": []})
+            if entry["current"] != sha256:
+                entry["current"] = sha256
+                entry["history"].append({"sha256": sha256, **fields})
+
+    def resolve(self, name):
+        """Hash atual do nome lógico, ou None"""
+        with self._lock:
+            return self.refs.get(name, {}).get("current")
+
+    def history(self, name):
+        """Versões do documento, da mais antiga à atual"""
+        with self._lock:
+            return list(self.refs.get(name, {}).get("history", []))
+
+    def save(self):
+        """Grava as referências de forma atômica"""
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.refs_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.refs, f, indent=4, ensure_ascii=False, sort_keys=True)
+            os.replace(tmp_path, self.refs_path)
@@ -0,0 +1,246 @@
+import os
+import re
+import json
+import struct
+from array import array
+from collections import deque
+from paths import data_path
+
+LEGISLATION_MAP_PATH = data_path("legislation_map.json")
+GRAPH_PATH = data_path("citation_graph.bin")
+
+RELATIONS = ("revokes", "complements", "cites")
+DEFAULT_RELATION = "cites"  # Referência sem termo de relação
+
+# Tipos de ato com a mesma grafia das marcas {TYPE_NUMBER_YEAR} do corpus (preprocess_references.format_reference);
+# nomes de documents.json (RDC_658_2022, IN_3_2013, PORTARIA_696_2001) são normalizados para elas
+TYPE_ALIASES = [
+    (re.compile(r"Resolu[çc][ãa]o\s+(?:da\s+)?Diretoria\s+Colegiada(?:\s+da\s+Anvisa)?|(?:Resolu[çc][ãa]o\s+)?ANVISA/DC|RDC",
+                re.IGNORECASE), "RDC"),
+    (re.compile(r"Instru[çc][ãa]o\s+Normativa|IN", re.IGNORECASE), "IN"),
+    (re.compile(r"Nota\s+T[ée]cnica(?:\s+Conjunta)?|NT", re.IGNORECASE), "NT"),
+    (re.compile(r"Portaria", re.IGNORECASE), "Portaria"),
+    (re.compile(r"Decreto", re.IGNORECASE), "Decreto"),
+    (re.compile(r"Lei", re.IGNORECASE), "Lei"),
+    (re.compile(r"Resolu[çc][ãa]o\s+RE|RE", re.IGNORECASE), "RE"),
+    (re.compile(r"ConstituicaoFederal|Constitui[çc][ãa]o", re.IGNORECASE), "ConstituicaoFederal"),
+]
+
+# O tipo não pode estar colado a outras letras ("sobre 2020" não é um ato RE); "_" e dígitos
+# contam como separadores, para aceitar identificadores como RDC_658_2022
+CITATION_PATTERN = re.compile(
+    r"(?<![^\W\d_])(?P<type>Resolu[çc][ãa]o\s+(?:da\s+)?Diretoria\s+Colegiada(?:\s+da\s+Anvisa)?|"
+    r"(?:Resolu[çc][ãa]o\s+)?ANVISA/DC|Resolu[çc][ãa]o\s+RE|Instru[çc][ãa]o\s+Normativa|"
+    r"Nota\s+T[ée]cnica(?:\s+Conjunta)?|ConstituicaoFederal|RDC|RE|IN|NT|Lei|Portaria|Decreto)(?![^\W\d_])"
+    r"[\s_]*(?:n\s*[ºo°]?\.?\s*)?(?P<number>\d[\d.]*)",
+    re.IGNORECASE
+)
+YEAR_PATTERN = re.compile(r"(?<!\d)(\d{4})(?!\d)")
+
+MAGIC = b"SYNG"
+VERSION = 1
+
+def reference_id(doc_type, number, year=None):
+    """Id TYPE_NUMBER_YEAR (ou TYPE_NUMBER) de um ato: o mesmo usado nos nós do grafo e nas marcas do corpus"""
+    doc_type = next(canonical for pattern, canonical in TYPE_ALIASES if pattern.fullmatch(doc_type))
+    number = str(int(number.replace(".", "")))  # "6.437" -> "6437", "06" -> "6"
+    return f"{doc_type}_{number}_{year}" if year else f"{doc_type}_{number}"
+
+def canonical_id(citation):
+    """Normaliza uma citação ("RDC nº 17/2010", "PORTARIA_344_1998", "{Portaria_344_1998}") para TYPE_NUMBER_YEAR.
+
+    Retorna None se a citação não tiver tipo e número reconhecíveis.
+    """
+    match = CITATION_PATTERN.search(citation)
+    if not match:
+        return None
+    year = YEAR_PATTERN.search(citation, match.end("number"))
+    return reference_id(match.group("type"), match.group("number"), year.group(1) if year else None)
+
+def _yearless(node_name):
+    """TYPE_NUMBER de um id TYPE_NUMBER_YEAR; None para ids sem ano"""
+    parts = node_name.split("_")
+    return "_".join(parts[:2]) if len(parts) == 3 and YEAR_PATTERN.fullmatch(parts[2]) else None
+
+def _unique_by_number(names):
+    """{TYPE_NUMBER: TYPE_NUMBER_YEAR} para os números com um único ato com ano entre os nomes"""
+    candidates = {}
+    for name in names:
+        key = _yearless(name)
+        if key is not None:
+            candidates.setdefault(key, []).append(name)
+    return {key: found[0] for key, found in candidates.items() if len(found) == 1}
+
+def _csr(node_count, edges):
+    """Monta (indptr, indices) a partir de pares (origem, destino) sem duplicatas"""
+    edges = sorted(set(edges))
+    indptr = array("I", [0] * (node_count + 1))
+    indices = array("I", (target for _, target in edges))
+    for source, _ in edges:
+        indptr[source + 1] += 1
+    for i in range(node_count):
+        indptr[i + 1] += indptr[i]
+    return indptr, indices
+
+class CitationGraph:
+    """Grafo de citações com ids inteiros e adjacência CSR por tipo de relação.
+
+    Para cada relação (revokes, complements, cites) há a adjacência direta
+    (quem o nó cita) e a reversa (quem cita o nó).
+    """
+
+    def __init__(self, names, in_corpus, adjacency):
+        self.names = names
+        self.ids = {name: i for i, name in enumerate(names)}
+        self.in_corpus = in_corpus
+        self.adjacency = adjacency  # {(relação, reversa): (indptr, indices)}
+        self._in_force = None
+        self._by_number = None
+
+    @classmethod
+    def from_legislation_map(cls, legislation_map):
+        """Constrói o grafo a partir do dicionário de legislation_map.json"""
+        names = []
+        ids = {}
+
+        def node(name):
+            if name not in ids:
+                ids[name] = len(names)
+                names.append(name)
+            return ids[name]
+
+        for legislation_name in legislation_map:
+            node(canonical_id(legislation_name) or legislation_name)
+        corpus_size = len(names)
+        # Citações sem ano ("Portaria nº 696/MS") apontam para o ato do corpus quando só há um com esse tipo e número
+        by_number = _unique_by_number(names)
+
+        edges = {relation: [] for relation in RELATIONS}
+        for legislation_name, data in legislation_map.items():
+            source = node(canonical_id(legislation_name) or legislation_name)
+            for entry in data["references"]:
+                matches, category = entry[0], entry[2] or DEFAULT_RELATION
+                for citation in matches:
+                    target_name = canonical_id(citation)
+                    if target_name is None:
+                        continue
+                    target = node(by_number.get(target_name, target_name))
+                    if target != source:
+                        edges[category].append((source, target))
+
+        in_corpus = bytearray(1 if i < corpus_size else 0 for i in range(len(names)))
+        adjacency = {}
+        for relation, pairs in edges.items():
+            adjacency[(relation, False)] = _csr(len(names), pairs)
+            adjacency[(relation, True)] = _csr(len(names), [(target, source) for source, target in pairs])
+        return cls(names, in_corpus, adjacency)
+
+    @classmethod
+    def from_json(cls, map_path=LEGISLATION_MAP_PATH):
+        with open(map_path, "r", encoding="utf-8") as f:
+            return cls.from_legislation_map(json.load(f))
+
+    def save(self, path=GRAPH_PATH):
+        """Grava o grafo em formato binário (nomes, flags e arrays CSR), de forma atômica"""
+        names = "\n".join(self.names).encode("utf-8")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<III", VERSION, len(self.names), len(names)))
+            f.write(names)
+            f.write(self.in_corpus)
+            for relation in RELATIONS:
+                for reverse in (False, True):
+                    indptr, indices = self.adjacency[(relation, reverse)]
+                    f.write(struct.pack("<I", len(indices)))
+                    indptr.tofile(f)
+                    indices.tofile(f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=GRAPH_PATH):
+        """Carrega o grafo binário gravado por save()"""
+        with open(path, "rb") as f:
+            if f.read(4) != MAGIC:
+                raise ValueError(f"{path} não é um grafo de citações")
+            version, node_count, names_size = struct.unpack("<III", f.read(12))
+            if version != VERSION:
+                raise ValueError(f"Versão do grafo não suportada: {version}")
+            names = f.read(names_size).decode("utf-8").split("\n") if node_count else []
+            in_corpus = bytearray(f.read(node_count))
+            adjacency = {}
+            for relation in RELATIONS:
+                for reverse in (False, True):
+                    (edge_count,) = struct.unpack("<I", f.read(4))
+                    indptr, indices = array("I"), array("I")
+                    indptr.fromfile(f, node_count + 1)
+                    indices.fromfile(f, edge_count)
+                    adjacency[(relation, reverse)] = (indptr, indices)
+        return cls(names, in_corpus, adjacency)
+
+    def _id(self, name):
+        node_id = self.ids.get(name)
+        if node_id is None:
+            node_id = self.ids.get(canonical_id(name))
+        if node_id is None:
+            # Nome sem ano: resolve como nas arestas, pelo único ato do corpus com o mesmo tipo e número
+            if self._by_number is None:
+                self._by_number = _unique_by_number(n for n, flag in zip(self.names, self.in_corpus) if flag)
+            node_id = self.ids.get(self._by_number.get(canonical_id(name) or name))
+        if node_id is None:
+            raise KeyError(name)
+        return node_id
+
+    def _neighbor_ids(self, node_id, relations, reverse):
+        for relation in relations:
+            indptr, indices = self.adjacency[(relation, reverse)]
+            yield from indices[indptr[node_id]:indptr[node_id + 1]]
+
+    def neighbors(self, name, relations=RELATIONS, reverse=False):
+        """Nós ligados diretamente a `name` (reverse=True: nós que apontam para `name`)"""
+        if isinstance(relations, str):
+            relations = (relations,)
+        return sorted({self.names[i] for i in self._neighbor_ids(self._id(name), relations, reverse)})
+
+    def cited_by(self, name, relations=RELATIONS):
+        """Documentos que citam `name` (citação reversa)"""
+        return self.neighbors(name, relations, reverse=True)
+
+    def reachable(self, name, relations=("revokes", "complements"), reverse=False):
+        """Todos os nós alcançáveis a partir de `name` pelas relações informadas (busca em largura)"""
+        start = self._id(name)
+        seen = {start}
+        queue = deque([start])
+        while queue:
+            for neighbor in self._neighbor_ids(queue.popleft(), relations, reverse):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    queue.append(neighbor)
+        seen.discard(start)
+        return sorted(self.names[i] for i in seen)
+
+    def amended_by(self, name):
+        """Tudo o que `name` altera ou revoga, direta ou transitivamente"""
+        return self.reachable(name)
+
+    def in_force(self, corpus_only=True):
+        """Atos que não são revogados por nenhum outro"""
+        if self._in_force is None:
+            indptr, _ = self.adjacency[("revokes", True)]
+            self._in_force = [i for i in range(len(self.names)) if indptr[i] == indptr[i + 1]]
+        return [self.names[i] for i in self._in_force if self.in_corpus[i] or not corpus_only]
+
+    def is_in_force(self, name):
+        indptr, _ = self.adjacency[("revokes", True)]
+        node_id = self._id(name)
+        return indptr[node_id] == indptr[node_id + 1]
+
+def build_graph(map_path=LEGISLATION_MAP_PATH, graph_path=GRAPH_PATH):
+    """Constrói o grafo a partir de legislation_map.json e grava a versão binária"""
+    graph = CitationGraph.from_json(map_path)
+    graph.save(graph_path)
+    print(f"[✔] Grafo de citações salvo: {len(graph.names)} nós em {graph_path}")
+    return graph
+
+if __name__ == "__main__":
+    build_graph()
@@ -0,0 +1,200 @@
+import os
+import json
+import math
+import hashlib
+from functools import lru_cache
+from collections import Counter
+import numpy as np
+from search_index import tokenize, iter_units, SearchHit, generation_dir, _new_generation, _publish_generation
+from jsonl_corpus import iter_documents
+from paths import data_path
+
+INPUT_DIR = data_path("preprocess_references")
+INDEX_DIR = data_path("dense_index")
+
+DEFAULT_DIM = 512
+IDF_BUCKETS = 1 << 18  # Posições da tabela de IDF por feature (float32: 1 MiB)
+BLOCK_ROWS = 65536  # Linhas da matriz pontuadas por vez (limita a memória na busca)
+INDEX_FILES = ("vectors.npy", "ids.json", "meta.json", "idf.npy")
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(feature, dim, idf_buckets):
+    """Posição e sinal no vetor e posição na tabela de IDF de uma feature (hash estável entre execuções).
+
+    Bits diferentes do hash escolhem a posição do vetor e a do IDF, para que
+    features que colidem em uma não colidam também na outra.
+    """
+    value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return value % dim, 1.0 if (value >> 63) & 1 else -1.0, (value >> 24) % idf_buckets
+
+class HashingEncoder:
+    """Codificador local e determinístico: TF-IDF de unigramas e bigramas projetado por hashing com sinal.
+
+    O hashing com sinal equivale a uma projeção aleatória esparsa do espaço
+    TF-IDF para `dim` dimensões; os vetores saem normalizados (norma L2 = 1).
+    O IDF é calculado por feature, em uma tabela hash própria de
+    `idf_buckets` posições (muito maior que `dim`, para que poucas features
+    dividam cada posição), gravada como .npy e aberta mapeada em memória.
+    """
+
+    name = "hashing-tfidf"
+
+    def __init__(self, dim=DEFAULT_DIM, idf=None, idf_buckets=IDF_BUCKETS):
+        self.dim = dim
+        self.idf_buckets = idf_buckets
+        # Sem ajuste, todas as features têm o mesmo peso
+        self.idf = np.ones(idf_buckets, dtype=np.float32) if idf is None else idf
+
+    def features(self, text):
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def fit(self, texts):
+        """Calcula o IDF de cada feature (posição da tabela de IDF) sobre o corpus"""
+        df = np.zeros(self.idf_buckets, dtype=np.int64)
+        total = 0
+        for text in texts:
+            slots = {_bucket(feature, self.dim, self.idf_buckets)[2] for feature in self.features(text)}
+            df[list(slots)] += 1
+            total += 1
+        # Features ausentes do corpus recebem o maior IDF (features raras)
+        self.idf = (np.log((1 + total) / (1 + df)) + 1.0).astype(np.float32)
+        return self
+
+    def encode(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in Counter(self.features(text)).items():
+                column, sign, slot = _bucket(feature, self.dim, self.idf_buckets)
+                matrix[row, column] += sign * (1.0 + math.log(count)) * float(self.idf[slot])
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def config(self):
+        return {"dim": self.dim, "idf_buckets": self.idf_buckets}
+
+    def save(self, index_dir):
+        with open(os.path.join(index_dir, "idf.npy"), "wb") as f:
+            np.save(f, np.asarray(self.idf, dtype=np.float32))
+
+    @classmethod
+    def load(cls, index_dir, dim, idf_buckets=IDF_BUCKETS):
+        path = os.path.join(index_dir, "idf.npy")
+        if not os.path.exists(path):
+            raise ValueError(f"{index_dir} foi criado com o IDF por feature (idf.json); reconstrua o índice")
+        idf = np.load(path, mmap_mode="r")
+        if idf.shape != (idf_buckets,):
+            raise ValueError(f"Tabela de IDF com {idf.shape[0]} posições difere da esperada ({idf_buckets}); "
+                             f"reconstrua o índice")
+        return cls(dim, idf, idf_buckets)
+
+def build_index(input_dir=INPUT_DIR, index_dir=INDEX_DIR, encoder=None, dtype="float16", batch_size=1024):
+    """Codifica as unidades do corpus e grava a matriz de embeddings.
+
+    Como no índice de busca, os arquivos são gravados em uma geração nova
+    (index_dir/gen-NNNNNN) publicada de uma vez pela troca de index_dir/CURRENT,
+    de modo que um leitor nunca combina vetores novos com ids antigos.
+    Arquivos de cada geração:
+      vectors.npy - matriz (unidades x dim) normalizada, em float16 ou float32
+      ids.json    - [documento, artigo, parágrafo] de cada linha da matriz
+      meta.json   - codificador, dimensão e tipo dos vetores
+      idf.npy     - IDF por feature do HashingEncoder (tabela de IDF_BUCKETS posições)
+
+    Qualquer objeto com `name`, `dim` e `encode(textos) -> ndarray` pode ser
+    usado como codificador; o HashingEncoder é o padrão.
+    """
+    ids, texts = [], []
+
+    for document, legislation in iter_documents(input_dir):
+        for article, paragraph, text in iter_units(legislation):
+            if text.strip():
+                ids.append([document, article, paragraph])
+                texts.append(text)
+
+    if encoder is None:
+        encoder = HashingEncoder().fit(texts)
+
+    # A matriz é escrita direto em um .npy mapeado, em lotes, sem montar tudo em memória
+    generation = _new_generation(index_dir)
+    target_dir = os.path.join(index_dir, generation)
+    vectors = np.lib.format.open_memmap(os.path.join(target_dir, "vectors.npy"), mode="w+", dtype=dtype,
+                                        shape=(len(texts), encoder.dim))
+    for start in range(0, len(texts), batch_size):
+        vectors[start:start + batch_size] = encoder.encode(texts[start:start + batch_size])
+    vectors.flush()
+    del vectors
+
+    meta = {"encoder": encoder.name, "dim": encoder.dim, "dtype": dtype, "units": len(ids)}
+    if isinstance(encoder, HashingEncoder):
+        encoder.save(target_dir)
+        meta["idf_buckets"] = encoder.idf_buckets
+    with open(os.path.join(target_dir, "ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f, ensure_ascii=False, separators=(",", ":"))
+    with open(os.path.join(target_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+    _publish_generation(index_dir, generation, INDEX_FILES)
+
+    print(f"[✔] Índice vetorial construído: {len(ids)} unidades x {encoder.dim} dimensões ({dtype}) em {index_dir}")
+
+class DenseIndex:
+    """Busca por similaridade de cosseno sobre a matriz mapeada em memória.
+
+    Abrir o índice não carrega os vetores: o .npy é mapeado (mmap) e as linhas
+    são lidas em blocos de BLOCK_ROWS durante a busca. A geração aberta é a
+    apontada por CURRENT no momento da abertura.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, encoder=None):
+        index_dir = generation_dir(index_dir)
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(os.path.join(index_dir, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+
+        if encoder is None:
+            if self.meta["encoder"] != HashingEncoder.name:
+                raise ValueError(f"O índice foi criado com o codificador '{self.meta['encoder']}'; informe-o em encoder=")
+            encoder = HashingEncoder.load(index_dir, self.meta["dim"], self.meta.get("idf_buckets", IDF_BUCKETS))
+        if encoder.dim != self.meta["dim"]:
+            raise ValueError(f"Dimensão do codificador ({encoder.dim}) difere da do índice ({self.meta['dim']})")
+        self.encoder = encoder
+
+    def search_vectors(self, queries, k=10):
+        """Top-k por linha de `queries` (matriz normalizada): retorna (índices, scores), ambos (consultas x k)"""
+        queries = np.asarray(queries, dtype=np.float32)
+        k = min(k, len(self.ids))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+
+        for start in range(0, len(self.ids), BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            scores = queries @ block.T  # Todas as consultas pontuadas em uma multiplicação
+            top = min(k, scores.shape[1])
+            rows = np.argpartition(-scores, top - 1, axis=1)[:, :top]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def search_many(self, queries, k=10):
+        """Busca várias consultas de texto de uma vez"""
+        if not queries or not self.ids:
+            return [[] for _ in queries]
+        rows, scores = self.search_vectors(self.encoder.encode(list(queries)), k)
+        return [
+            [SearchHit(*self.ids[row], float(score)) for row, score in zip(row_list, score_list)]
+            for row_list, score_list in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def search(self, query, k=10):
+        """Retorna as k unidades mais similares à consulta"""
+        return self.search_many([query], k)[0]
+
+if __name__ == "__main__":
+    build_index()
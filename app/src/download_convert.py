@@ -1,84 +1,586 @@
 import os
 import json
-import requests
-import pdfplumber
-from bs4 import BeautifulSoup
-import urllib3
+import time
+import shutil
+import threading
+import importlib.util
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlsplit
+from paths import DOCUMENTS_PATH, data_path
+from blob_store import BlobStore, BLOB_DIR
+from instrumentation import measure, measured, file_size
+from text_normalization import NORMALIZATION_VERSION, decode_body, normalize_text, normalize_file
 
-# Desativar aviso de requisições HTTPS não verificadas
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+try:
+    import resource  # Limite de memória dos workers (somente Unix)
+except ImportError:
+    resource = None
 
 # Diretórios
-DATA_DIR = "app/data"
-PDF_DIR = os.path.join(DATA_DIR, "pdfs")
-TEXT_DIR = os.path.join(DATA_DIR, "texts")
-
-# Criar diretórios se não existirem
-os.makedirs(PDF_DIR, exist_ok=True)
-os.makedirs(TEXT_DIR, exist_ok=True)
-
-def download_file(name, url):
-    """Faz o download de um arquivo (PDF ou HTML) e processa conforme o tipo de conteúdo."""
-    response = requests.get(url, stream=True, verify=False, headers={"User-Agent": "Mozilla/5.0"})
-    if response.status_code != 200:
-        print(f"[✘] Erro ao baixar {name}: {response.status_code}")
-        return None
+TEXT_DIR = data_path("texts")
+MANIFEST_PATH = data_path("download_manifest.json")
 
-    content_type = response.headers.get("Content-Type", "")
-    
-    if "application/pdf" in content_type:
-        return save_pdf(name, response)
-    elif "text/html" in content_type:
-        return save_html_as_text(name, response.text)
-    else:
-        print(f"[✘] Tipo de arquivo não suportado para {name}: {content_type}")
-        return None
+# Configuração do download concorrente
+HEADERS = {"User-Agent": "Mozilla/5.0"}
+MAX_WORKERS = 16          # Downloads simultâneos no total
+MAX_PER_HOST = 4          # Requisições simultâneas por host
+MAX_RETRIES = 3           # Novas tentativas após a primeira falha
+BACKOFF_FACTOR = 0.5      # Espera base (s) entre tentativas: 0.5, 1, 2, ...
+RETRY_STATUS = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT = (10, 120)  # (conexão, leitura) em segundos
+CHUNK_SIZE = 1 << 16      # Bloco (bytes) usado ao gravar o corpo em disco
 
-def save_pdf(name, response):
-    """Salva um PDF no diretório e retorna o caminho do arquivo."""
-    pdf_path = os.path.join(PDF_DIR, f"{name}.pdf")
-    
-    with open(pdf_path, "wb") as f:
-        f.write(response.content)
+# Configuração da extração de texto
+EXTRACT_WORKERS = os.cpu_count() or 1
+PAGES_PER_TASK = 16       # Páginas extraídas por tarefa isolada
+PDF_BACKENDS = ["pypdf", "pdfplumber"]     # Do mais rápido ao mais preciso
+HTML_BACKENDS = ["lxml", "html.parser"]
+CONVERT_TIMEOUT = 300     # Orçamento de tempo (s) de cada extrator por documento
+CONVERT_MEMORY_MB = 2048  # Limite de memória de cada worker de conversão
+MIN_BYTES_PER_PAGE = 16   # Abaixo disso a extração rápida é considerada vazia
 
-    convert_pdf_to_text(pdf_path, name)
-    return pdf_path
+# Os workers de conversão são processos isolados; forkserver evita herdar as threads de download
+_MP = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+EXTRACT_SLOTS = threading.BoundedSemaphore(EXTRACT_WORKERS)
 
-def save_html_as_text(name, html_content):
-    """Extrai texto de uma página HTML e salva como arquivo .txt."""
+class HostPool:
+    """Mantém uma sessão keep-alive e um limite de requisições simultâneas por host."""
+
+    def __init__(self, max_per_host=MAX_PER_HOST):
+        import urllib3
+
+        # Desativar aviso de requisições HTTPS não verificadas
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self.max_per_host = max_per_host
+        self._sessions = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        return urlsplit(url).netloc.lower()
+
+    def _get(self, url):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        host = self.host(url)
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._sessions[host], self._slots[host]
+
+    def session(self, url):
+        """Sessão reutilizável (conexões persistentes) do host da URL."""
+        return self._get(url)[0]
+
+    def slot(self, url):
+        """Semáforo que limita as requisições em andamento no host da URL."""
+        return self._get(url)[1]
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._slots.clear()
+
+class DownloadManifest:
+    """Manifesto persistente com ETag, Last-Modified, tamanho e SHA-256 de cada documento baixado."""
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def get(self, name):
+        with self._lock:
+            return dict(self.entries.get(name, {}))
+
+    def conditional_headers(self, name, url, store):
+        """Cabeçalhos If-None-Match / If-Modified-Since para uma nova busca do documento."""
+        entry = self.get(name)
+        text_path = os.path.join(TEXT_DIR, f"{name}.txt")
+        # Só faz sentido pedir 304 se a URL é a mesma, o texto convertido ainda existe e está normalizado
+        # e o corpo bruto está no BlobStore (um 304 não traz o corpo)
+        if (
+            entry.get("url") != url
+            or entry.get("normalization") != NORMALIZATION_VERSION
+            or not os.path.exists(text_path)
+            or store.resolve(name) is None
+        ):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def update(self, name, **fields):
+        with self._lock:
+            self.entries.setdefault(name, {}).update(fields)
+
+    def save(self):
+        """Grava o manifesto de forma atômica."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=4, ensure_ascii=False, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+def fetch(url, pool, headers=None, retries=MAX_RETRIES, backoff=BACKOFF_FACTOR, slot=None):
+    """Executa o GET com novas tentativas e espera exponencial em falhas transitórias.
+
+    `slot` é o semáforo do host, já adquirido pelo chamador: ele é liberado
+    durante a espera entre tentativas, para que outros downloads do mesmo
+    host não fiquem parados, e readquirido antes da nova tentativa.
+    """
+    import requests
+
+    session = pool.session(url)
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, stream=True, verify=False, timeout=REQUEST_TIMEOUT, headers=headers)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == retries:
+                raise
+            print(f"[…] Falha de conexão em {url} ({e}), nova tentativa {attempt + 1}/{retries}")
+        else:
+            if response.status_code not in RETRY_STATUS or attempt == retries:
+                return response
+            response.close()
+            print(f"[…] {url} respondeu {response.status_code}, nova tentativa {attempt + 1}/{retries}")
+        if slot is None:
+            time.sleep(backoff * (2 ** attempt))
+            continue
+        slot.release()
+        try:
+            time.sleep(backoff * (2 ** attempt))
+        finally:
+            slot.acquire()
+
+def download_file(name, url, pool=None, manifest=None, store=None, convert=True):
+    """Faz o download de um arquivo (PDF ou HTML) e processa conforme o tipo de conteúdo.
+
+    O corpo bruto é guardado no BlobStore pelo SHA-256 e o nome passa a
+    apontar para o blob. Com um manifesto, a requisição é condicional
+    (ETag / Last-Modified) e nada é baixado quando o servidor responde 304.
+    Com convert=True o texto é gerado em seguida (ver convert_document).
+    Retorna o caminho do texto (ou do blob, se convert=False) ou None.
+    """
+    owns_pool = pool is None
+    pool = pool or HostPool()
+    owns_store = store is None
+    store = store or BlobStore()
     text_path = os.path.join(TEXT_DIR, f"{name}.txt")
-    
-    soup = BeautifulSoup(html_content, "html.parser")
-    text = soup.get_text(separator="\n", strip=True)  # Extrai e limpa o texto
-    
+    headers = manifest.conditional_headers(name, url, store) if manifest else {}
+    with measure("download", name, url=url) as record:
+        try:
+            # O corpo é lido dentro do limite do host; a conversão (CPU) acontece fora dele
+            slot = pool.slot(url)
+            with slot:
+                response = fetch(url, pool, headers=headers, slot=slot)
+                with response:
+                    if record is not None:
+                        record["http_status"] = response.status_code
+                    if response.status_code == 304:
+                        print(f"[✔] Sem alterações (304), pulando: {name}")
+                        return text_path if convert else store.path(store.resolve(name))
+                    if response.status_code != 200:
+                        print(f"[✘] Erro ao baixar {name}: {response.status_code}")
+                        return None
+
+                    content_type = response.headers.get("Content-Type", "")
+                    if "application/pdf" in content_type:
+                        # O PDF é gravado em blocos, sem manter o corpo inteiro em memória
+                        sha256, size, blob_path = store.put_stream(response.iter_content(chunk_size=CHUNK_SIZE))
+                    elif "text/html" in content_type:
+                        sha256, size, blob_path = store.put_bytes(response.content)
+                    else:
+                        print(f"[✘] Tipo de arquivo não suportado para {name}: {content_type}")
+                        return None
+                    if record is not None:
+                        record["bytes_in"] = size
+                    validators = {
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    }
+        finally:
+            if owns_pool:
+                pool.close()
+
+    fetched_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    store.ref(name, sha256, content_type=content_type, size=size, fetched_at=fetched_at)
+    if manifest is not None:
+        manifest.update(name, url=url, content_type=content_type, fetched_at=fetched_at, **validators)
+
+    result = convert_document(name, store, manifest) if convert else blob_path
+    if owns_store:
+        store.save()
+    return result
+
+def convert_document(name, store, manifest=None):
+    """Gera o texto da versão atual (no BlobStore) de um documento.
+
+    A conversão é pulada quando o manifesto registra que o texto já vem
+    desse blob, com a versão atual da normalização; um blob já convertido
+    (mesmo conteúdo sob outro nome ou versão anterior) reaproveita o texto
+    guardado no BlobStore. Retorna o caminho do texto ou None.
+    """
+    history = store.history(name)
+    if not history:
+        print(f"[✘] Documento ainda não baixado: {name}")
+        return None
+    sha256, content_type = history[-1]["sha256"], history[-1]["content_type"]
     text_path = os.path.join(TEXT_DIR, f"{name}.txt")
-    with open(text_path, "w", encoding="utf-8") as f:
-        f.write(text)
+    os.makedirs(TEXT_DIR, exist_ok=True)
+
+    with measure("text", name) as record:
+        entry = manifest.get(name) if manifest is not None else {}
+        if (
+            entry.get("sha256") == sha256
+            and entry.get("normalization") == NORMALIZATION_VERSION
+            and os.path.exists(text_path)
+        ):
+            print(f"[✔] Conteúdo idêntico (SHA-256), conversão pulada: {name}")
+            if record is not None:
+                record["outcome"] = "unchanged"
+            return text_path
+
+        charset = None
+        # Downloads simultâneos do mesmo conteúdo esperam aqui e reaproveitam a primeira conversão
+        with store.lock(sha256):
+            cached = store.get_conversion(sha256, NORMALIZATION_VERSION)
+            if cached:
+                shutil.copyfile(cached, text_path)
+                print(f"[✔] Texto já convertido para o blob {sha256[:12]}, conversão pulada: {name}")
+                result = text_path
+                if record is not None:
+                    record["outcome"] = "cached"
+            else:
+                if "application/pdf" in content_type:
+                    result = convert_pdf_to_text(store.path(sha256), name)
+                else:
+                    with open(store.path(sha256), "rb") as f:
+                        # response.text assumiria ISO-8859-1 quando o cabeçalho não traz charset
+                        html_content, charset = decode_body(f.read(), content_type)
+                    result = save_html_as_text(name, html_content)
+                if result is not None:
+                    store.put_conversion(sha256, NORMALIZATION_VERSION, result)
+        if record is not None:
+            record.update(bytes_in=history[-1].get("size"), bytes_out=file_size(result), content_type=content_type)
+            record.setdefault("outcome", "converted" if result else "failed")
+
+    # Conversões que falharam não entram no manifesto, para serem refeitas na próxima execução
+    if manifest is not None and result is not None:
+        fields = {"charset": charset} if charset else {}
+        manifest.update(name, sha256=sha256, size=history[-1].get("size"), normalization=NORMALIZATION_VERSION, **fields)
+    return result
+
+class ConversionError(Exception):
+    """Falha, tempo limite ou estouro de memória de um worker de conversão."""
+
+# Registro de extratores por tipo de conteúdo: {tipo: {nome: (função, módulo exigido)}}
+EXTRACTORS = {"html": {}, "pdf": {}}
+
+def register_extractor(kind, name, requires=None):
+    """Registra um extrator de texto para o tipo de conteúdo ("html" ou "pdf")."""
+    def decorator(func):
+        EXTRACTORS[kind][name] = (func, requires)
+        return func
+    return decorator
+
+def available_extractors(kind, order):
+    """Nomes dos extratores da ordem informada cujas dependências estão instaladas."""
+    names = []
+    for name in order:
+        func, requires = EXTRACTORS[kind].get(name, (None, None))
+        if func is not None and (requires is None or importlib.util.find_spec(requires) is not None):
+            names.append(name)
+    return names
 
-    print(f"[✔] HTML convertido para texto: {text_path}")
-    return text_path
+@register_extractor("html", "lxml", requires="lxml")
+def html_lxml(html_content, out_path):
+    from bs4 import BeautifulSoup
 
-def convert_pdf_to_text(pdf_path, name):
-    """Converte um PDF para texto e salva em um arquivo .txt."""
+    with open(out_path, "w", encoding="utf-8") as out:
+        out.write(BeautifulSoup(html_content, "lxml").get_text(separator="\n", strip=True))
+    return out_path
+
+@register_extractor("html", "html.parser", requires="bs4")
+def html_parser(html_content, out_path):
+    from bs4 import BeautifulSoup
+
+    with open(out_path, "w", encoding="utf-8") as out:
+        out.write(BeautifulSoup(html_content, "html.parser").get_text(separator="\n", strip=True))
+    return out_path
+
+@register_extractor("pdf", "pypdf", requires="pypdf")
+def pdf_pypdf(pdf_path, start, end, out_path):
+    """Extração sem análise de layout, adequada a textos legais corridos."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    with open(out_path, "w", encoding="utf-8") as out:
+        for number in range(start, end):
+            if number > start:
+                out.write("\n")
+            out.write(reader.pages[number].extract_text() or "")
+    return out_path
+
+@register_extractor("pdf", "pdfplumber", requires="pdfplumber")
+def pdf_pdfplumber(pdf_path, start, end, out_path):
+    """Extração com análise de layout (mais lenta, mais precisa)."""
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf, open(out_path, "w", encoding="utf-8") as out:
+        for number in range(start, end):
+            page = pdf.pages[number]
+            if number > start:
+                out.write("\n")
+            out.write(page.extract_text() or "")
+            page.flush_cache()  # Libera os objetos de layout da página já processada
+    return out_path
+
+def _sandbox_target(conn, func, args, memory_mb):
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        conn.send((True, func(*args)))
+    except BaseException as e:
+        conn.send((False, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+def run_sandboxed(func, args, timeout=CONVERT_TIMEOUT, memory_mb=CONVERT_MEMORY_MB):
+    """Executa func(*args) em um processo isolado com tempo limite e teto de memória."""
+    receiver, sender = _MP.Pipe(duplex=False)
+    process = _MP.Process(target=_sandbox_target, args=(sender, func, args, memory_mb), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise ConversionError(f"tempo limite de {timeout:.1f}s excedido")
+        try:
+            ok, payload = receiver.recv()
+        except EOFError:
+            process.join()
+            raise ConversionError(f"worker encerrado inesperadamente (código {process.exitcode})")
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+    if not ok:
+        raise ConversionError(payload)
+    return payload
+
+def _run_tasks(func, tasks, timeout):
+    """Executa as tarefas em workers isolados, respeitando o orçamento do documento.
+
+    O orçamento é a soma do tempo das tarefas enquanto ocupam um worker: a
+    espera por EXTRACT_SLOTS (compartilhado com os demais downloads) não é
+    cobrada. Cada chamada (um extrator) tem um orçamento novo, para que o
+    extrator seguinte ainda tenha o orçamento inteiro depois de um estouro.
+    """
+    lock = threading.Lock()
+    spent = 0.0
+
+    def run(args):
+        nonlocal spent
+        with EXTRACT_SLOTS:
+            with lock:
+                remaining = timeout - spent
+            if remaining <= 0:
+                raise ConversionError("orçamento de tempo do documento esgotado")
+            start = time.monotonic()
+            try:
+                return run_sandboxed(func, args, remaining)
+            finally:
+                with lock:
+                    spent += time.monotonic() - start
+
+    if len(tasks) <= 1:
+        return [run(args) for args in tasks]
+    with ThreadPoolExecutor(max_workers=min(EXTRACT_WORKERS, len(tasks))) as executor:
+        return list(executor.map(run, tasks))
+
+def save_html_as_text(name, html_content, timeout=CONVERT_TIMEOUT):
+    """Extrai texto de uma página HTML e salva como arquivo .txt."""
     text_path = os.path.join(TEXT_DIR, f"{name}.txt")
+    part_path = f"{text_path}.part"
+
+    try:
+        for backend in available_extractors("html", HTML_BACKENDS):
+            func = EXTRACTORS["html"][backend][0]
+            try:
+                _run_tasks(func, [(html_content, part_path)], timeout)
+            except ConversionError as e:
+                print(f"[…] Extrator HTML {backend} falhou em {name}: {e}")
+                continue
+            normalize_file(part_path, text_path)
+            print(f"[✔] HTML convertido para texto ({backend}): {text_path}")
+            return text_path
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    print(f"[✘] Nenhum extrator HTML conseguiu converter {name}")
+    return None
+
+def count_pdf_pages(pdf_path):
+    """Conta as páginas do PDF com o leitor mais leve disponível (executado em run_sandboxed)."""
+    if importlib.util.find_spec("pypdf") is not None:
+        from pypdf import PdfReader
+        return len(PdfReader(pdf_path).pages)
+    import pdfplumber
 
     with pdfplumber.open(pdf_path) as pdf:
-        text = "\n".join([page.extract_text() or "" for page in pdf.pages])
+        return len(pdf.pages)
+
+def convert_pdf_to_text(pdf_path, name, timeout=CONVERT_TIMEOUT):
+    """Converte um PDF para texto e salva em um arquivo .txt.
+
+    As páginas são divididas em faixas de PAGES_PER_TASK extraídas em workers
+    isolados; cada faixa é gravada em um arquivo parcial e os parciais são
+    concatenados em ordem, de modo que o texto completo nunca fica em memória.
+    Os extratores de PDF_BACKENDS são tentados em ordem: se um falha, estoura o
+    tempo/memória ou devolve texto praticamente vazio, o seguinte é usado, com
+    um novo orçamento de `timeout` segundos.
+    """
+    text_path = os.path.join(TEXT_DIR, f"{name}.txt")
+    try:
+        # Abrir o PDF (não confiável) já pode travar ou estourar a memória: nunca no processo principal
+        page_count = run_sandboxed(count_pdf_pages, (pdf_path,), timeout)
+    except ConversionError as e:
+        print(f"[✘] Não foi possível ler o PDF {name}: {e}")
+        return None
+
+    ranges = [(start, min(start + PAGES_PER_TASK, page_count)) for start in range(0, page_count, PAGES_PER_TASK)]
+    part_paths = [f"{text_path}.{i}.part" for i in range(len(ranges))]
+    tasks = [(pdf_path, start, end, part_path) for (start, end), part_path in zip(ranges, part_paths)]
+    backends = available_extractors("pdf", PDF_BACKENDS)
+
+    try:
+        for backend in backends:
+            func = EXTRACTORS["pdf"][backend][0]
+            try:
+                _run_tasks(func, tasks, timeout)
+            except ConversionError as e:
+                print(f"[…] Extrator PDF {backend} falhou em {name}: {e}")
+                continue
+
+            extracted = sum(os.path.getsize(part_path) for part_path in part_paths)
+            if backend != backends[-1] and extracted < MIN_BYTES_PER_PAGE * page_count:
+                print(f"[…] Extrator PDF {backend} devolveu pouco texto em {name}, tentando o próximo")
+                continue
+
+            with open(text_path, "w", encoding="utf-8") as out:
+                for i, part_path in enumerate(part_paths):
+                    if i:
+                        out.write("\n")
+                    # Cada faixa é normalizada uma única vez aqui; os estágios seguintes recebem texto NFC limpo
+                    with open(part_path, "r", encoding="utf-8", errors="replace") as part:
+                        out.write(normalize_text(part.read()))
+
+            print(f"[✔] PDF convertido para texto ({backend}): {text_path} ({page_count} páginas)")
+            return text_path
+    finally:
+        for part_path in part_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    print(f"[✘] Nenhum extrator PDF conseguiu converter {name}")
+    return None
+
+def _summarize(results):
+    """Campos do registro de métricas de download_documents e convert_documents"""
+    failed = sum(path is None for path in results.values())
+    return {"processed": len(results) - failed, "failures": failed}
+
+@measured("download", _summarize)
+def download_documents(documents, max_workers=MAX_WORKERS, max_per_host=MAX_PER_HOST, manifest_path=MANIFEST_PATH,
+                       store_dir=BLOB_DIR, convert=True):
+    """Baixa e converte os documentos em paralelo.
+
+    Cada host tem sua própria sessão keep-alive e no máximo `max_per_host`
+    requisições em andamento, de modo que o tempo total fica próximo ao do
+    documento mais lento. Documentos já registrados no manifesto são
+    revalidados com requisições condicionais, e os corpos brutos ficam no
+    BlobStore de store_dir. Com convert=False apenas os blobs são
+    atualizados (a conversão fica para convert_documents).
+    Retorna {nome: caminho ou None}.
+    """
+    results = {}
+    manifest = DownloadManifest(manifest_path)
+    store = BlobStore(store_dir)
+
+    pool = HostPool(max_per_host)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download_file, doc["name"], doc["link"], pool, manifest, store, convert): doc["name"]
+                for doc in documents
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"[✘] Falha ao processar {name}: {e}")
+                    results[name] = None
+    finally:
+        pool.close()
+        manifest.save()
+        store.save()
+
+    return results
+
+@measured("text", _summarize)
+def convert_documents(names=None, max_workers=MAX_WORKERS, manifest_path=MANIFEST_PATH, store_dir=BLOB_DIR):
+    """Gera os textos da versão atual de cada documento do BlobStore (ou só de `names`).
+
+    Não acessa a rede: usa apenas os blobs já baixados. Retorna {nome: caminho ou None}.
+    """
+    results = {}
+    manifest = DownloadManifest(manifest_path)
+    store = BlobStore(store_dir)
+    names = sorted(store.refs) if names is None else names
 
-    with open(text_path, "w", encoding="utf-8") as f:
-        f.write(text)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(convert_document, name, store, manifest): name for name in names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"[✘] Falha ao converter {name}: {e}")
+                    results[name] = None
+    finally:
+        manifest.save()
 
-    print(f"[✔] PDF convertido para texto: {text_path}")
+    return results
 
-# Carregar a lista de documentos
-with open("documents.json", "r", encoding="utf-8") as file:
-    documents = json.load(file)["documents"]
+def load_documents(path=DOCUMENTS_PATH):
+    """Carrega a lista de documentos"""
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)["documents"]
 
-# Executar download e conversão somente se o texto ainda não existir
-for doc in documents:
-    text_path = os.path.join(TEXT_DIR, f"{doc['name']}.txt")
-    
-    if not os.path.exists(text_path):
-        download_file(doc["name"], doc["link"])
-    else:
-        print(f"[✔] Arquivo já existe, pulando: {doc['name']}")
\ No newline at end of file
+if __name__ == "__main__":
+    # Executar download e conversão apenas dos documentos novos ou alterados
+    download_documents(load_documents())
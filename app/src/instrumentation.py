@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+from functools import wraps
+from contextlib import contextmanager
+from paths import data_path
+
+METRICS_DIR = data_path("metrics")
+
+# Estado da execução em variáveis de ambiente, herdadas pelos processos dos workers:
+# sem SYNTIA_METRICS_RUN nada é medido nem gravado
+RUN_ENV = "SYNTIA_METRICS_RUN"
+PATTERNS_ENV = "SYNTIA_METRICS_PATTERNS"
+SLOWEST = 10  # Documentos mais lentos listados no relatório
+
+def run_id():
+    return os.environ.get(RUN_ENV)
+
+def enabled():
+    return RUN_ENV in os.environ
+
+def patterns_enabled():
+    return PATTERNS_ENV in os.environ and RUN_ENV in os.environ
+
+def log_path(run=None, metrics_dir=METRICS_DIR):
+    return os.path.join(metrics_dir, f"{run or run_id()}.jsonl")
+
+def report_path(run=None, metrics_dir=METRICS_DIR):
+    return os.path.join(metrics_dir, f"{run or run_id()}.json")
+
+def start_run(patterns=False, run=None):
+    """Ativa a instrumentação para este processo e os que ele criar; retorna o id da execução"""
+    run = run or time.strftime("%Y%m%dT%H%M%S", time.localtime()) + f"-{os.getpid()}"
+    os.environ[RUN_ENV] = run
+    if patterns:
+        os.environ[PATTERNS_ENV] = "1"
+    else:
+        os.environ.pop(PATTERNS_ENV, None)
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    log_event("run", status="started", argv=sys.argv)
+    return run
+
+def stop_run():
+    os.environ.pop(RUN_ENV, None)
+    os.environ.pop(PATTERNS_ENV, None)
+
+def log_event(event, **fields):
+    """Acrescenta um evento (uma linha JSON) ao log estruturado da execução.
+
+    Cada linha é gravada com uma única chamada write em modo append, o que
+    mantém as linhas inteiras mesmo com vários processos gravando o mesmo log.
+    """
+    if not enabled():
+        return
+    record = {"ts": time.time(), "run": run_id(), "pid": os.getpid(), "event": event, **fields}
+    line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    fd = os.open(log_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def measure(stage, document=None, **fields):
+    """Mede tempo de parede e de CPU de um estágio (document=None) ou de um documento.
+
+    Produz um dicionário para o chamador completar (bytes_in, bytes_out,
+    articles, references...) ou None quando a instrumentação está desligada,
+    caso em que o custo é apenas o do próprio `with`. A CPU é a da thread
+    atual, o que vale tanto nos workers de processo quanto nos de thread.
+    """
+    if not enabled():
+        yield None
+        return
+    record = {"stage": stage, "document": document, **fields}
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield record
+    except BaseException as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record.setdefault("status", "ok")
+        record["wall_s"] = time.perf_counter() - wall
+        record["cpu_s"] = time.thread_time() - cpu
+        log_event("stage" if document is None else "document", **record)
+
+def measured(stage, summarize=None):
+    """Decorador que mede a função inteira como o estágio `stage`.
+
+    summarize(resultado) devolve os campos acrescentados ao registro
+    (processed, failures...); só é chamado com a instrumentação ligada.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with measure(stage) as record:
+                result = func(*args, **kwargs)
+                if record is not None and summarize is not None:
+                    record.update(summarize(result))
+            return result
+        return wrapper
+    return decorator
+
+def file_size(path):
+    return os.path.getsize(path) if path and os.path.exists(path) else 0
+
+def profile_patterns(record, group, text, patterns):
+    """Tempo e número de matches de cada padrão, executado isoladamente sobre o texto.
+
+    Só roda com a medição de padrões ligada (SYNTIA_METRICS_PATTERNS); os
+    estágios usam os padrões fundidos em uma única varredura, e esta
+    passada extra por padrão existe apenas para atribuir o custo a cada um.
+    `patterns` é uma lista de (nome, padrão compilado).
+    """
+    if record is None or not patterns_enabled():
+        return
+    timings = record.setdefault("patterns", {}).setdefault(group, {})
+    for name, pattern in patterns:
+        start = time.perf_counter()
+        hits = sum(1 for _ in pattern.finditer(text))
+        seconds, total = timings.get(name, (0.0, 0))
+        timings[name] = (seconds + time.perf_counter() - start, total + hits)
+
+def _add(totals, record, keys):
+    for key in keys:
+        if isinstance(record.get(key), (int, float)):
+            totals[key] = totals.get(key, 0) + record[key]
+
+def build_report(run=None, metrics_dir=METRICS_DIR):
+    """Agrega o log estruturado de uma execução no relatório JSON.
+
+    O relatório traz os estágios executados pelo pipeline; por estágio, o
+    tempo total (do processo principal) e
+    os totais dos documentos (CPU somada dos workers, bytes, artigos e
+    referências); a lista de documentos; os mais lentos; e, se medidos, o
+    tempo e os matches de cada padrão.
+    """
+    run = run or run_id()
+    stages, documents, patterns, pipeline = {}, [], {}, []
+    with open(log_path(run, metrics_dir), "r", encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+
+    for event in events:
+        if event["event"] == "pipeline":
+            pipeline.append({key: value for key, value in event.items() if key not in ("ts", "run", "event", "pid")})
+        if event["event"] not in ("stage", "document"):
+            continue
+        stage = stages.setdefault(event["stage"], {"documents": 0, "errors": 0})
+        if event["event"] == "stage":
+            stage["wall_s"] = stage.get("wall_s", 0) + event["wall_s"]
+            _add(stage, event, ["processed", "unchanged", "failures", "removed"])
+            continue
+
+        documents.append({key: value for key, value in event.items() if key not in ("ts", "run", "event")})
+        stage["documents"] += 1
+        stage["errors"] += event.get("status") == "error"
+        totals = stage.setdefault("totals", {})
+        _add(totals, event, ["wall_s", "cpu_s", "bytes_in", "bytes_out", "articles", "references"])
+        for group, timings in event.get("patterns", {}).items():
+            for name, (seconds, hits) in timings.items():
+                entry = patterns.setdefault(group, {}).setdefault(name, {"seconds": 0.0, "hits": 0})
+                entry["seconds"] += seconds
+                entry["hits"] += hits
+
+    for group in patterns:
+        patterns[group] = dict(sorted(patterns[group].items(), key=lambda item: -item[1]["seconds"]))
+    report = {
+        "run": run,
+        "started": events[0]["ts"] if events else None,
+        "finished": events[-1]["ts"] if events else None,
+        "pipeline": pipeline,
+        "stages": stages,
+        "slowest": sorted(documents, key=lambda doc: -doc["wall_s"])[:SLOWEST],
+        "patterns": patterns,
+        "documents": documents,
+    }
+    return report
+
+def write_report(run=None, metrics_dir=METRICS_DIR):
+    """Grava o relatório da execução ao lado do log; retorna o caminho"""
+    report = build_report(run, metrics_dir)
+    path = report_path(report["run"], metrics_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    print(f"[✔] Relatório de métricas salvo em {path}")
+    return path
+
+if __name__ == "__main__":
+    # Reconstrói o relatório de uma execução a partir do log (ex.: python instrumentation.py 20250101T120000-123)
+    # Sem argumento, usa o log mais recente
+    if len(sys.argv) > 1:
+        write_report(sys.argv[1])
+    else:
+        logs = sorted((name for name in os.listdir(METRICS_DIR) if name.endswith(".jsonl")),
+                      key=lambda name: os.path.getmtime(os.path.join(METRICS_DIR, name)))
+        if logs:
+            write_report(logs[-1][:-len(".jsonl")])
+        else:
+            print(f"[✘] Nenhum log de métricas em {METRICS_DIR}")
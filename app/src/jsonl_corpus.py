@@ -0,0 +1,158 @@
+import os
+import json
+from paths import data_path
+
+OUTPUT_FORMATS = ("json", "jsonl")
+CORPUS_DIR = data_path("preprocess_references")
+
+def index_path_for(path):
+    """Caminho do índice de offsets de um arquivo .jsonl"""
+    return f"{os.path.splitext(path)[0]}.idx.json"
+
+def to_records(document, legislation):
+    """Converte a estrutura de extract_articles em um registro por artigo/anexo.
+
+    Cada registro tem document, key, chapter, section e text; os parágrafos e
+    incisos de um artigo ficam em "parts". O cabeçalho vira o registro
+    "header" (com a data, se houver).
+    """
+    header = {"document": document, "key": "header", "chapter": None, "section": None, "text": legislation.get("header")}
+    if "date" in legislation:
+        header["date"] = legislation["date"]
+    yield header
+
+    for key, value in legislation.items():
+        if key in ("date", "header"):
+            continue
+        if isinstance(value, dict):
+            parts = {k: v for k, v in value.items() if k not in ("chapter", "section", "text")}
+            yield {
+                "document": document, "key": key, "chapter": value.get("chapter"),
+                "section": value.get("section"), "text": value.get("text"), "parts": parts,
+            }
+        else:
+            yield {"document": document, "key": key, "chapter": None, "section": None, "text": value}
+
+def from_records(records):
+    """Reconstrói a estrutura original a partir dos registros de to_records"""
+    legislation = {}
+    for record in records:
+        if record["key"] == "header":
+            if "date" in record:
+                legislation["date"] = record["date"]
+            legislation["header"] = record["text"]
+        elif "parts" in record:
+            legislation[record["key"]] = {
+                "chapter": record["chapter"], "section": record["section"], "text": record["text"], **record["parts"]
+            }
+        else:
+            legislation[record["key"]] = record["text"]
+    return legislation
+
+def write_jsonl(document, legislation, path):
+    """Grava um registro compacto por linha e o índice {key: [offset, tamanho]} ao lado.
+
+    Os dois arquivos são gravados em temporários e substituem os anteriores
+    (os.replace) só depois de completos; o índice é trocado por último.
+    """
+    offsets = {}
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        for record in to_records(document, legislation):
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            offsets[record["key"]] = [f.tell(), len(line)]
+            f.write(line)
+    index_path = index_path_for(path)
+    with open(f"{index_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(offsets, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+    os.replace(f"{index_path}.tmp", index_path)
+
+def save_legislation(legislation, output_path, output_format="json"):
+    """Grava a estrutura no formato pedido: JSON indentado ou JSON Lines com índice.
+
+    Nos dois formatos a saída anterior só é substituída quando a nova está
+    completa, para que uma falha no meio da escrita não deixe um arquivo truncado.
+    """
+    if output_format == "jsonl":
+        document = os.path.splitext(os.path.basename(output_path))[0]
+        write_jsonl(document, legislation, output_path)
+    else:
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(legislation, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, output_path)
+
+def load_legislation(path):
+    """Carrega um documento gravado em .json ou .jsonl"""
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            return from_records(json.loads(line) for line in f)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def remove_legislation(path):
+    """Remove a saída de um documento e o índice de offsets, se houver"""
+    paths = [path, index_path_for(path)] if path.endswith(".jsonl") else [path]
+    for candidate in paths:
+        if os.path.exists(candidate):
+            os.remove(candidate)
+
+def iter_documents(corpus_dir=CORPUS_DIR):
+    """Gera (documento, estrutura) de cada arquivo .json ou .jsonl do diretório"""
+    for filename in sorted(os.listdir(corpus_dir)):
+        if filename.endswith((".json", ".jsonl")) and not filename.endswith(".idx.json"):
+            yield os.path.splitext(filename)[0], load_legislation(os.path.join(corpus_dir, filename))
+
+def iter_corpus(corpus_dir=CORPUS_DIR, documents=None):
+    """Gera os registros de todo o corpus (ou dos documentos informados), linha a linha"""
+    names = documents or sorted(
+        os.path.splitext(filename)[0] for filename in os.listdir(corpus_dir) if filename.endswith(".jsonl")
+    )
+    for name in names:
+        with open(os.path.join(corpus_dir, f"{name}.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+class CorpusReader:
+    """Acesso direto a registros do corpus em JSON Lines.
+
+    reader.get("RDC_658_2022/art12") lê apenas a linha do artigo, usando o
+    índice de offsets do documento (carregado na primeira consulta).
+    """
+
+    def __init__(self, corpus_dir=CORPUS_DIR):
+        self.corpus_dir = corpus_dir
+        self._offsets = {}
+
+    def documents(self):
+        return sorted(
+            os.path.splitext(filename)[0] for filename in os.listdir(self.corpus_dir) if filename.endswith(".jsonl")
+        )
+
+    def offsets(self, document):
+        if document not in self._offsets:
+            with open(index_path_for(os.path.join(self.corpus_dir, f"{document}.jsonl")), "r", encoding="utf-8") as f:
+                self._offsets[document] = json.load(f)
+        return self._offsets[document]
+
+    def invalidate(self, document=None):
+        """Descarta os índices em memória (de um documento ou de todos) após uma nova execução"""
+        if document is None:
+            self._offsets.clear()
+        else:
+            self._offsets.pop(document, None)
+
+    def keys(self, document):
+        return list(self.offsets(document))
+
+    def get(self, ref, key=None):
+        """Registro de "DOCUMENTO/chave" (ou get(documento, chave)); KeyError se não existir"""
+        document, key = (ref, key) if key is not None else ref.split("/", 1)
+        offset, length = self.offsets(document)[key]
+        with open(os.path.join(self.corpus_dir, f"{document}.jsonl"), "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def __iter__(self):
+        return iter_corpus(self.corpus_dir)
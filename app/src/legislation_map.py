@@ -1,102 +1,205 @@
 import os
 import json
 import re
+from paths import data_path
+from batch import run_batch, report_failures
+from citation_graph import CitationGraph, GRAPH_PATH
+from instrumentation import measure, profile_patterns, patterns_enabled, file_size
 
-TEXT_DIR = "app/data/texts"
-LEGISLATION_MAP_PATH = "app/data/legislation_map.json"
+TEXT_DIR = data_path("texts")
+LEGISLATION_MAP_PATH = data_path("legislation_map.json")
+# Formas de citação e posições dos termos de relação de cada referência, fora do mapa para
+# manter legislation_map.json no formato [citações, artigo, categoria, linha]
+LEGISLATION_DETAILS_PATH = data_path("legislation_map_details.json")
 
-# Padrões para identificar citações de legislações
-PATTERNS = [
-    r'RDC\s*n[ºo]?\s*\d{1,4}/\d{4}',  # Exemplo: RDC nº 250/2005
-    r'RDC\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}',  # RDC nº 315, de 26 de outubro de 2005
-    r'RDC\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+,\s*de\s*\d{4}',  # RDC nº 315, de 26 de outubro, de 2005
-    r'RE\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+,\s*de\s*\d{4}',  # RE nº 899, de 29 de maio, de 2003
-    r'Lei\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}',  # Lei nº 6.437, de 20 de agosto de 1977
-    r'Lei\s*n[ºo.]?\s*\d{1,4}/\d{4}',  # Lei nº 12.345/2010
-    r'IN\s*n[ºo.]?\s*\d{1,4}/\d{4}',  # IN nº 3/2013
-    r'Instrução\s*Normativa\s*n[ºo.]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}',  # Instrução Normativa nº. 11, de 06 de outubro de 2009
-    r'Instrução\s*Normativa\s*n[ºo.]?\s*\d{1,4}/\d{4}',  # Instrução Normativa nº 3/2013
-    r'Portaria\s*n[ºo.]?\s*\d{1,4}/\d{4}',  # Portaria nº 100/2018
-    r'Portaria\s*n[ºo.]?\s*\d{1,4}/MS',  # Portaria nº 696/MS
-    r'Nota\s*Técnica\s*Conjunta\s*?\d{1,4}/\d{4}.*?,\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}',  # Nota Técnica Conjunta 01/2016, de 22 de abril de 2016
-    r'Nota\s*Técnica\s*n[ºo.]?\s*\d{1,4}-\d{1,4}/\d{4}',  # Nota Técnica nº 06-001/2015
-    r'RDC\s*n[°]?\s*\d{1,4}/\d{4}'  # Exemplo: RDC n° 55/2005
+# Formas de citação de legislações: (nome da forma, padrão), em ordem de prioridade
+CITATION_FORMS = [
+    ("rdc_numero_ano", r'RDC\s*n[ºo]?\s*\d{1,4}/\d{4}'),  # Exemplo: RDC nº 250/2005
+    ("rdc_data", r'RDC\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}'),  # RDC nº 315, de 26 de outubro de 2005
+    ("rdc_data_virgula", r'RDC\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+,\s*de\s*\d{4}'),  # RDC nº 315, de 26 de outubro, de 2005
+    ("re_data_virgula", r'RE\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+,\s*de\s*\d{4}'),  # RE nº 899, de 29 de maio, de 2003
+    ("lei_data", r'Lei\s*n[ºo]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}'),  # Lei nº 6.437, de 20 de agosto de 1977
+    ("lei_numero_ano", r'Lei\s*n[ºo.]?\s*\d{1,4}/\d{4}'),  # Lei nº 12.345/2010
+    ("in_numero_ano", r'IN\s*n[ºo.]?\s*\d{1,4}/\d{4}'),  # IN nº 3/2013
+    ("instrucao_normativa_data", r'Instrução\s*Normativa\s*n[ºo.]?\s*\d{1,4},\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}'),  # Instrução Normativa nº. 11, de 06 de outubro de 2009
+    ("instrucao_normativa_numero_ano", r'Instrução\s*Normativa\s*n[ºo.]?\s*\d{1,4}/\d{4}'),  # Instrução Normativa nº 3/2013
+    ("portaria_numero_ano", r'Portaria\s*n[ºo.]?\s*\d{1,4}/\d{4}'),  # Portaria nº 100/2018
+    ("portaria_ms", r'Portaria\s*n[ºo.]?\s*\d{1,4}/MS'),  # Portaria nº 696/MS
+    ("nota_tecnica_conjunta", r'Nota\s*Técnica\s*Conjunta\s*?\d{1,4}/\d{4}.*?,\s*de\s*\d{1,2}\s*de\s*\w+\s*de\s*\d{4}'),  # Nota Técnica Conjunta 01/2016, de 22 de abril de 2016
+    ("nota_tecnica", r'Nota\s*Técnica\s*n[ºo.]?\s*\d{1,4}-\d{1,4}/\d{4}'),  # Nota Técnica nº 06-001/2015
+    ("rdc_grau_numero_ano", r'RDC\s*n[°]?\s*\d{1,4}/\d{4}')  # Exemplo: RDC n° 55/2005
 ]
 
+# Padrões para identificar citações de legislações
+PATTERNS = [pattern for _, pattern in CITATION_FORMS]
+
+# Scanner único: alternação com um grupo nomeado por forma, compilada uma vez.
+# Em cada posição as formas são tentadas na ordem de CITATION_FORMS. O lookahead
+# com as duas primeiras letras das formas (RDC, RE, Lei, IN/Instrução, Portaria,
+# Nota) descarta rapidamente as posições que não podem iniciar uma citação.
+CITATION_PREFIXES = ["rd", "re", "le", "in", "po", "no"]
+CITATION_SCANNER = re.compile(
+    f"(?=(?:{'|'.join(CITATION_PREFIXES)}))(?:"
+    + "|".join(f"(?P<{name}>{pattern})" for name, pattern in CITATION_FORMS)
+    + ")",
+    re.IGNORECASE
+)
+
+# Formas compiladas isoladamente, usadas apenas na medição por padrão (instrumentation)
+CITATION_PROFILE = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in CITATION_FORMS]
+
 REVOKE_TERMS = ["revoga", "revogado", "revogada", "revogação", "fica sem efeito", "passa a vigorar", "substitui", "revogam-se"]
 COMPLEMENT_TERMS = ["complementa", "alterada por", "modifica", "acrescido", "acrescenta", "fica incluído", "ficam incluídos"]
-CITES_TERMS = ["conforme", "de acordo com", "nos termos", "descrita nas seções", "considerando", "não substitui", "n�o substitui"]
+CITES_TERMS = ["conforme", "de acordo com", "nos termos", "descrita nas seções", "considerando", "não substitui"]
+
+# Categorias de relação em ordem crescente de precedência (a última encontrada define a categoria principal)
+RELATION_TERMS = {"revokes": REVOKE_TERMS, "complements": COMPLEMENT_TERMS, "cites": CITES_TERMS}
+TERM_CATEGORY = {term: category for category, terms in RELATION_TERMS.items() for term in terms}
+
+# Todos os termos em uma única alternação, com um grupo nomeado por termo (term_<índice>).
+# Os mais longos vêm primeiro para vencer os prefixos que começam na mesma posição
+# ("revogada" e não "revoga"); "não substitui" (cita) prevalece sobre "substitui" (revoga)
+# porque começa antes e o match mais à esquerda consome o trecho
+RELATION_GROUPS = sorted(TERM_CATEGORY, key=len, reverse=True)
+RELATION_SCANNER = re.compile(
+    "|".join(f"(?P<term_{i}>{re.escape(term)})" for i, term in enumerate(RELATION_GROUPS)),
+    re.IGNORECASE
+)
+
+def scan_legislation_references(text):
+    """Encontra todas as citações do texto em uma única passada.
+
+    Retorna uma lista de (citação, forma, início, fim), na ordem em que aparecem.
+    """
+    return [(match.group(), match.lastgroup, match.start(), match.end()) for match in CITATION_SCANNER.finditer(text)]
 
 def extract_legislation_references(text):
     """Extrai citações de outras legislações do texto."""
-    for pattern in PATTERNS:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            return matches
+    matches = CITATION_SCANNER.findall(text)
+    if matches:
+        # findall devolve uma tupla por match, com apenas o grupo da forma encontrada preenchido
+        return ["".join(groups) for groups in matches]
 
-def check_relation(text, terms):
-    """Verifica se há menção a termos de revogação ou complementação."""
-    return any(term in text.lower() for term in terms)
+def classify_relations(text):
+    """Classifica o texto em todas as categorias de relação em uma única passada.
 
-def analyze_legislation_references():
-    legislation_map = {}
+    Retorna {categoria: [(termo, início, fim), ...]} apenas com as categorias encontradas.
+    """
+    relations = {}
+    for match in RELATION_SCANNER.finditer(text):
+        # O termo vem do grupo que casou, não do texto (que pode ter outra caixa)
+        term = RELATION_GROUPS[int(match.lastgroup[5:])]
+        relations.setdefault(TERM_CATEGORY[term], []).append((term, match.start(), match.end()))
+    return relations
 
-    for filename in os.listdir(TEXT_DIR):
-        if filename.endswith(".txt") and ('perguntas_e_respostas' not in filename):
-            file_path = os.path.join(TEXT_DIR, filename)
-            legislation_name = os.path.splitext(filename)[0]
-            references = []
-            
-            with open(file_path, "r", encoding="utf-8") as file:
-                content = file.read()
-
-            """
-            # Procurar o índice do primeiro "Art. 1" e cortar o texto antes disso
-            start_index = content.find("Art. 1")
-            if start_index != -1:
-                content = content[start_index:]  # Mantém apenas o trecho a partir de "Art. 1º"
-            """
-            
-            lines = re.split(r'\.\n|;\n|; e\n|:\n', content)
-            current_article = None
-            article_category = None
-                
-            for line in lines:
-                line = line.replace("\n", " ")
-                
-                # Identifica título do artigo
-                article_match = re.findall(r'^Art\.\s*\d{1,4}[º°]?', line, re.IGNORECASE)
-                if article_match:
-                    current_article = article_match[0]
-                    article_category = None
-                    if check_relation(line, REVOKE_TERMS):
-                        article_category = "revokes"
-                    if check_relation(line, COMPLEMENT_TERMS):
-                        article_category = "complements"
-                    if check_relation(line, CITES_TERMS):
-                        article_category = "cites"
-        
-                reference = extract_legislation_references(line)
-
-                legislation_parts = legislation_name.split('_') 
-                # Verificar se todas as partes de legislation_name estão dentro de reference
-                if reference and all(part in reference for part in legislation_parts):
-                    reference = None
-
-                if reference:
-                    category = article_category
-                    if check_relation(line, REVOKE_TERMS):
-                        category = "revokes"
-                    if check_relation(line, COMPLEMENT_TERMS):
-                        category = "complements"
-                    if check_relation(line, CITES_TERMS):
-                        category = "cites"
-                    references.append([reference, current_article, category, line])
-            
-            if references:
-                legislation_map[legislation_name] = {"references": references}
+def primary_relation(relations, default=None):
+    """Categoria principal de um resultado de classify_relations, segundo a precedência de RELATION_TERMS."""
+    category = default
+    for candidate in RELATION_TERMS:
+        if candidate in relations:
+            category = candidate
+    return category
+
+def _analyze_file(file_path):
+    legislation_name = os.path.splitext(os.path.basename(file_path))[0]
+    references = []
+    details = []
     
-    with open(LEGISLATION_MAP_PATH, "w", encoding="utf-8") as f:
-        json.dump(legislation_map, f, indent=4, ensure_ascii=False)
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = file.read()
+
+    """
+    # Procurar o índice do primeiro "Art. 1" e cortar o texto antes disso
+    start_index = content.find("Art. 1")
+    if start_index != -1:
+        content = content[start_index:]  # Mantém apenas o trecho a partir de "Art. 1º"
+    """
+    
+    lines = re.split(r'\.\n|;\n|; e\n|:\n', content)
+    current_article = None
+    article_category = None
+        
+    for line in lines:
+        line = line.replace("\n", " ")
+        
+        # Identifica título do artigo
+        relations = None
+        article_match = re.findall(r'^Art\.\s*\d{1,4}[º°]?', line, re.IGNORECASE)
+        if article_match:
+            current_article = article_match[0]
+            relations = classify_relations(line)
+            article_category = primary_relation(relations)
+
+        citations = scan_legislation_references(line)
+        reference = [citation[0] for citation in citations] or None
+
+        legislation_parts = legislation_name.split('_') 
+        # Verificar se todas as partes de legislation_name estão dentro de reference
+        if reference and all(part in reference for part in legislation_parts):
+            reference = None
+
+        if reference:
+            if relations is None:
+                relations = classify_relations(line)
+            category = primary_relation(relations, article_category)
+            references.append([reference, current_article, category, line])
+            details.append({"forms": [citation[1] for citation in citations], "relations": relations})
+
+    return legislation_name, references, details
+
+def analyze_file(file_path):
+    """Extrai as referências de um texto (executado nos workers).
+
+    Retorna (nome, referências, detalhes): cada referência é
+    [citações, artigo, categoria, linha] e o detalhe de mesmo índice traz
+    {"forms": [...], "relations": {categoria: [(termo, início, fim), ...]}}.
+    """
+    with measure("legislation_map", os.path.basename(file_path)) as record:
+        legislation_name, references, details = _analyze_file(file_path)
+        if record is not None:
+            record.update(bytes_in=file_size(file_path), references=sum(len(reference[0]) for reference in references))
+            if patterns_enabled():
+                with open(file_path, "r", encoding="utf-8") as file:
+                    profile_patterns(record, "PATTERNS", file.read(), CITATION_PROFILE)
+    return legislation_name, references, details
+
+def _write_json(data, path):
+    """Grava o JSON de forma atômica (o serviço de consulta observa estes arquivos)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _analyze_legislation_references(workers, chunksize, record):
+    legislation_map = {}
+    legislation_details = {}
+
+    file_paths = [
+        os.path.join(TEXT_DIR, filename)
+        for filename in sorted(os.listdir(TEXT_DIR))
+        if filename.endswith(".txt") and ('perguntas_e_respostas' not in filename)
+    ]
+    results, failures = run_batch(analyze_file, file_paths, workers, chunksize)
+
+    # Os resultados chegam na ordem dos arquivos, o que mantém o JSON determinístico
+    for _, (legislation_name, references, details) in results:
+        if references:
+            legislation_map[legislation_name] = {"references": references}
+            legislation_details[legislation_name] = details
+
+    _write_json(legislation_map, LEGISLATION_MAP_PATH)
+    _write_json(legislation_details, LEGISLATION_DETAILS_PATH)
+
+    # Versão binária e consultável do mapa, com ids canônicos
+    CitationGraph.from_legislation_map(legislation_map).save(GRAPH_PATH)
     
-    print("[✔] Mapeamento de legislações concluído e salvo.")
\ No newline at end of file
+    report_failures(failures)
+    if record is not None:
+        record.update(processed=len(results), failures=len(failures))
+    print("[✔] Mapeamento de legislações concluído e salvo.")
+    return failures
+
+def analyze_legislation_references(workers=None, chunksize=1):
+    """Mapeia as citações entre legislações, distribuindo os textos entre `workers` processos."""
+    with measure("legislation_map") as record:
+        return _analyze_legislation_references(workers, chunksize, record)
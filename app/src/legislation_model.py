@@ -0,0 +1,179 @@
+import sys
+import tracemalloc
+from jsonl_corpus import CORPUS_DIR, iter_documents
+
+class StringPool:
+    """Armazena uma única cópia de cada texto repetido (cláusulas padrão que se repetem entre RDCs)"""
+
+    __slots__ = ("_strings",)
+
+    def __init__(self):
+        self._strings = {}
+
+    def __call__(self, text):
+        if text is None:
+            return None
+        return self._strings.setdefault(text, text)
+
+    def __len__(self):
+        return len(self._strings)
+
+def _label(value):
+    """Rótulos curtos e muito repetidos (chaves, capítulos, seções) são internados"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Inciso:
+    __slots__ = ("key", "text")
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+
+class Paragraph:
+    """Parágrafo de um artigo; incisos é None quando o parágrafo é um texto simples"""
+
+    __slots__ = ("key", "text", "incisos")
+
+    def __init__(self, key, text, incisos=None):
+        self.key = key
+        self.text = text
+        self.incisos = incisos
+
+    def to_value(self):
+        if self.incisos is None:
+            return self.text
+        value = {"text": self.text}
+        for inciso in self.incisos:
+            value[inciso.key] = inciso.text
+        return value
+
+class Article:
+    """Artigo com capítulo, seção, caput e filhos (parágrafos e incisos na ordem original)"""
+
+    __slots__ = ("key", "chapter", "section", "text", "children")
+
+    def __init__(self, key, chapter, section, text, children=()):
+        self.key = key
+        self.chapter = chapter
+        self.section = section
+        self.text = text
+        self.children = children
+
+    @property
+    def paragraphs(self):
+        return tuple(child for child in self.children if isinstance(child, Paragraph))
+
+    @property
+    def incisos(self):
+        return tuple(child for child in self.children if isinstance(child, Inciso))
+
+    def to_value(self):
+        value = {"chapter": self.chapter, "section": self.section, "text": self.text}
+        for child in self.children:
+            value[child.key] = child.to_value() if isinstance(child, Paragraph) else child.text
+        return value
+
+class Annex:
+    __slots__ = ("key", "text")
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+
+class Legislation:
+    """Documento estruturado (saída de extract_articles) em forma compacta"""
+
+    __slots__ = ("name", "date", "header", "units", "_index")
+
+    def __init__(self, name, date, header, units):
+        self.name = name
+        self.date = date
+        self.header = header
+        self.units = units
+        self._index = None
+
+    @classmethod
+    def from_dict(cls, name, data, pool=None):
+        """Converte o dicionário no formato de extract_articles"""
+        if pool is None:  # Um pool vazio é falso (__len__), então `pool or StringPool()` descartaria o do corpus
+            pool = StringPool()
+        units = []
+        for key, value in data.items():
+            if key in ("date", "header"):
+                continue
+            if isinstance(value, dict):
+                children = []
+                for child_key, child in value.items():
+                    if child_key in ("chapter", "section", "text"):
+                        continue
+                    if isinstance(child, dict):
+                        incisos = tuple(
+                            Inciso(_label(inciso_key), pool(text)) for inciso_key, text in child.items() if inciso_key != "text"
+                        )
+                        children.append(Paragraph(_label(child_key), pool(child.get("text")), incisos))
+                    elif child_key.startswith("p"):
+                        children.append(Paragraph(_label(child_key), pool(child)))
+                    else:
+                        children.append(Inciso(_label(child_key), pool(child)))
+                units.append(Article(
+                    _label(key), _label(value.get("chapter")), _label(value.get("section")),
+                    pool(value.get("text")), tuple(children),
+                ))
+            else:
+                units.append(Annex(_label(key), pool(value)))
+        return cls(_label(name), _label(data.get("date")), pool(data.get("header")), tuple(units))
+
+    def to_dict(self):
+        """Reconstrói exatamente o dicionário original"""
+        data = {}
+        if self.date is not None:
+            data["date"] = self.date
+        data["header"] = self.header
+        for unit in self.units:
+            data[unit.key] = unit.to_value() if isinstance(unit, Article) else unit.text
+        return data
+
+    def __getitem__(self, key):
+        """Artigo ou anexo pela chave (ex.: "art12", "anexo_i")"""
+        if self._index is None:
+            self._index = {unit.key: unit for unit in self.units}
+        return self._index[key]
+
+    @property
+    def articles(self):
+        return tuple(unit for unit in self.units if isinstance(unit, Article))
+
+    @property
+    def annexes(self):
+        return tuple(unit for unit in self.units if isinstance(unit, Annex))
+
+def load_corpus(corpus_dir=CORPUS_DIR):
+    """Carrega todo o corpus no modelo compacto, com um único pool de textos"""
+    pool = StringPool()
+    return {name: Legislation.from_dict(name, data, pool) for name, data in iter_documents(corpus_dir)}
+
+def measure_memory(corpus_dir=CORPUS_DIR):
+    """Compara a memória do corpus residente como dicionários e como modelo compacto.
+
+    Retorna {"dicts": bytes, "model": bytes, "saving": fração economizada}.
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        as_dicts = dict(iter_documents(corpus_dir))
+        dicts_size = tracemalloc.get_traced_memory()[0] - before
+        del as_dicts
+
+        before = tracemalloc.get_traced_memory()[0]
+        as_model = load_corpus(corpus_dir)
+        model_size = tracemalloc.get_traced_memory()[0] - before
+        del as_model
+    finally:
+        tracemalloc.stop()
+
+    return {"dicts": dicts_size, "model": model_size, "saving": 1 - model_size / dicts_size if dicts_size else 0.0}
+
+if __name__ == "__main__":
+    result = measure_memory()
+    print(f"Dicionários: {result['dicts'] / 1024:.0f} KiB | Modelo: {result['model'] / 1024:.0f} KiB | "
+          f"Economia: {result['saving']:.0%}")
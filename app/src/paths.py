@@ -0,0 +1,9 @@
+import os
+
+# Raiz dos dados do pipeline; pode ser trocada pela variável de ambiente (também vale para os workers)
+DATA_DIR = os.environ.get("SYNTIA_DATA_DIR", os.path.join("app", "data"))
+DOCUMENTS_PATH = os.environ.get("SYNTIA_DOCUMENTS", "documents.json")
+
+def data_path(*parts):
+    """Caminho dentro de DATA_DIR (ex.: data_path("texts"))"""
+    return os.path.join(DATA_DIR, *parts)
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import namedtuple
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Estágio do pipeline: entradas/saídas são funções que devolvem caminhos (arquivos ou pastas),
+# para que sejam resolvidas só depois de --data-dir ser aplicado; module é o módulo de entrada
+# do estágio, cujo código (com o dos módulos locais que ele importa) entra na assinatura
+Stage = namedtuple("Stage", ["name", "deps", "inputs", "outputs", "module", "run"])
+
+def _data(*parts):
+    # Importado aqui para respeitar SYNTIA_DATA_DIR definido pela linha de comando
+    from paths import data_path
+    return data_path(*parts)
+
+def _documents():
+    from paths import DOCUMENTS_PATH
+    return DOCUMENTS_PATH
+
+def _failed(results):
+    return [name for name, path in results.items() if path is None]
+
+def run_download(args):
+    from download_convert import download_documents, load_documents
+    return _failed(download_documents(load_documents(), max_workers=args.workers or 8, convert=False))
+
+def run_text(args):
+    from download_convert import convert_documents
+    return _failed(convert_documents(max_workers=args.workers or 8))
+
+def run_preprocess(args):
+    from preprocess_legislation import preprocess_legislation
+    return preprocess_legislation(force=args.force, workers=args.workers, output_format=args.format)
+
+def run_references(args):
+    from preprocess_references import preprocess_references
+    return preprocess_references(force=args.force, workers=args.workers, output_format=args.format)
+
+def run_search_index(args):
+    from search_index import build_index
+    build_index()
+    return []
+
+def run_dense_index(args):
+    from dense_index import build_index
+    build_index()
+    return []
+
+def run_map(args):
+    from legislation_map import analyze_legislation_references
+    return analyze_legislation_references(workers=args.workers)
+
+# DAG: download -> text -> preprocess -> references -> search_index/dense_index; o mapa de citações é
+# gerado a partir dos textos. Os índices são estágios para não ficarem mais antigos que o corpus
+STAGES = [
+    Stage("download", (), lambda: [_documents()], lambda: [_data("blobs", "refs.json")],
+          "download_convert", run_download),
+    Stage("text", ("download",), lambda: [_data("blobs", "refs.json")], lambda: [_data("texts")],
+          "download_convert", run_text),
+    Stage("preprocess", ("text",), lambda: [_data("texts")], lambda: [_data("preprocess")],
+          "preprocess_legislation", run_preprocess),
+    Stage("references", ("preprocess",), lambda: [_data("preprocess")], lambda: [_data("preprocess_references")],
+          "preprocess_references", run_references),
+    Stage("search_index", ("references",), lambda: [_data("preprocess_references")], lambda: [_data("search_index")],
+          "search_index", run_search_index),
+    Stage("dense_index", ("references",), lambda: [_data("preprocess_references")], lambda: [_data("dense_index")],
+          "dense_index", run_dense_index),
+    Stage("map", ("text",), lambda: [_data("texts")],
+          lambda: [_data("legislation_map.json"), _data("legislation_map_details.json"), _data("citation_graph.bin")],
+          "legislation_map", run_map),
+]
+STAGE_MAP = {stage.name: stage for stage in STAGES}
+# Estágios cuja saída depende de --format; nos demais a opção não invalida a execução anterior
+FORMAT_STAGES = ("preprocess", "references")
+
+def _listing(path):
+    """(caminho, tamanho, mtime) de um arquivo ou de todos os arquivos de uma pasta"""
+    if os.path.isfile(path):
+        stat = os.stat(path)
+        return [(path, stat.st_size, stat.st_mtime_ns)]
+    entries = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for filename in sorted(files):
+            file_path = os.path.join(root, filename)
+            stat = os.stat(file_path)
+            entries.append((os.path.relpath(file_path, path), stat.st_size, stat.st_mtime_ns))
+    return entries
+
+def signature(stage, args):
+    """Assinatura das entradas (listagem de arquivos), do código do estágio e das opções que mudam a saída.
+
+    Usa apenas stat() e o código-fonte dos módulos, sem importá-los, para que
+    uma execução sem alterações não pague o custo das dependências pesadas.
+    O código é o do módulo de entrada e de todos os módulos locais que ele
+    importa (stage_cache.source_fingerprint), sem listas mantidas à mão.
+    """
+    # Importado aqui: stage_cache resolve CACHE_DIR ao ser importado, depois de --data-dir
+    from stage_cache import source_fingerprint
+
+    digest = hashlib.sha256()
+    for path in stage.inputs():
+        digest.update(json.dumps([path, _listing(path) if os.path.exists(path) else None]).encode("utf-8"))
+    digest.update(source_fingerprint(os.path.join(SRC_DIR, f"{stage.module}.py")).encode("utf-8"))
+    if stage.name in FORMAT_STAGES:
+        digest.update(args.format.encode("utf-8"))
+    return digest.hexdigest()
+
+class PipelineState:
+    """Assinaturas da última execução bem-sucedida de cada estágio"""
+
+    def __init__(self, path):
+        self.path = path
+        self.signatures = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.signatures = json.load(f)
+
+    def is_fresh(self, stage, stage_signature):
+        return (
+            self.signatures.get(stage.name) == stage_signature
+            and all(os.path.exists(path) for path in stage.outputs())
+        )
+
+    def record(self, stage, stage_signature):
+        self.signatures[stage.name] = stage_signature
+
+    def save(self):
+        """Grava as assinaturas de forma atômica"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.signatures, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def plan(targets, with_deps=True):
+    """Estágios necessários para os alvos, em ordem topológica (dependências primeiro).
+
+    Com with_deps=False (--only), apenas os próprios alvos, na mesma ordem,
+    executados sobre as entradas que já existem.
+    """
+    ordered = []
+
+    def visit(name):
+        if name in ordered:
+            return
+        if with_deps:
+            for dep in STAGE_MAP[name].deps:
+                visit(dep)
+        ordered.append(name)
+
+    for target in targets:
+        visit(target)
+    return [STAGE_MAP[name] for name in ordered]
+
+def run_pipeline(targets, args):
+    """Executa os estágios desatualizados, estilo make. Retorna {estágio: status}.
+
+    Um estágio roda quando a assinatura das entradas mudou, alguma saída
+    não existe ou ele foi forçado (--force, ou --refresh para o download).
+    A assinatura é recalculada depois que os estágios anteriores rodam; como
+    eles só regravam o que mudou, um estágio anterior sem efeito não
+    propaga execuções. Estágios com falhas não registram a assinatura e
+    são refeitos na próxima execução.
+    """
+    from instrumentation import log_event
+
+    state = PipelineState(_data("cache", "pipeline.json"))
+    statuses = {}
+
+    for stage in plan(targets, with_deps=not args.only):
+        forced = args.force or (args.refresh and stage.name == "download")
+        if any(statuses.get(dep) in ("failed", "skipped") for dep in stage.deps):
+            statuses[stage.name] = "skipped"
+            print(f"[✘] {stage.name}: não executado (falha em um estágio anterior)")
+            continue
+
+        stage_signature = signature(stage, args)
+        upstream_pending = any(statuses.get(dep) in ("would run", "would run (after upstream)") for dep in stage.deps)
+        if not forced and state.is_fresh(stage, stage_signature) and not upstream_pending:
+            statuses[stage.name] = "up to date"
+            print(f"[✔] {stage.name}: atualizado")
+            continue
+
+        if args.dry_run:
+            # Sem executar não há como saber se o estágio anterior muda as entradas
+            statuses[stage.name] = "would run (after upstream)" if upstream_pending else "would run"
+            print(f"[…] {stage.name}: seria executado")
+            continue
+
+        print(f"[…] {stage.name}: executando")
+        start = time.perf_counter()
+        failures = stage.run(args)
+        elapsed = time.perf_counter() - start
+        if failures:
+            statuses[stage.name] = "failed"
+            print(f"[✘] {stage.name}: {len(failures)} falhas em {elapsed:.1f}s (será refeito na próxima execução)")
+        else:
+            statuses[stage.name] = "ran"
+            state.record(stage, stage_signature)
+            print(f"[✔] {stage.name}: concluído em {elapsed:.1f}s")
+        log_event("pipeline", stage=stage.name, status=statuses[stage.name], wall_s=elapsed, failures=len(failures or []))
+        state.save()
+
+    return statuses
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Executa o pipeline download -> text -> preprocess -> references -> search_index/dense_index "
+                    "(e map), "
+                    "refazendo apenas os estágios cujas entradas mudaram. Cada alvo inclui suas dependências, "
+                    "a menos que --only seja usado."
+    )
+    parser.add_argument("targets", nargs="*", metavar="estágio",
+                        help=f"estágios alvo, com suas dependências ({', '.join(STAGE_MAP)}); padrão: todos")
+    parser.add_argument("--only", action="store_true",
+                        help="executa só os estágios alvo, sem as dependências, sobre as entradas já existentes "
+                             "(ex.: --only search_index dense_index)")
+    parser.add_argument("--force", action="store_true", help="refaz os estágios mesmo sem alterações")
+    parser.add_argument("--refresh", action="store_true", help="revalida os documentos no servidor (download)")
+    parser.add_argument("--dry-run", action="store_true", help="mostra o que seria executado, sem executar")
+    parser.add_argument("--list", action="store_true", help="lista os estágios e suas dependências")
+    parser.add_argument("--data-dir", help="pasta de dados (padrão: app/data ou SYNTIA_DATA_DIR)")
+    parser.add_argument("--documents", help="lista de documentos (padrão: documents.json ou SYNTIA_DOCUMENTS)")
+    parser.add_argument("--workers", type=int, help="processos/threads por estágio")
+    parser.add_argument("--format", choices=("json", "jsonl"), default="json", help="formato dos estágios preprocess/references")
+    parser.add_argument("--metrics", action="store_true", help="grava log estruturado e relatório JSON da execução (data/metrics)")
+    parser.add_argument("--profile-patterns", action="store_true",
+                        help="com --metrics, mede também tempo e matches de cada padrão (mais lento)")
+    args = parser.parse_args(argv)
+
+    unknown = [target for target in args.targets if target not in STAGE_MAP]
+    if unknown:
+        parser.error(f"estágio desconhecido: {', '.join(unknown)}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Variáveis de ambiente, e não argumentos, para valer também nos processos dos workers
+    if args.data_dir:
+        os.environ["SYNTIA_DATA_DIR"] = args.data_dir
+    if args.documents:
+        os.environ["SYNTIA_DOCUMENTS"] = args.documents
+
+    if args.list:
+        for stage in STAGES:
+            print(f"{stage.name:<12} <- {', '.join(stage.deps) or '-'}")
+        return 0
+
+    if args.metrics or args.profile_patterns:
+        from instrumentation import start_run, write_report, stop_run
+        start_run(patterns=args.profile_patterns)
+        try:
+            statuses = run_pipeline(args.targets or [stage.name for stage in STAGES], args)
+        finally:
+            write_report()
+            stop_run()
+    else:
+        statuses = run_pipeline(args.targets or [stage.name for stage in STAGES], args)
+    return 1 if {"failed", "skipped"} & set(statuses.values()) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
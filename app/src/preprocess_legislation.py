@@ -1,185 +1,403 @@
+import io
 import os
 import re
-import json
+import sys
 from datetime import datetime
+from paths import data_path
+from stage_cache import StageCache, source_fingerprint
+from batch import run_batch, report_failures
+from functools import partial
+from collections import namedtuple
+from jsonl_corpus import OUTPUT_FORMATS, save_legislation, remove_legislation
+from citation_graph import CITATION_PATTERN, TYPE_ALIASES
+from instrumentation import measure, profile_patterns, patterns_enabled, file_size
 
 # Caminho da pasta contendo os textos
-TEXTS_DIR = "app/data/texts"
+TEXTS_DIR = data_path("texts")
+OUTPUT_DIR = data_path("preprocess")
+
+# Padrões de data, na ordem de prioridade; numeric indica mês em número (DD/MM/AAAA)
+DATE_PATTERNS = [
+    (r"(?:DE|,)\s*(?P<day>\d{1,2})\s*DE\s*(?P<month>[A-ZÇÃÊÓÍÉÂÔ]+)\s*DE\s*(?P<year>\d{4})", False),  # 28 DE JUNHO DE 2013
+    (r"(?:DE|,)\s*(?P<day>\d{1,2})[/](?P<month>\d{1,2})[/](?P<year>\d{4})", True),  # 17/11/2009
+    (r"(?:DE|,)\s*(?P<day>\d{1,2})\s*[DE\s]*(?P<month>[A-ZÇÃÊÓÍÉÂÔ]+)\s*[DE\s]*(?P<year>\d{4})", False),  # 7 de maio de 2001
+    (r"(?:DE|,)\s*(?P<day>\d{1,2})\s*[/]\s*(?P<month>\d{1,2})\s*[/]\s*(?P<year>\d{4})", True),  # 10/02/2009
+    (r"(?:DE|,)\s*(?P<day>\d{1,2})\s*,\s*de\s*(?P<month>[a-zçãêóíéâô]+)\s*de\s*(?P<year>\d{4})", False),  # 22, de abril de 2016
+    (r"(?:DE|,)\s*(?P<day>\d{1,2})\s*,\s*DE\s*(?P<month>[A-ZÇÃÊÓÍÉÂÔ]+)\s*DE\s*(?P<year>\d{4})", False),  # 22, DE ABRIL DE 2016
+    (r"(?:Portaria|Resolu[çc][ãa]o|Instru[çc][ãa]o Normativa)\s*(?:n[º°°]|N[º°]|n\.|N\.)\s*\d+\s*,\s*[Dd][Ee]\s*(?P<day>\d{1,2})\s*[Dd][Ee]\s*(?P<month>[a-zçãêóíéâô]+)\s*[Dd][Ee]\s*(?P<year>\d{4})", False),
+    (r"NOTA TÉCNICA(?: CONJUNTA)?\s*\d+/\d+\s*[–-]\s*[A-Z/]+\s*(?P<day>\d{1,2})\s*,\s*de\s*(?P<month>[a-zçãêóíéâô]+)\s*de\s*(?P<year>\d{4})", False),
+    (r"(?P<day>\d{1,2})\s*,\s*de\s*(?P<month>[a-zçãêóíéâô]+)\s*de\s*(?P<year>\d{4})", False),
+]
+
+MONTH_MAP = {
+    'JANEIRO': '01', 'FEVEREIRO': '02', 'MARÇO': '03', 'MARCO': '03',
+    'ABRIL': '04', 'MAIO': '05', 'JUNHO': '06', 'JULHO': '07',
+    'AGOSTO': '08', 'SETEMBRO': '09', 'OUTUBRO': '10', 'NOVEMBRO': '11',
+    'DEZEMBRO': '12', 'JAN': '01', 'FEV': '02', 'MAR': '03',
+    'ABR': '04', 'MAI': '05', 'JUN': '06', 'JUL': '07',
+    'AGO': '08', 'SET': '09', 'OUT': '10', 'NOV': '11', 'DEZ': '12'
+}
+
+# Órgãos emissores, do mais específico para o mais geral
+ISSUERS = [
+    (r"Ag[êe]ncia\s+Nacional\s+de\s+Vigil[âa]ncia\s+Sanit[áa]ria|ANVISA", "ANVISA"),
+    (r"Secret[áa]ri[ao]\s+de\s+Vigil[âa]ncia\s+Sanit[áa]ria", "SVS/MS"),
+    (r"Minist[ée]rio\s+da\s+Sa[úu]de", "MS"),
+    (r"Presid[êe]n(?:cia|te)\s+da\s+Rep[úu]blica", "PR"),
+]
+
+def _metadata_pattern():
+    """Datas, ato (tipo e número) e órgão emissor em uma única alternação.
+
+    Os grupos de cada padrão de data são renomeados com o índice do padrão
+    (ex.: day -> day_2) e cada padrão fica dentro de um grupo date_<índice>.
+    """
+    alternatives = [
+        f"(?P<date_{i}>" + re.sub(r"\(\?P<(\w+)>", rf"(?P<\1_{i}>", pattern) + ")"
+        for i, (pattern, _) in enumerate(DATE_PATTERNS)
+    ]
+    alternatives.append(f"(?P<act>{CITATION_PATTERN.pattern})")
+    alternatives += [f"(?P<issuer_{i}>{pattern})" for i, (pattern, _) in enumerate(ISSUERS)]
+    # Todas as alternativas começam por um destes caracteres; a pré-verificação evita testá-las em cada posição
+    return re.compile(r"(?=[\d,DPRINASMLC])(?:" + "|".join(alternatives) + ")", re.IGNORECASE)
+
+METADATA_PATTERN = _metadata_pattern()
+# Padrões de data isolados, usados apenas na medição por padrão (instrumentation)
+DATE_PROFILE = [(f"date_{i}", re.compile(pattern, re.IGNORECASE)) for i, (pattern, _) in enumerate(DATE_PATTERNS)]
+
+# Janelas do início do texto examinadas em sequência; a seguinte só é usada se
+# a data não aparecer na anterior. Datas além delas são de atos citados no corpo
+HEADER_WINDOWS = (2000, 20000)
+WINDOW_OVERLAP = 200  # Trecho do fim da janela anterior varrido de novo (padrões cortados na borda)
+
+def _format_date(match, index):
+    day, month, year = match.group(f"day_{index}", f"month_{index}", f"year_{index}")
+    if DATE_PATTERNS[index][1]:  # Formato numérico (DD/MM/AAAA)
+        return f"{month.zfill(2)}/{day.zfill(2)}/{year}"
+    return f"{MONTH_MAP.get(month.upper(), '01')}/{day.zfill(2)}/{year}"
+
+def _act(match):
+    doc_type = next(canonical for pattern, canonical in TYPE_ALIASES if pattern.fullmatch(match.group("type")))
+    return doc_type, str(int(match.group("number").replace(".", "")))
+
+def extract_metadata(content, windows=HEADER_WINDOWS):
+    """Extrai data de publicação, tipo e número do ato e órgão emissor do cabeçalho.
+
+    O início do texto é varrido uma única vez por METADATA_PATTERN; a janela
+    só é ampliada quando a data não foi encontrada. Retorna
+    {"date": "MM/DD/AAAA", "type": "RDC", "number": "658", "issuer": "ANVISA"},
+    com None nos campos não encontrados.
+    """
+    metadata = {"date": None, "type": None, "number": None, "issuer": None}
+    issuers = set()
+    start = 0
+
+    for size in windows:
+        end = min(size, len(content))
+        for match in METADATA_PATTERN.finditer(content, max(start - WINDOW_OVERLAP, 0), end):
+            group = match.lastgroup
+            if group.startswith("date_"):
+                if metadata["date"] is None:
+                    metadata["date"] = _format_date(match, int(group[5:]))
+                    # Datas no formato "Portaria nº 344, de ..." também identificam o ato
+                    act = CITATION_PATTERN.search(match.group())
+                    if act and metadata["type"] is None:
+                        metadata["type"], metadata["number"] = _act(act)
+            elif group == "act":
+                if metadata["type"] is None:
+                    metadata["type"], metadata["number"] = _act(match)
+            else:
+                issuers.add(int(group[7:]))
+        start = end
+        if metadata["date"] or end == len(content):
+            break
+
+    if issuers:
+        metadata["issuer"] = ISSUERS[min(issuers)][1]
+    return metadata
 
 def extract_publication_date(content):
     """Extrai a data de publicação do texto"""
-    # Primeiro normalizamos caracteres especiais
-    content = content.replace('�', 'ã').replace('�', 'ç')
-    
-    # Padrões para datas no texto
-    date_patterns = [
-        r"(?:DE|,)\s*(\d{1,2})\s*DE\s*([A-ZÇÃÊÓÍÉÂÔ]+)\s*DE\s*(\d{4})",  # 28 DE JUNHO DE 2013
-        r"(?:DE|,)\s*(\d{1,2})[/](\d{1,2})[/](\d{4})",  # 17/11/2009
-        r"(?:DE|,)\s*(\d{1,2})\s*[DE\s]*([A-ZÇÃÊÓÍÉÂÔ]+)\s*[DE\s]*(\d{4})",  # 7 de maio de 2001
-        r"(?:DE|,)\s*(\d{1,2})\s*[/]\s*(\d{1,2})\s*[/]\s*(\d{4})",  # 10/02/2009
-        r"(?:DE|,)\s*(\d{1,2})\s*,\s*de\s*([a-zçãêóíéâô]+)\s*de\s*(\d{4})", #22, de abril de 2016
-        r"(?:DE|,)\s*(\d{1,2})\s*,\s*DE\s*([A-ZÇÃÊÓÍÉÂÔ]+)\s*DE\s*(\d{4})", #22, DE ABRIL DE 2016
-        r"(?:Portaria|Resolu[çc][ãa]o|Instru[çc][ãa]o Normativa)\s*(?:n[º°°]|N[º°]|n\.|N\.)\s*\d+\s*,\s*[Dd][Ee]\s*(\d{1,2})\s*[Dd][Ee]\s*([a-zçãêóíéâô]+)\s*[Dd][Ee]\s*(\d{4})",
-        r"NOTA TÉCNICA(?: CONJUNTA)?\s*\d+/\d+\s*[–-]\s*[A-Z/]+\s*(\d{1,2})\s*,\s*de\s*([a-zçãêóíéâô]+)\s*de\s*(\d{4})",
-        r"(\d{1,2})\s*,\s*de\s*([a-zçãêóíéâô]+)\s*de\s*(\d{4})"
-    ]
-    
-    month_map = {
-        'JANEIRO': '01', 'FEVEREIRO': '02', 'MARÇO': '03', 'MARCO': '03',
-        'ABRIL': '04', 'MAIO': '05', 'JUNHO': '06', 'JULHO': '07',
-        'AGOSTO': '08', 'SETEMBRO': '09', 'OUTUBRO': '10', 'NOVEMBRO': '11',
-        'DEZEMBRO': '12', 'JAN': '01', 'FEV': '02', 'MAR': '03',
-        'ABR': '04', 'MAI': '05', 'JUN': '06', 'JUL': '07',
-        'AGO': '08', 'SET': '09', 'OUT': '10', 'NOV': '11', 'DEZ': '12'
-    }
-    
-    for pattern in date_patterns:
-        match = re.search(pattern, content, re.IGNORECASE)
-        if match:
-            groups = match.groups()
-            if len(groups) == 3:  # Formato com mês por extenso
-                day, month, year = groups
-                month = month.upper()
-                month_num = month_map.get(month, '01')
-                return f"{month_num}/{day.zfill(2)}/{year}"
-            elif len(groups) == 3:  # Formato numérico (DD/MM/YYYY)
-                day, month, year = groups
-                return f"{month.zfill(2)}/{day.zfill(2)}/{year}"
-    
-    return None
+    return extract_metadata(content)["date"]
+
+# Normalização de caracteres, aplicada uma vez por bloco de texto. As aspas
+# tipográficas não estão entre os caracteres permitidos e são removidas junto
+SPECIAL_CHARS_PATTERN = re.compile(r"[^\w\s.,;:()º°/-§]")
+# Espaços são reduzidos a um só, mas as quebras de linha (uma ou duas seguidas)
+# são preservadas porque marcam o início dos incisos
+SPACES_PATTERN = re.compile(r"[^\S\n]{2,}|[^\S \n]")
+NEWLINES_PATTERN = re.compile(r"\n(?: ?\n)+")
+
+# Marcadores das unidades, em um único padrão (mesmas expressões usadas antes nos re.split)
+TOP_MARKER = r"CAPÍTULO+[IVXLCDM]|CAPÍTULO\s+[IVXLCDM]+|Seção\s+[IVXLCDM]+|Art\.\s*\d{1,3}[º°]?|ANEXO\s+[IVXLCDM]+"
+PARAGRAPH_MARKER = r"§\s*\d{1,3}[º°]?|Parágrafo único"
+INCISO_MARKER = r"\n[IVX]{1,8}[.]?\s?"
+# A pré-verificação do primeiro caractere evita testar as alternativas em cada posição do texto
+SEGMENT_PATTERN = re.compile(
+    f"(?=[CSAP§\\n])(?:(?P<top>{TOP_MARKER})|(?P<paragraph>{PARAGRAPH_MARKER})|(?P<inciso>{INCISO_MARKER}))"
+)
+
+CHUNK_SIZE = 1 << 20  # Caracteres lidos por vez
+LOOKAHEAD = 64        # Margem no fim do bloco para não cortar um marcador ao meio
+
+# Unidade do texto: kind é header, chapter, section, article, paragraph, inciso ou annex;
+# marker é o marcador original (ex.: "Art. 5º") e text o texto bruto até o próximo marcador
+Segment = namedtuple("Segment", ["kind", "marker", "text"])
+
+def _normalize_spaces(text):
+    return NEWLINES_PATTERN.sub("\n\n", SPACES_PATTERN.sub(" ", text))
+
+def normalize_chunk(text):
+    """Remove caracteres especiais e reduz os espaços de um bloco"""
+    return _normalize_spaces(SPECIAL_CHARS_PATTERN.sub("", text))
 
 def clean_text(text):
     """Remove caracteres especiais e normaliza espaços"""
-    text = re.sub(r"[“”‘’]", '"', text)  # Normaliza aspas
-    text = re.sub(r"[^\w\s.,;:()º°/-§]", "", text)  # Remove caracteres especiais
-    return text.strip()
+    return normalize_chunk(text).strip()
 
-def extract_articles(content):
-    # Extrai a data de publicação primeiro
-    publication_date = extract_publication_date(content)
-    
-    # Regex para capturar títulos dos artigos e anexos
-    sections = re.split(r'(CAPÍTULO+[IVXLCDM]|CAPÍTULO\s+[IVXLCDM]+|Seção\s+[IVXLCDM]+|Art\.\s*\d{1,3}[º°]?|ANEXO\s+[IVXLCDM]+)', content)
+def _strip(text):
+    """Remove espaços e pontos do início (ex.: ". Texto") e espaços do fim"""
+    return text.strip().lstrip('.').lstrip()
 
-    # Criando o dicionário estruturado
-    articles_dict = {}
+def _collapse(text):
+    """Equivale a re.sub(r"\\s+", " ", ...) sobre um texto sem espaços nas pontas"""
+    return " ".join(text.split())
+
+def _title(marker):
+    return marker.strip().replace(".", "").replace("º", "").replace("°", "").replace("\n", "")
 
-    # Adiciona a data de publicação se encontrada
-    if publication_date:
-        articles_dict["date"] = publication_date
+def _top_kind(marker):
+    if marker.startswith("CAPÍTULO"):
+        return "chapter"
+    if marker.startswith("Seção"):
+        return "section"
+    if marker.startswith("Art"):
+        return "article"
+    return "annex"
 
-    # Processar o cabeçalho, excluindo tudo antes de "Dispõe sobre" ou "Assunto"
-    header = sections[0].strip()
-    match = re.search(r'(Dispõe sobre|Assunto)', header)
-    if match:
-        header = header[match.start():].strip().lstrip('.').lstrip()  # Mantém apenas o texto a partir da palavra-chave encontrada
+def iter_segments(stream, chunk_size=CHUNK_SIZE):
+    """Segmenta o texto lido de `stream` em blocos, sem carregá-lo inteiro.
 
-    articles_dict["header"] = re.sub(r"\s+", " ", header)
+    Gera Segment(kind, marker, text) na ordem do documento: primeiro o
+    cabeçalho, depois capítulos, seções, artigos, parágrafos, incisos e
+    anexos. Parágrafos e incisos só são reconhecidos dentro de artigos, e um
+    inciso no início do texto de um artigo ou parágrafo faz parte do texto,
+    como no re.split original. A memória usada é limitada pelo tamanho do
+    bloco mais o da maior unidade.
 
+    A saída é a do re.split original, exceto quando um marcador contém
+    espaço que não é o ASCII: os espaços de cada bloco são normalizados
+    antes da busca dos marcadores, e não depois. NBSP, tabulação e "\r"
+    viram espaço, então "Art.\xa05º" gera "art5" (antes "art\xa05"), "§\xa01º"
+    gera "p1" e "Parágrafo\túnico" passa a ser reconhecido como parágrafo
+    (antes ficava no texto do parágrafo anterior). Arquivos lidos por
+    process_legislation já chegam com "\r\n" convertido em "\n"; o "\r"
+    só aparece em streams abertos com newline="".
+    """
+    buffer = ""
+    parts = []          # Texto da unidade corrente que já saiu do buffer
+    pending_space = ""  # Espaços do fim do bloco, normalizados junto com o bloco seguinte
+    scan = start = 0
+    kind, marker = "header", ""
+    context = "header"
+    eof = False
+
+    while not eof:
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        chunk = pending_space + SPECIAL_CHARS_PATTERN.sub("", chunk)
+        if eof:
+            pending_space = ""
+        else:
+            stripped = chunk.rstrip()
+            pending_space = chunk[len(stripped):]
+            chunk = stripped
+        buffer += _normalize_spaces(chunk)
+
+        limit = len(buffer) if eof else len(buffer) - LOOKAHEAD
+        for match in SEGMENT_PATTERN.finditer(buffer, scan):
+            if match.end() > limit:
+                break
+            scan = match.end()
+            group = match.lastgroup
+            if group != "top" and context != "article":
+                continue
+            text = buffer[start:match.start()]
+            if parts:
+                text = "".join(parts) + text
+            if group == "inciso" and kind != "inciso" and not _strip(text):
+                continue
+            yield Segment(kind, marker, text)
+            parts = []
+            marker = match.group()
+            kind = _top_kind(marker) if group == "top" else group
+            if group == "top":
+                context = kind
+            start = match.end()
+        else:
+            scan = max(scan, limit)
+
+        # O trecho já varrido sai do buffer; só a margem final é varrida de novo
+        if scan > start:
+            parts.append(buffer[start:scan])
+        buffer = buffer[scan:]
+        scan = start = 0
+
+    yield Segment(kind, marker, "".join(parts) + buffer)
+
+def _inciso_items(incisos):
+    for marker, text in incisos:
+        yield _strip(marker).replace('.', ''), _collapse(_strip(text))
+
+def _article_dict(chapter, section, caption, paragraphs, incisos):
+    """Monta o artigo a partir das unidades brutas, com as mesmas regras do re.split original"""
+    section_dict = {"chapter": chapter, "section": section}
+    if paragraphs:
+        # Incisos do caput de um artigo com parágrafos continuam no texto do caput
+        caption += "".join(marker + text for marker, text in incisos)
+        section_dict["text"] = _collapse(_strip(_strip(caption)))
+        for marker, text, para_incisos in paragraphs:
+            para_key = "p" if "Parágrafo único" in marker else (
+                marker.strip().replace("§", "p").replace("º", "").replace("°", "").replace(" ", "")
+            )
+            if para_incisos:
+                section_dict[para_key] = {"text": _collapse(_strip(text)), **dict(_inciso_items(para_incisos))}
+            else:
+                section_dict[para_key] = _collapse(_strip(text))
+    else:
+        section_dict["text"] = _collapse(_strip(caption))
+        section_dict.update(_inciso_items(incisos))
+    return section_dict
+
+def build_articles(segments):
+    """Monta o dicionário estruturado (formato de extract_articles) a partir de iter_segments"""
+    articles_dict = {}
+    window = []
+    window_size = 0
     current_chapter = None
     current_section = None
+    article = None  # [chave, capítulo, seção, caput, parágrafos, incisos]
 
-    # Itera nos pares (Título, Texto)
-    for i in range(1, len(sections) - 1, 2):
-        title = sections[i].strip().replace(".", "").replace("º", "").replace("°", "").replace("\n", "")   # Remove pontuação desnecessária
-        text = sections[i + 1].strip().lstrip('.').lstrip()  # Texto do artigo
-
-        # Verifica se é um capítulo
-        if title.startswith("CAPÍTULO"):
-            current_chapter = title.replace("CAPÍTULO", "").strip()
-            current_section = None
-            continue
-
-        # Verifica se é uma seção
-        if title.startswith("Seção"):
-            current_section = title.replace("Seção", "").strip()
-            continue
-
-        # Verifica se é artigo ou anexo
-        if title.startswith("Art"):
-            key = title.replace("Art", "art").replace(" ", "")  # Ex: "Art 1º" -> "art1"
-            # Dividir o artigo pelos parágrafos (ex: "§ 1º", "§ 2º", "Parágrafo único")
-            paragraphs = re.split(r'(§\s*\d{1,3}[º°]?|Parágrafo único)', text)
-
-            # Estrutura do artigo
-            section_dict = {"chapter": current_chapter, "section": current_section}
-    
-            # Se houver parágrafos, organizar a estrutura
-            if len(paragraphs) > 1:
-                clean_text = paragraphs[0].strip().lstrip('.').lstrip()  # Texto antes do primeiro parágrafo
-                section_dict["text"] = re.sub(r"\s+", " ", clean_text)
-                
-                for j in range(1, len(paragraphs) - 1, 2):
-                    para_key = paragraphs[j].strip().replace("§", "p").replace("º", "").replace("°", "").replace(" ", "")
-                    # Ajuste para "Parágrafo único"
-                    if "Parágrafo único" in paragraphs[j]:
-                        para_key = "p"
-                    # Limpa pontos e espaços extras no início do texto
-                    clean_text = paragraphs[j + 1].strip().lstrip('.').lstrip()
-    
-                    # Dividir incisos dentro do parágrafo
-                    incisos = re.split(r'(\n[IVX]{1,8}[.]?\s?)', clean_text)
-                    inciso_dict = {}
-    
-                    if len(incisos) > 1:
-                        section_dict[para_key] = {"text": re.sub(r"\s+", " ", incisos[0].strip())}  # Texto antes do primeiro inciso
-    
-                        for k in range(1, len(incisos) - 1, 2):
-                            inciso_key = f"{incisos[k].strip().lstrip('.').lstrip().replace('.', '')}"
-                            inciso_text = incisos[k + 1].strip().lstrip('.').lstrip()
-                            inciso_dict[inciso_key] = re.sub(r"\s+", " ", inciso_text)
-    
-                        section_dict[para_key].update(inciso_dict)
-                    else:
-                        section_dict[para_key] = re.sub(r"\s+", " ", clean_text)
-            else:
-                # Se não houver parágrafos, dividir diretamente por incisos
-                incisos = re.split(r'(\n[IVX]{1,8}[.]?\s?)', text)
-                if len(incisos) > 1:
-                    section_dict["text"] = re.sub(r"\s+", " ", incisos[0].strip())  # Texto antes do primeiro inciso
-                    inciso_dict = {}
-                    
-                    for k in range(1, len(incisos) - 1, 2):
-                        inciso_key = f"{incisos[k].strip().lstrip('.').lstrip().replace('.', '')}"
-                        inciso_text = incisos[k + 1].strip().lstrip('.').lstrip()
-                        inciso_dict[inciso_key] = re.sub(r"\s+", " ", inciso_text)
-    
-                    section_dict.update(inciso_dict)
-                else:
-                    section_dict["text"] = re.sub(r"\s+", " ", text)
-    
-            # Adiciona ao dicionário principal
-            articles_dict[key] = section_dict
+    def flush():
+        if article is not None:
+            key, *parts = article
+            articles_dict[key] = _article_dict(*parts)
+
+    for segment in segments:
+        # Só o início do documento é guardado para a busca dos metadados
+        if window_size < HEADER_WINDOWS[-1]:
+            window.append(segment.marker + segment.text[:HEADER_WINDOWS[-1] - window_size])
+            window_size += len(window[-1])
+
+        kind = segment.kind
+        if kind == "header":
+            # Processar o cabeçalho, excluindo tudo antes de "Dispõe sobre" ou "Assunto"
+            header = segment.text.strip()
+            match = re.search(r'(Dispõe sobre|Assunto)', header)
+            if match:
+                header = _strip(header[match.start():])
+            articles_dict["header"] = _collapse(header)
+        elif kind == "paragraph":
+            article[4].append((segment.marker, segment.text, []))
+        elif kind == "inciso":
+            (article[4][-1][2] if article[4] else article[5]).append((segment.marker, segment.text))
         else:
-            key = title.replace("ANEXO", "anexo").replace(" ", "_").lower()  # Ex: "ANEXO I" -> "anexoI"
-            articles_dict[key] = re.sub(r"\s+", " ", text)
+            flush()
+            article = None
+            title = _title(segment.marker)
+            if kind == "chapter":
+                current_chapter = title.replace("CAPÍTULO", "").strip()
+                current_section = None
+            elif kind == "section":
+                current_section = title.replace("Seção", "").strip()
+            elif kind == "article":
+                key = title.replace("Art", "art").replace(" ", "")  # Ex: "Art 1º" -> "art1"
+                article = [key, current_chapter, current_section, segment.text, [], []]
+            else:
+                key = title.replace("ANEXO", "anexo").replace(" ", "_").lower()  # Ex: "ANEXO I" -> "anexo_i"
+                articles_dict[key] = _collapse(_strip(segment.text))
+    flush()
+
+    # A data vem antes das demais chaves, como no formato original
+    publication_date = extract_metadata("".join(window))["date"]
+    return {"date": publication_date, **articles_dict} if publication_date else articles_dict
 
-    return articles_dict
+def extract_articles(content):
+    """Estrutura um texto já carregado (ver iter_segments para textos grandes)"""
+    return build_articles(iter_segments(io.StringIO(content)))
 
-def process_legislation(file_path):
-    """Lê e estrutura o texto legal"""
+def process_legislation(file_path, chunk_size=CHUNK_SIZE):
+    """Lê e estrutura o texto legal em blocos, sem carregar o arquivo inteiro"""
     with open(file_path, "r", encoding="utf-8") as file:
-        content = file.read()
-    # Normaliza o texto
-    content = clean_text(content)
-    legislation = extract_articles(content)
-    return legislation
+        return build_articles(iter_segments(file, chunk_size))
+
+def output_path_for(file_path, output_format="json"):
+    """Caminho do JSON (ou JSON Lines) estruturado correspondente a um texto"""
+    return os.path.join(OUTPUT_DIR, f"{os.path.basename(file_path).split('.')[0]}.{output_format}")
+
+def process_file(file_path, output_format="json"):
+    """Estrutura um texto e salva o JSON correspondente (executado nos workers)"""
+    output_file = output_path_for(file_path, output_format)
+    with measure("preprocess_legislation", os.path.basename(file_path)) as record:
+        structured_legislation = process_legislation(file_path)
+        save_legislation(structured_legislation, output_file, output_format)
+        if record is not None:
+            record.update(
+                bytes_in=file_size(file_path), bytes_out=file_size(output_file),
+                articles=sum(isinstance(value, dict) for value in structured_legislation.values()),
+            )
+            if patterns_enabled():
+                # Os padrões de data só são aplicados ao cabeçalho
+                with open(file_path, "r", encoding="utf-8") as file:
+                    profile_patterns(record, "DATE_PATTERNS", file.read(HEADER_WINDOWS[-1]), DATE_PROFILE)
+    return output_file
 
-def preprocess_legislation():
-    # Processa todos os arquivos da pasta
-    os.makedirs("app/data/preprocess", exist_ok=True)  # Cria a pasta se não existir
+def _preprocess_legislation(force, workers, chunksize, output_format, record):
+    os.makedirs(OUTPUT_DIR, exist_ok=True)  # Cria a pasta se não existir
 
-    for filename in os.listdir(TEXTS_DIR):
+    # O cache é invalidado quando o código do estágio (ou de um módulo local que ele importa) muda
+    cache = StageCache("preprocess_legislation", source_fingerprint(sys.modules[__name__]))
+    inputs = []
+    pending = []
+
+    for filename in sorted(os.listdir(TEXTS_DIR)):
         if filename.endswith(".txt") and not ('perguntas_e_respostas' in filename):
             file_path = os.path.join(TEXTS_DIR, filename)
-            structured_legislation = process_legislation(file_path)
-            
-            # Salva o arquivo processado individualmente
-            output_file = os.path.join("app/data/preprocess", f"{filename.split('.')[0]}.json")
-            with open(output_file, "w", encoding="utf-8") as json_file:
-                json.dump(structured_legislation, json_file, indent=4, ensure_ascii=False)
-
-    print("Processamento concluído! Arquivos salvos em app/data/preprocess")
+            inputs.append(file_path)
+            if force or not cache.is_fresh(file_path, output_path_for(file_path, output_format)):
+                pending.append(file_path)
+
+    results, failures = run_batch(partial(process_file, output_format=output_format), pending, workers, chunksize)
+    for file_path, output_file in results:
+        replaced = cache.record(file_path, output_file)
+        if replaced:
+            remove_legislation(replaced)
+
+    removed = cache.prune(inputs)
+    for output_file in removed:
+        remove_legislation(output_file)
+    cache.save()
+    report_failures(failures)
+    if record is not None:
+        record.update(processed=len(results), unchanged=len(inputs) - len(pending), failures=len(failures),
+                      removed=len(removed))
+
+    print(f"Processamento concluído! {len(results)} processados, {len(inputs) - len(pending)} inalterados, "
+          f"{len(failures)} falhas, {len(removed)} removidos. Arquivos salvos em {OUTPUT_DIR}")
+    return failures
+
+def preprocess_legislation(force=False, workers=None, chunksize=1, output_format="json"):
+    """Processa os textos novos ou alterados desde a última execução.
+
+    Os documentos são distribuídos entre `workers` processos (padrão: um por
+    núcleo); falhas são relatadas por documento sem interromper os demais.
+    Com output_format="jsonl" cada documento vira um registro compacto por
+    artigo/anexo, com índice de offsets (ver jsonl_corpus).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de saída inválido: {output_format}")
+    with measure("preprocess_legislation") as record:
+        return _preprocess_legislation(force, workers, chunksize, output_format, record)
 
 if __name__ == "__main__":
     preprocess_legislation()
\ No newline at end of file
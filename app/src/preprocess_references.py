@@ -1,7 +1,18 @@
 import re
-import json
 import os
-from typing import Any, Dict, Union, List, Pattern
+import sys
+from functools import lru_cache, partial
+from typing import Any, Dict, Iterator, Union, List, Pattern
+from paths import data_path
+from stage_cache import StageCache, source_fingerprint
+from batch import run_batch, report_failures
+from jsonl_corpus import OUTPUT_FORMATS, save_legislation, load_legislation, remove_legislation
+from instrumentation import measure, profile_patterns, patterns_enabled, file_size
+from citation_graph import canonical_id, reference_id
+
+INPUT_DIR = data_path("preprocess")
+OUTPUT_DIR = data_path("preprocess_references")
+TAG_CACHE_SIZE = 8192  # Textos já marcados mantidos em memória (cláusulas repetidas entre RDCs)
 
 # Termos de filtro expandidos
 FILTER_TERMS = [
@@ -47,44 +58,36 @@ REFERENCE_PATTERNS = [
     ),
 ]
 
+def _fuse_patterns(patterns: List[Pattern]) -> tuple:
+    """Combina os padrões em uma única alternação, na ordem de prioridade.
+
+    Os grupos nomeados são renomeados com o índice do padrão (ex.: year -> year_2)
+    e cada padrão fica dentro de um grupo externo ref_<índice>.
+    """
+    alternatives = []
+    group_names = []
+    for i, pattern in enumerate(patterns):
+        alternatives.append(f"(?P<ref_{i}>" + re.sub(r"\(\?P<(\w+)>", rf"(?P<\1_{i}>", pattern.pattern) + ")")
+        group_names.append([(name, f"{name}_{i}") for name in pattern.groupindex])
+    return re.compile("|".join(alternatives), re.IGNORECASE), group_names
+
+# Tagger único: uma varredura por texto; em cada posição vence o padrão de maior prioridade
+FUSED_REFERENCE_PATTERN, FUSED_GROUP_NAMES = _fuse_patterns(REFERENCE_PATTERNS)
+
+# Marca {REF} acrescentada por tag_references (contagem de referências na instrumentação)
+REF_TAG_PATTERN = re.compile(r" \{\w+\}")
+
+def _format(groups: Dict[str, str], full_text: str, pattern_index: int) -> str:
+    """Id da referência, normalizado pela mesma função dos nós do grafo de citações (citation_graph)"""
+    if pattern_index == 0:  # Constituição
+        return reference_id('ConstituicaoFederal', '196', groups.get('year'))  # Número do artigo da Constituição
+    # Tipo, número e ano são lidos do texto da referência (ex.: "RDC nº 17/2010" -> RDC_17_2010)
+    return canonical_id(full_text) or ''
+
 def format_reference(match: re.Match, pattern_index: int = 0) -> str:
     """Formata a referência no padrão {TYPE_NUMBER_YEAR}"""
     try:
-        groups = match.groupdict()
-        prefix = groups.get('prefix', '')
-        number = groups.get('number', '')
-        year = (groups.get('year', '') or groups.get('year2', '') or 
-                groups.get('year3', '') or groups.get('year4', ''))
-        full_text = match.group(0)
-        
-        # Determina o tipo do documento de forma mais precisa
-        if pattern_index == 0:  # Constituição
-            doc_type = 'ConstituicaoFederal'
-            number = '196'  # Número do artigo da Constituição
-        elif 'PORTARIA' in prefix.upper() or 'PORTARIA' in full_text.upper():
-            doc_type = 'Portaria'
-        elif 'DECRETO' in prefix.upper() or 'DECRETO' in full_text.upper():
-            doc_type = 'Decreto'
-        elif 'RE' in prefix.upper() or 'RE' in full_text.upper():
-            doc_type = 'RE'
-        elif 'RDC' in prefix.upper() or 'RDC' in full_text.upper():
-            doc_type = 'RDC'
-        elif 'LEI' in prefix.upper():
-            doc_type = 'Lei'
-        else:
-            doc_type = prefix.replace(' ', '_') if prefix else 'UNKNOWN'
-        
-        # Limpa e formata o número
-        number = re.sub(r'[^\d]', '', number)
-        
-        # Formata o ano para os padrões específicos
-        if year:
-            formatted_ref = f"{doc_type}_{number}_{year}"
-        else:
-            formatted_ref = f"{doc_type}_{number}"
-        
-        return formatted_ref
-    
+        return _format(match.groupdict(), match.group(0), pattern_index)
     except Exception as e:
         print(f"Erro ao formatar referência '{match.group(0)}': {e}")
         return ''
@@ -94,58 +97,42 @@ def contains_filter_terms(text: str) -> bool:
     text_lower = text.lower()
     return any(term.lower() in text_lower for term in FILTER_TERMS)
 
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def tag_references(text: str) -> str:
+    """Acrescenta {REF} após cada referência em uma única varredura e reconstrução do texto"""
+    # Set para rastrear referências já processadas no texto
+    processed_refs = set()
+    pieces = []
+    last = 0
+
+    for match in FUSED_REFERENCE_PATTERN.finditer(text):
+        pattern_index = int(match.lastgroup[4:])  # ref_<índice>
+        groups = {name: match.group(fused) for name, fused in FUSED_GROUP_NAMES[pattern_index]}
+        try:
+            ref = _format(groups, match.group(0), pattern_index)
+        except Exception as e:
+            print(f"Erro ao formatar referência '{match.group(0)}': {e}")
+            continue
+
+        # Ignora referências inválidas ou já marcadas neste texto
+        if '_' not in ref or ref in processed_refs:
+            continue
+        processed_refs.add(ref)
+
+        pieces.append(text[last:match.end()])
+        pieces.append(f" {{{ref}}}")
+        last = match.end()
+
+    if not pieces:
+        return text
+    pieces.append(text[last:])
+    return "".join(pieces)
+
 def process_text(text: str) -> str:
     """Processa texto mantendo o original e acrescentando {REF}"""
     if not isinstance(text, str) or not contains_filter_terms(text):
         return text
-    
-    # Set para rastrear referências já processadas no texto
-    processed_refs = set()
-    
-    def apply_patterns(text: str) -> str:
-        """Aplica todos os padrões de referência ao texto"""
-        # Primeiro, processa apenas o padrão específico da Constituição
-        def constituicao_replacer(match):
-            original_text = match.group(0)
-            ref = format_reference(match, 0)  # Usa o primeiro padrão (Constituição)
-            
-            if not ref or '_' not in ref:
-                return original_text
-            
-            # Verifica se a referência já foi processada neste texto
-            if ref in processed_refs:
-                return original_text
-            
-            # Adiciona a referência ao conjunto de processadas
-            processed_refs.add(ref)
-            return f"{original_text} {{{ref}}}"
-        
-        # Aplica o padrão da Constituição primeiro
-        text = REFERENCE_PATTERNS[0].sub(constituicao_replacer, text)
-        
-        # Depois, processa os demais padrões
-        for i, pattern in enumerate(REFERENCE_PATTERNS[1:], 1):
-            def replacer(match):
-                original_text = match.group(0)
-                ref = format_reference(match, i)
-                
-                if not ref or '_' not in ref:
-                    return original_text
-                
-                # Verifica se a referência já foi processada neste texto
-                if ref in processed_refs:
-                    return original_text
-                
-                # Adiciona a referência ao conjunto de processadas
-                processed_refs.add(ref)
-                return f"{original_text} {{{ref}}}"
-            
-            text = pattern.sub(replacer, text)
-        
-        return text
-    
-    # Aplica os padrões uma única vez
-    return apply_patterns(text)
+    return tag_references(text)
 
 def process_content(content: Any) -> Any:
     """Processa conteúdo recursivamente (string, dict ou list)"""
@@ -161,33 +148,93 @@ def process_content(content: Any) -> Any:
         print(f"Erro ao processar conteúdo: {e}")
         return content
 
-def preprocess_references():
-    """Função principal para carregar, processar e salvar os dados"""
-    try:
-        input_dir = "app/data/preprocess"
-        output_dir = "app/data/preprocess_references"
-        os.makedirs(output_dir, exist_ok=True)  # Cria a pasta de saída se não existir
+def iter_texts(content: Any) -> Iterator[str]:
+    """Todos os textos de um conteúdo (string, dict ou list), em profundidade"""
+    if isinstance(content, str):
+        yield content
+    elif isinstance(content, dict):
+        for value in content.values():
+            yield from iter_texts(value)
+    elif isinstance(content, list):
+        for item in content:
+            yield from iter_texts(item)
 
-        for filename in os.listdir(input_dir):
-            if filename.endswith(".json"):
-                input_path = os.path.join(input_dir, filename)
-                output_path = os.path.join(output_dir, filename)
+def output_path_for(input_path: str, output_format: str = "json") -> str:
+    """Caminho de saída correspondente a um documento estruturado"""
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(OUTPUT_DIR, f"{name}.{output_format}")
 
-                # Carrega o arquivo JSON individual
-                with open(input_path, "r", encoding="utf-8") as file:
-                    legislation_data = json.load(file)
+def process_file(input_path: str, output_format: str = "json") -> str:
+    """Marca as referências de um JSON estruturado e salva o resultado (executado nos workers)"""
+    output_path = output_path_for(input_path, output_format)
 
-                # Processa o conteúdo do arquivo
-                processed_data = process_content(legislation_data)
+    with measure("preprocess_references", os.path.basename(input_path)) as record:
+        # Carrega o arquivo individual (.json ou .jsonl)
+        legislation_data = load_legislation(input_path)
 
-                # Salva o resultado processado
-                with open(output_path, "w", encoding="utf-8") as file:
-                    json.dump(processed_data, file, ensure_ascii=False, indent=4)
+        # Processa o conteúdo do arquivo
+        processed_data = process_content(legislation_data)
 
-        print(f"Processamento concluído! Arquivos salvos em {output_dir}")
-    
-    except Exception as e:
-        print(f"Erro durante o processamento: {e}")
+        # Salva o resultado processado
+        save_legislation(processed_data, output_path, output_format)
+
+        if record is not None:
+            record.update(
+                bytes_in=file_size(input_path), bytes_out=file_size(output_path),
+                articles=sum(isinstance(value, dict) for value in processed_data.values()),
+                references=sum(len(REF_TAG_PATTERN.findall(text)) for text in iter_texts(processed_data)),
+            )
+            if patterns_enabled():
+                patterns = [(f"ref_{i}", pattern) for i, pattern in enumerate(REFERENCE_PATTERNS)]
+                profile_patterns(record, "REFERENCE_PATTERNS", "\n".join(iter_texts(legislation_data)), patterns)
+    return output_path
+
+def _preprocess_references(force: bool, workers: int, chunksize: int, output_format: str, record: Union[dict, None]) -> list:
+    os.makedirs(OUTPUT_DIR, exist_ok=True)  # Cria a pasta de saída se não existir
+
+    # O cache é invalidado quando o código do estágio (ou de um módulo local que ele importa) muda
+    cache = StageCache("preprocess_references", source_fingerprint(sys.modules[__name__]))
+    inputs = []
+    pending = []
+
+    for filename in sorted(os.listdir(INPUT_DIR)):
+        if filename.endswith((".json", ".jsonl")) and not filename.endswith(".idx.json"):
+            input_path = os.path.join(INPUT_DIR, filename)
+            inputs.append(input_path)
+            if force or not cache.is_fresh(input_path, output_path_for(input_path, output_format)):
+                pending.append(input_path)
+
+    results, failures = run_batch(partial(process_file, output_format=output_format), pending, workers, chunksize)
+    for input_path, output_path in results:
+        replaced = cache.record(input_path, output_path)
+        if replaced:
+            remove_legislation(replaced)
+
+    removed = cache.prune(inputs)
+    for output_path in removed:
+        remove_legislation(output_path)
+    cache.save()
+    report_failures(failures)
+    if record is not None:
+        record.update(processed=len(results), unchanged=len(inputs) - len(pending), failures=len(failures),
+                      removed=len(removed))
+
+    print(f"Processamento concluído! {len(results)} processados, {len(inputs) - len(pending)} inalterados, "
+          f"{len(failures)} falhas, {len(removed)} removidos. Arquivos salvos em {OUTPUT_DIR}")
+    return failures
+
+def preprocess_references(force: bool = False, workers: int = None, chunksize: int = 1, output_format: str = "json") -> list:
+    """Função principal para carregar, processar e salvar os dados.
+
+    Os documentos são distribuídos entre `workers` processos (padrão: um por
+    núcleo); um documento com erro é relatado sem interromper os demais.
+    Aceita entradas .json ou .jsonl; output_format="jsonl" grava um registro
+    compacto por artigo/anexo com índice de offsets (ver jsonl_corpus).
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de saída inválido: {output_format}")
+    with measure("preprocess_references") as record:
+        return _preprocess_references(force, workers, chunksize, output_format, record)
 
 if __name__ == "__main__":
     preprocess_references()
\ No newline at end of file
@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+from jsonl_corpus import CORPUS_DIR
+from legislation_model import Article, load_corpus
+from citation_graph import CitationGraph, RELATIONS, GRAPH_PATH, LEGISLATION_MAP_PATH
+from search_index import SearchIndex, INDEX_DIR, generation_dir
+
+HOST = "127.0.0.1"
+PORT = 8765
+CACHE_SIZE = 4096         # Respostas mantidas no LRU de cada versão do corpus
+RELOAD_INTERVAL = 2.0     # Segundos entre verificações dos arquivos do pipeline
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 1 << 20  # Corpos maiores não são lidos: a resposta fecha a conexão
+MAX_RESULTS = 100
+KEEP_ALIVE_TIMEOUT = 30.0
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+class ResponseCache:
+    """LRU das respostas de um Snapshot, consultado e atualizado só no loop de eventos"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def info(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "max": self.maxsize}
+
+class NotFound(Exception):
+    pass
+
+class BadRequest(Exception):
+    pass
+
+def watched_signature(corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR):
+    """(arquivo, tamanho, mtime) das saídas do pipeline servidas; muda quando uma execução as regrava"""
+    entries = []
+    for path in (corpus_dir, index_dir, GRAPH_PATH, LEGISLATION_MAP_PATH):
+        if os.path.isdir(path):
+            names = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        else:
+            names = [path]
+        for name in names:
+            if os.path.isfile(name):
+                stat = os.stat(name)
+                entries.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(entries)
+
+class Snapshot:
+    """Corpus, grafo e índice de busca carregados uma única vez, com o LRU das respostas.
+
+    Cada recarga cria um Snapshot novo (e um LRU vazio) e o troca de uma vez,
+    de modo que as requisições nunca veem arquivos de execuções diferentes
+    misturados nem respostas antigas em cache.
+    """
+
+    def __init__(self, corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR, cache_size=CACHE_SIZE):
+        self.signature = watched_signature(corpus_dir, index_dir)
+        self.loaded_at = time.time()
+        self.corpus = load_corpus(corpus_dir) if os.path.isdir(corpus_dir) else {}
+        if os.path.exists(GRAPH_PATH):
+            self.graph = CitationGraph.load(GRAPH_PATH)
+        elif os.path.exists(LEGISLATION_MAP_PATH):
+            self.graph = CitationGraph.from_json(LEGISLATION_MAP_PATH)
+        else:
+            self.graph = None
+        has_index = os.path.exists(os.path.join(generation_dir(index_dir), "meta.json"))
+        self.index = SearchIndex(index_dir, in_memory=True) if has_index else None
+        self.cache = ResponseCache(cache_size)
+
+    def close(self):
+        if self.index is not None:
+            self.index.close()
+
+    def respond(self, target):
+        """(status, corpo JSON) de uma requisição GET (executado fora do loop; o resultado vai para o LRU)"""
+        try:
+            return 200, _encode(self.route(target))
+        except NotFound as e:
+            return 404, _encode({"error": str(e)})
+        except BadRequest as e:
+            return 400, _encode({"error": str(e)})
+
+    def route(self, target):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+
+        if not parts:
+            return {"documents": len(self.corpus), "endpoints": [
+                "/documents", "/{documento}", "/{documento}/{artigo}", "/graph/{ato}", "/search?q=...", "/health",
+            ]}
+        if parts == ["documents"]:
+            return {"documents": sorted(self.corpus)}
+        if parts == ["search"]:
+            return self.search(query)
+        if parts[0] == "graph" and len(parts) == 2:
+            return self.neighbors(parts[1], query)
+        if len(parts) == 1:
+            return self.document(parts[0])
+        if len(parts) == 2:
+            return self.unit(parts[0], parts[1])
+        raise NotFound(f"Rota não encontrada: {url.path}")
+
+    def _legislation(self, name):
+        legislation = self.corpus.get(name)
+        if legislation is None:
+            raise NotFound(f"Documento não encontrado: {name}")
+        return legislation
+
+    def document(self, name):
+        legislation = self._legislation(name)
+        return {
+            "document": name,
+            "date": legislation.date,
+            "header": legislation.header,
+            "articles": [unit.key for unit in legislation.articles],
+            "annexes": [unit.key for unit in legislation.annexes],
+        }
+
+    def unit(self, name, key):
+        """Artigo ou anexo (ex.: /RDC_658_2022/art12; "12" e "Art12" também são aceitos)"""
+        legislation = self._legislation(name)
+        key = key.lower()
+        if key.isdigit():
+            key = f"art{key}"
+        try:
+            unit = legislation[key]
+        except KeyError:
+            raise NotFound(f"{key} não encontrado em {name}")
+        value = unit.to_value() if isinstance(unit, Article) else unit.text
+        return {"document": name, "key": key, "date": legislation.date, "value": value}
+
+    def neighbors(self, name, query):
+        """Vizinhos no grafo de citações: o que o ato cita (out), quem o cita (in) e se está em vigor"""
+        if self.graph is None:
+            raise NotFound("Grafo de citações não encontrado (execute o estágio map do pipeline)")
+        relations = tuple(query.get("relation", ",".join(RELATIONS)).split(","))
+        unknown = [relation for relation in relations if relation not in RELATIONS]
+        if unknown:
+            raise BadRequest(f"Relação desconhecida: {', '.join(unknown)} (use {', '.join(RELATIONS)})")
+        try:
+            result = {"id": name, "in_force": self.graph.is_in_force(name)}
+            for relation in relations:
+                result[relation] = {
+                    "out": self.graph.neighbors(name, relation),
+                    "in": self.graph.cited_by(name, relation),
+                }
+        except KeyError:
+            raise NotFound(f"Ato não encontrado no grafo: {name}")
+        return result
+
+    def search(self, query):
+        if self.index is None:
+            raise NotFound("Índice de busca não encontrado (execute search_index.py)")
+        text = query.get("q", "").strip()
+        if not text:
+            raise BadRequest("Informe a consulta em ?q=")
+        try:
+            k = min(int(query.get("k", 10)), MAX_RESULTS)
+        except ValueError:
+            raise BadRequest("k deve ser um inteiro")
+        return {"query": text, "hits": [hit._asdict() for hit in self.index.search(text, k)]}
+
+def _encode(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class QueryService:
+    """Servidor HTTP/1.1 (asyncio, só biblioteca padrão) sobre o Snapshot atual.
+
+    O loop de eventos só atende as conexões e consulta o LRU: respostas fora
+    do cache (busca BM25, leitura do corpus), a carga inicial e as recargas
+    rodam em threads, para que uma consulta lenta não bloqueie as demais
+    conexões. Uma recarga só
+    acontece depois que os arquivos ficam estáveis por uma verificação
+    inteira, para não carregar uma execução do pipeline pela metade.
+    """
+
+    def __init__(self, corpus_dir=CORPUS_DIR, index_dir=INDEX_DIR, cache_size=CACHE_SIZE,
+                 reload_interval=RELOAD_INTERVAL):
+        self.corpus_dir = corpus_dir
+        self.index_dir = index_dir
+        self.cache_size = cache_size
+        self.reload_interval = reload_interval
+        self.snapshot = None
+        self.generation = 0
+        self.requests = 0
+
+    async def load(self):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        snapshot = await loop.run_in_executor(None, Snapshot, self.corpus_dir, self.index_dir, self.cache_size)
+        previous, self.snapshot = self.snapshot, snapshot
+        self.generation += 1
+        if previous is not None:
+            previous.close()
+        print(f"[✔] Corpus carregado (versão {self.generation}): {len(snapshot.corpus)} documentos "
+              f"em {time.perf_counter() - start:.2f}s")
+
+    async def watch(self):
+        """Recarrega o Snapshot quando as saídas do pipeline mudam e ficam estáveis"""
+        loop = asyncio.get_running_loop()
+        pending = None
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            signature = await loop.run_in_executor(None, watched_signature, self.corpus_dir, self.index_dir)
+            if signature == self.snapshot.signature:
+                pending = None
+            elif signature != pending:
+                pending = signature  # Mudou: espera a próxima verificação para confirmar
+            else:
+                try:
+                    await self.load()
+                except Exception as e:
+                    print(f"[✘] Falha ao recarregar o corpus (mantida a versão {self.generation}): {e}")
+                pending = None
+
+    def health(self):
+        return 200, _encode({
+            "status": "ok",
+            "generation": self.generation,
+            "loaded_at": self.snapshot.loaded_at,
+            "documents": len(self.snapshot.corpus),
+            "graph": self.snapshot.graph is not None,
+            "search": self.snapshot.index is not None,
+            "requests": self.requests,
+            "cache": self.snapshot.cache.info(),
+        })
+
+    async def dispatch(self, method, target):
+        if method not in ("GET", "HEAD"):
+            return 405, _encode({"error": f"Método não suportado: {method}"})
+        if self.snapshot is None:
+            return 503, _encode({"error": "Corpus ainda carregando"})
+        if urlsplit(target).path.rstrip("/") == "/health":
+            return self.health()
+        snapshot = self.snapshot  # Uma recarga durante a consulta não mistura versões
+        response = snapshot.cache.get(target)
+        if response is None:
+            response = await asyncio.get_running_loop().run_in_executor(None, snapshot.respond, target)
+            snapshot.cache.put(target, response)
+        return response
+
+    async def _discard_body(self, reader, headers):
+        """Lê e descarta o corpo da requisição; retorna False se a conexão não pode ser reaproveitada"""
+        if "chunked" in headers.get("transfer-encoding", ""):
+            return False  # O corpo não é lido: a conexão é fechada após a resposta
+        length = int(headers.get("content-length") or 0)
+        if length < 0:
+            raise ValueError(length)
+        if length > MAX_BODY_BYTES:
+            return False
+        if length:
+            await asyncio.wait_for(reader.readexactly(length), KEEP_ALIVE_TIMEOUT)
+        return True
+
+    async def handle(self, reader, writer):
+        """Atende as requisições de uma conexão (keep-alive até Connection: close ou ociosidade)"""
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(_response(400, _encode({"error": "Cabeçalho muito grande"}), False))
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ", 2)
+                except ValueError:
+                    writer.write(_response(400, _encode({"error": "Requisição inválida"}), False))
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip().lower()
+                keep_alive = (headers.get("connection") != "close") if version == "HTTP/1.1" \
+                    else headers.get("connection") == "keep-alive"
+                # Um corpo não lido seria interpretado como a próxima requisição da conexão
+                try:
+                    keep_alive = await self._discard_body(reader, headers) and keep_alive
+                except ValueError:
+                    writer.write(_response(400, _encode({"error": "Content-Length inválido"}), False))
+                    break
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+
+                self.requests += 1
+                try:
+                    status, body = await self.dispatch(method, target)
+                except Exception as e:
+                    # Um erro inesperado responde 500 em vez de derrubar a conexão
+                    print(f"[✘] Erro ao atender {method} {target}: {e}")
+                    status, body = 500, _encode({"error": "Erro interno"})
+                writer.write(_response(status, b"" if method == "HEAD" else body, keep_alive, len(body)))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT):
+        await self.load()
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+        watcher = asyncio.create_task(self.watch())
+        print(f"[✔] Serviço de consulta em http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            if self.snapshot is not None:
+                self.snapshot.close()
+
+def _response(status, body, keep_alive, length=None):
+    head = (
+        f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body) if length is None else length}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP local de consulta ao corpus pré-processado.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help="respostas mantidas no LRU")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL,
+                        help="segundos entre verificações dos arquivos do pipeline")
+    args = parser.parse_args(argv)
+
+    service = QueryService(cache_size=args.cache_size, reload_interval=args.reload_interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("[✔] Serviço encerrado")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+import os
+import re
+import json
+import math
+import mmap
+import heapq
+import shutil
+import unicodedata
+from array import array
+from contextlib import contextmanager
+from collections import Counter, namedtuple
+from jsonl_corpus import iter_documents
+from paths import data_path
+
+INPUT_DIR = data_path("preprocess_references")
+INDEX_DIR = data_path("search_index")
+
+# Parâmetros do BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Chaves de metadados que não são unidades de texto
+METADATA_KEYS = {"date", "chapter", "section"}
+
+STOPWORDS = {
+    "a", "ao", "aos", "as", "ate", "com", "como", "da", "das", "de", "do", "dos", "e", "ela", "elas",
+    "ele", "eles", "em", "entre", "era", "essa", "essas", "esse", "esses", "esta", "estas", "este",
+    "estes", "eu", "foi", "ha", "isso", "isto", "ja", "lhe", "lhes", "mais", "mas", "me", "mesmo",
+    "na", "nas", "nem", "no", "nos", "nossa", "nosso", "num", "numa", "o", "os", "ou", "para",
+    "pela", "pelas", "pelo", "pelos", "por", "qual", "quando", "que", "quem", "se", "sem", "ser",
+    "seu", "seus", "so", "sua", "suas", "tambem", "te", "tem", "ter", "um", "uma", "umas", "uns",
+}
+
+# Regras de plural do stemmer leve (sobre o texto já sem acentos), na ordem de aplicação
+PLURAL_RULES = [
+    ("ns", "m"), ("oes", "ao"), ("aes", "ao"), ("ais", "al"), ("eis", "el"),
+    ("ois", "ol"), ("les", "l"), ("res", "r"), ("zes", "z"),
+]
+SUFFIXES = ["amente", "mente", "idades", "idade", "acoes", "acao", "ncia", "vel"]
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Cada construção grava uma geração nova (gen-000001, ...) e só então troca o ponteiro CURRENT
+CURRENT_FILE = "CURRENT"
+GENERATION_PATTERN = re.compile(r"gen-(\d+)")
+INDEX_FILES = ("units.json", "lengths.bin", "lexicon.json", "postings.bin", "meta.json")
+
+SearchHit = namedtuple("SearchHit", ["document", "article", "paragraph", "score"])
+
+def strip_accents(text):
+    """Remove acentos (ç -> c, ã -> a, ...) e converte para minúsculas"""
+    decomposed = unicodedata.normalize("NFD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+def stem(word):
+    """Stemmer leve para o português: plural, sufixos nominais comuns e vogal final"""
+    if len(word) < 4 or word.isdigit():
+        return word
+    for suffix, replacement in PLURAL_RULES:
+        if word.endswith(suffix):
+            word = word[:-len(suffix)] + replacement
+            break
+    else:
+        if word.endswith("s") and not word.endswith(("ss", "us")):
+            word = word[:-1]
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    if len(word) > 4 and word[-1] in "aeo":
+        word = word[:-1]
+    return word
+
+def tokenize(text):
+    """Normaliza (acentos, caixa), remove stopwords e aplica o stemmer"""
+    return [stem(token) for token in TOKEN_PATTERN.findall(strip_accents(text)) if token not in STOPWORDS]
+
+def iter_units(legislation):
+    """Percorre as unidades de texto de um documento estruturado.
+
+    Gera (chave do artigo, chave do parágrafo, texto), onde a chave do
+    parágrafo é "text" para o caput, "p1", "p" etc. para parágrafos e
+    "p1/II" ou "II" para incisos.
+    """
+    for article, value in legislation.items():
+        if article in METADATA_KEYS:
+            continue
+        if isinstance(value, str):
+            yield article, "text", value
+            continue
+        for paragraph, content in value.items():
+            if paragraph in METADATA_KEYS:
+                continue
+            if isinstance(content, str):
+                yield article, paragraph, content
+            else:
+                for inciso, text in content.items():
+                    yield article, paragraph if inciso == "text" else f"{paragraph}/{inciso}", text
+
+def _encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_postings(buffer, offset, count):
+    """Decodifica `count` pares (id da unidade, frequência) a partir de offset"""
+    postings = []
+    unit_id = 0
+    for _ in range(count):
+        values = []
+        for _ in range(2):
+            value = shift = 0
+            while True:
+                byte = buffer[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            values.append(value)
+        unit_id += values[0]  # Ids gravados como diferença em relação ao anterior
+        postings.append((unit_id, values[1]))
+    return postings
+
+@contextmanager
+def _replacing(path, mode, **kwargs):
+    """Arquivo temporário que substitui `path` ao final da escrita"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, mode, **kwargs) as f:
+        yield f
+    os.replace(tmp_path, path)
+
+def generation_dir(index_dir):
+    """Pasta da geração ativa do índice, apontada por CURRENT"""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return os.path.join(index_dir, f.read().strip())
+    except FileNotFoundError:
+        return index_dir  # Índice gravado antes das gerações, direto na pasta
+
+def _new_generation(index_dir):
+    """Cria a pasta da próxima geração (ainda invisível para os leitores) e retorna seu nome"""
+    os.makedirs(index_dir, exist_ok=True)
+    numbers = [int(match.group(1)) for match in map(GENERATION_PATTERN.fullmatch, os.listdir(index_dir)) if match]
+    name = f"gen-{max(numbers, default=0) + 1:06d}"
+    os.makedirs(os.path.join(index_dir, name))
+    return name
+
+def _publish_generation(index_dir, name, files):
+    """Aponta CURRENT para a geração `name` e remove as gerações antigas.
+
+    A troca do ponteiro (os.replace) é o único passo visível para os leitores:
+    quem abre o índice vê todos os arquivos da geração anterior ou todos os da
+    nova. A geração anterior é mantida para quem leu CURRENT antes da troca e
+    ainda não abriu os arquivos; as demais, e os arquivos do formato sem
+    gerações (`files`), são removidos.
+    """
+    previous = os.path.basename(generation_dir(index_dir))
+    with _replacing(os.path.join(index_dir, CURRENT_FILE), "w", encoding="utf-8") as f:
+        f.write(name)
+    for entry in os.listdir(index_dir):
+        path = os.path.join(index_dir, entry)
+        if GENERATION_PATTERN.fullmatch(entry) and entry not in (name, previous):
+            shutil.rmtree(path, ignore_errors=True)
+        elif entry in files:
+            os.remove(path)
+
+def build_index(input_dir=INPUT_DIR, index_dir=INDEX_DIR):
+    """Constrói o índice invertido sobre os artigos, parágrafos e incisos do corpus.
+
+    Os arquivos são gravados em uma geração nova (index_dir/gen-NNNNNN) e
+    publicados de uma vez trocando index_dir/CURRENT, para que nenhum leitor
+    combine o léxico novo com postings antigos. Arquivos de cada geração:
+      units.json    - [documento, artigo, parágrafo] de cada unidade
+      lengths.bin   - número de tokens de cada unidade (uint32)
+      lexicon.json  - termo -> [df, offset, bytes] em postings.bin
+      postings.bin  - listas de (id, frequência) com ids em delta e varint
+      meta.json     - total de unidades, comprimento médio e parâmetros
+    """
+    units = []
+    lengths = array("I")
+    inverted = {}
+
+    for document, legislation in iter_documents(input_dir):
+        for article, paragraph, text in iter_units(legislation):
+            tokens = tokenize(text)
+            if not tokens:
+                continue
+            unit_id = len(units)
+            units.append([document, article, paragraph])
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                inverted.setdefault(term, []).append((unit_id, frequency))
+
+    lexicon = {}
+    postings = bytearray()
+    for term in sorted(inverted):
+        start = len(postings)
+        previous = 0
+        for unit_id, frequency in inverted[term]:
+            _encode_varint(unit_id - previous, postings)
+            _encode_varint(frequency, postings)
+            previous = unit_id
+        lexicon[term] = [len(inverted[term]), start, len(postings) - start]
+
+    # Nenhum arquivo de uma geração publicada é regravado: quem mantém o índice
+    # anterior aberto continua lendo os arquivos antigos
+    generation = _new_generation(index_dir)
+    target_dir = os.path.join(index_dir, generation)
+    with open(os.path.join(target_dir, "postings.bin"), "wb") as f:
+        f.write(postings)
+    with open(os.path.join(target_dir, "lengths.bin"), "wb") as f:
+        lengths.tofile(f)
+    with open(os.path.join(target_dir, "units.json"), "w", encoding="utf-8") as f:
+        json.dump(units, f, ensure_ascii=False, separators=(",", ":"))
+    with open(os.path.join(target_dir, "lexicon.json"), "w", encoding="utf-8") as f:
+        json.dump(lexicon, f, ensure_ascii=False, separators=(",", ":"))
+    with open(os.path.join(target_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "units": len(units),
+            "avgdl": (sum(lengths) / len(lengths)) if lengths else 0.0,
+            "k1": BM25_K1,
+            "b": BM25_B,
+        }, f, indent=4)
+    _publish_generation(index_dir, generation, INDEX_FILES)
+
+    print(f"[✔] Índice de busca construído: {len(units)} unidades, {len(lexicon)} termos em {index_dir}")
+
+class SearchIndex:
+    """Busca BM25 sobre o índice gravado por build_index.
+
+    Abre a geração apontada por CURRENT no momento da abertura; uma
+    reconstrução posterior não altera o índice aberto (reabra para vê-la).
+    O léxico e os comprimentos são carregados ao abrir; as listas de postings
+    são lidas sob demanda de um arquivo mapeado em memória, ou de uma cópia
+    em memória com in_memory=True (para processos que mantêm o índice aberto
+    enquanto o pipeline o reconstrói).
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, in_memory=False):
+        index_dir = generation_dir(index_dir)
+        with open(os.path.join(index_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, "units.json"), "r", encoding="utf-8") as f:
+            self.units = json.load(f)
+        with open(os.path.join(index_dir, "lexicon.json"), "r", encoding="utf-8") as f:
+            self.lexicon = json.load(f)
+        self.lengths = array("I")
+        with open(os.path.join(index_dir, "lengths.bin"), "rb") as f:
+            self.lengths.frombytes(f.read())
+
+        self.total = meta["units"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+
+        self._file = open(os.path.join(index_dir, "postings.bin"), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        if in_memory or not size:
+            # Lido inteiro: o índice não depende mais do arquivo, que o pipeline pode regravar
+            self._postings = self._file.read()
+            self._file.close()
+        else:
+            self._postings = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def postings(self, term):
+        """Lista de (id da unidade, frequência) do termo já normalizado"""
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return []
+        df, offset, _ = entry
+        return _decode_postings(self._postings, offset, df)
+
+    def search(self, query, k=10):
+        """Retorna as k unidades mais relevantes para a consulta (BM25)"""
+        scores = {}
+        for term in set(tokenize(query)):
+            entry = self.lexicon.get(term)
+            if entry is None:
+                continue
+            df = entry[0]
+            idf = math.log(1 + (self.total - df + 0.5) / (df + 0.5))
+            for unit_id, frequency in self.postings(term):
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[unit_id] / self.avgdl)
+                scores[unit_id] = scores.get(unit_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [SearchHit(*self.units[unit_id], score) for unit_id, score in best]
+
+    def close(self):
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+if __name__ == "__main__":
+    build_index()
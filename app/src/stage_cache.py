@@ -0,0 +1,143 @@
+import os
+import ast
+import json
+import hashlib
+from paths import data_path
+
+CACHE_DIR = data_path("cache")
+
+def content_hash(path, chunk_size=1 << 20):
+    """SHA-256 do conteúdo de um arquivo"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _local_imports(path):
+    """Módulos do mesmo diretório importados pelo arquivo (inclusive imports dentro de funções)"""
+    directory = os.path.dirname(path)
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            dep_path = os.path.join(directory, f"{name.split('.')[0]}.py")
+            if os.path.exists(dep_path):
+                yield dep_path
+
+def source_fingerprint(module):
+    """Versão do código de um estágio: o fonte do módulo e dos módulos locais que ele importa.
+
+    Qualquer alteração em um padrão, termo ou função do estágio (ou de suas
+    dependências locais, como jsonl_corpus) muda o fingerprint e invalida todo
+    o cache do estágio. `module` é o módulo ou o caminho do seu .py (o
+    pipeline usa o caminho, para não importar as dependências pesadas).
+    """
+    sources = {}
+    stack = [os.path.abspath(module if isinstance(module, str) else module.__file__)]
+    while stack:
+        path = stack.pop()
+        if path in sources:
+            continue
+        sources[path] = content_hash(path)
+        stack.extend(_local_imports(path))
+    return hashlib.sha256("\n".join(
+        f"{os.path.basename(path)}:{sha256}" for path, sha256 in sorted(sources.items())
+    ).encode("utf-8")).hexdigest()
+
+class StageCache:
+    """Cache incremental de um estágio, indexado pelo hash do conteúdo de cada entrada.
+
+    Para cada arquivo de entrada guarda o SHA-256 do conteúdo (mais mtime e
+    tamanho, para evitar re-hash de arquivos intocados) e o arquivo de saída
+    gerado. Uma entrada é considerada atual quando o conteúdo e o fingerprint
+    do estágio não mudaram e a saída ainda existe. Entradas de um fingerprint
+    anterior que não foram refeitas ficam marcadas como stale: nunca são
+    atuais, mas continuam no cache para que prune() remova suas saídas.
+    """
+
+    def __init__(self, stage, stage_fingerprint, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, f"{stage}.json")
+        self.fingerprint = stage_fingerprint
+        self.entries = {}
+        self._pending = {}
+        self._recorded = set()
+        self._valid = False
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            # Um fingerprint diferente invalida todas as entradas, mas elas são
+            # mantidas para que prune() ainda saiba quais saídas remover
+            self.entries = data.get("entries", {})
+            self._valid = data.get("fingerprint") == stage_fingerprint
+
+    def _signature(self, input_path):
+        stat = os.stat(input_path)
+        entry = self.entries.get(input_path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            sha256 = entry["sha256"]
+        else:
+            sha256 = content_hash(input_path)
+        return {"sha256": sha256, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    def is_fresh(self, input_path, output_path):
+        """Indica se a saída de input_path ainda é válida"""
+        signature = self._signature(input_path)
+        self._pending[input_path] = signature
+        entry = self.entries.get(input_path)
+        return (
+            self._valid
+            and entry is not None
+            and not entry.get("stale")
+            and entry["sha256"] == signature["sha256"]
+            and entry["output"] == output_path
+            and os.path.exists(output_path)
+        )
+
+    def record(self, input_path, output_path):
+        """Registra a saída gerada para o conteúdo atual de input_path.
+
+        Retorna a saída anterior quando ela mudou de caminho (ex.: troca de
+        formato), para que o estágio a remova.
+        """
+        signature = self._pending.pop(input_path, None) or self._signature(input_path)
+        previous = self.entries.get(input_path, {}).get("output")
+        self.entries[input_path] = {**signature, "output": output_path}
+        self._recorded.add(input_path)
+        return previous if previous not in (None, output_path) else None
+
+    def prune(self, current_inputs):
+        """Remove entradas (e saídas) de arquivos de entrada que não existem mais"""
+        current_inputs = set(current_inputs)
+        removed = []
+        for input_path in list(self.entries):
+            if input_path not in current_inputs:
+                output_path = self.entries.pop(input_path)["output"]
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                removed.append(output_path)
+        return removed
+
+    def save(self):
+        """Grava o cache de forma atômica.
+
+        Com o fingerprint alterado, só as entradas registradas nesta execução
+        valem para o novo fingerprint; as demais são marcadas como stale, em
+        vez de descartadas, para que a saída delas continue rastreada.
+        """
+        if not self._valid:
+            for path, entry in self.entries.items():
+                if path not in self._recorded:
+                    entry["stale"] = True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "entries": self.entries}, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,128 @@
+import os
+import re
+import codecs
+import unicodedata
+
+# Versão das regras abaixo; textos convertidos com outra versão são refeitos
+NORMALIZATION_VERSION = 1
+
+# BOMs verificados antes de qualquer declaração (UTF-32 antes de UTF-16, que tem o mesmo prefixo)
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+HEADER_CHARSET_PATTERN = re.compile(r"charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+META_CHARSET_PATTERN = re.compile(rb"<meta[^>]+charset\s*=\s*[\"']?([\w.:-]+)", re.IGNORECASE)
+META_SCAN_BYTES = 4096  # As tags <meta> ficam no início do <head>
+
+# Páginas declaradas como Latin-1/ASCII são, na prática, windows-1252 (mesma regra dos navegadores)
+LATIN1_ALIASES = {"iso8859-1", "ascii"}
+
+def _mojibake_map():
+    """Letras acentuadas gravadas em UTF-8 e lidas como windows-1252 ("Ã£" -> "ã")"""
+    repairs = {}
+    for code in range(0xA0, 0x100):
+        char = chr(code)
+        try:
+            repairs[char.encode("utf-8").decode("cp1252")] = char
+        except UnicodeDecodeError:  # Bytes sem caractere no windows-1252 (ex.: "Á" = C3 81)
+            continue
+    return repairs
+
+MOJIBAKE = _mojibake_map()
+MOJIBAKE_PATTERN = re.compile("|".join(re.escape(key) for key in sorted(MOJIBAKE, key=len, reverse=True)))
+MOJIBAKE_MARKERS = ("Ã", "Â")  # Primeiro caractere de todas as sequências de MOJIBAKE
+
+# Reparos de um caractere, aplicados em uma única chamada de str.translate
+REPAIR_TABLE = str.maketrans({
+    "\u00a0": " ",     # Espaço não separável
+    "\u00ad": None,    # Hífen condicional
+    "\u200b": None,    # Caracteres de largura zero
+    "\u200c": None,
+    "\u200d": None,
+    "\ufeff": None,    # BOM no meio do texto
+    "\ufb00": "ff",    # Ligaduras comuns em PDFs
+    "\ufb01": "fi",
+    "\ufb02": "fl",
+    "\ufb03": "ffi",
+    "\ufb04": "ffl",
+    "\u2018": "'",     # Aspas tipográficas
+    "\u2019": "'",
+    "\u201c": '"',
+    "\u201d": '"',
+    "\u2013": "-",     # Travessões e sinal de menos
+    "\u2014": "-",
+    "\u2212": "-",
+    "\u2026": "...",
+})
+
+def _usable(charset):
+    """Nome canônico do charset, ou None se o Python não o conhecer"""
+    try:
+        name = codecs.lookup(charset).name
+    except LookupError:
+        return None
+    return "cp1252" if name in LATIN1_ALIASES else name
+
+def detect_charset(body, content_type=""):
+    """Charset real do corpo: BOM, depois cabeçalho HTTP, depois <meta>.
+
+    Sem declaração válida, usa UTF-8 se o corpo decodificar sem erros e
+    windows-1252 caso contrário. Uma declaração de UTF-8 que não decodifica
+    também cai para windows-1252. Retorna (charset, origem).
+    """
+    for bom, charset in BOMS:
+        if body.startswith(bom):
+            return charset, "bom"
+
+    declared = []
+    match = HEADER_CHARSET_PATTERN.search(content_type or "")
+    if match:
+        declared.append((match.group(1), "header"))
+    match = META_CHARSET_PATTERN.search(body[:META_SCAN_BYTES])
+    if match:
+        declared.append((match.group(1).decode("ascii", "ignore"), "meta"))
+
+    for charset, source in declared:
+        charset = _usable(charset)
+        if charset is None:
+            continue
+        if charset != "utf-8":
+            return charset, source
+        try:
+            body.decode("utf-8")
+            return charset, source
+        except UnicodeDecodeError:
+            break
+
+    try:
+        body.decode("utf-8")
+        return "utf-8", "fallback"
+    except UnicodeDecodeError:
+        return "cp1252", "fallback"
+
+def decode_body(body, content_type=""):
+    """Decodifica um corpo HTTP no charset detectado; retorna (texto, charset)"""
+    charset, _ = detect_charset(body, content_type)
+    return body.decode(charset, errors="replace"), charset
+
+def normalize_text(text):
+    """Repara mojibake e caracteres problemáticos e retorna o texto em NFC"""
+    if any(marker in text for marker in MOJIBAKE_MARKERS):
+        text = MOJIBAKE_PATTERN.sub(lambda match: MOJIBAKE[match.group()], text)
+    text = text.translate(REPAIR_TABLE)
+    # Acentos decompostos (comuns em PDFs) viram um único caractere
+    return text if unicodedata.is_normalized("NFC", text) else unicodedata.normalize("NFC", text)
+
+def normalize_file(source_path, target_path):
+    """Grava em target_path (de forma atômica) o texto normalizado de source_path, linha a linha"""
+    tmp_path = f"{target_path}.tmp"
+    with open(source_path, "r", encoding="utf-8", errors="replace") as source, \
+            open(tmp_path, "w", encoding="utf-8") as target:
+        for line in source:
+            target.write(normalize_text(line))
+    os.replace(tmp_path, target_path)
+    return target_path
@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from benchmark import DEFAULT_SIZES, MAX_ARTICLES, compare_results, generate_legislation
+from preprocess_legislation import extract_articles
+
+def _report(**seconds):
+    return {"results": {key: {"seconds": value} for key, value in seconds.items()}}
+
+def test_compare_flags_regressions_and_skips_zero_baseline():
+    report = _report(zero=0.5, slower=0.2, same=1.0, new=0.1)
+    baseline = _report(zero=0.0, slower=0.1, same=1.0)
+    assert compare_results(report, baseline, threshold=0.10) == ["slower"]
+
+def test_generator_is_deterministic():
+    assert generate_legislation(0.01, seed=3) == generate_legislation(0.01, seed=3)
+    text, articles = generate_legislation(0.01, seed=3)
+    assert articles > 0 and text.count("Art. ") >= articles
+
+@pytest.mark.parametrize("size_mb", DEFAULT_SIZES)
+def test_parsed_articles_match_generated(size_mb):
+    # Acima de 999 artigos "Art. 1000." seria lido como art100 e as chaves colidiriam
+    text, articles = generate_legislation(size_mb)
+    parsed = extract_articles(text)
+    assert articles <= MAX_ARTICLES
+    assert sum(key.startswith("art") for key in parsed) == articles
+    assert len(text.encode("utf-8")) >= size_mb * 1024 * 1024
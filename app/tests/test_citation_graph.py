@@ -0,0 +1,90 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from citation_graph import CitationGraph, canonical_id, reference_id
+
+# Entradas no formato de legislation_map.json: [citações, artigo, relação, linha]
+LEGISLATION_MAP = {
+    "RDC_658_2022": {"references": [
+        [["RDC nº 301, de 21 de agosto de 2019"], "art1", "revokes", 3],
+        [["Portaria nº 344"], "art2", None, 5],
+        [["Lei nº 6.437/1977"], "art3", "complements", 7],
+        [["Instrução Normativa nº 3"], "art4", None, 9],
+    ]},
+    "RDC_301_2019": {"references": [[["RDC nº 17/2010"], "art1", "revokes", 1]]},
+    "PORTARIA_344_1998": {"references": [[["RDC 658/2022"], "art5", None, 2]]},
+    "IN_3_2013": {"references": []},
+    "IN_3_2020": {"references": []},
+}
+
+@pytest.fixture
+def graph():
+    return CitationGraph.from_legislation_map(LEGISLATION_MAP)
+
+def test_canonical_id_normalizes_citations():
+    assert canonical_id("RDC nº 17/2010") == "RDC_17_2010"
+    assert canonical_id("{Portaria_344_1998}") == "Portaria_344_1998"
+    assert canonical_id("PORTARIA_344_1998") == "Portaria_344_1998"
+    assert canonical_id("Lei nº 6.437, de 20 de agosto de 1977") == "Lei_6437_1977"
+    assert canonical_id("Resolução da Diretoria Colegiada nº 06") == "RDC_6"
+    assert canonical_id("sem citação") is None
+    assert reference_id("Instrução Normativa", "3", "2013") == "IN_3_2013"
+
+@pytest.mark.parametrize("text", ["sobre 2020", "conforme 5", "Lein 5", "PRE 10", "desde 1998"])
+def test_type_must_not_be_glued_to_other_letters(text):
+    assert canonical_id(text) is None
+
+@pytest.mark.parametrize("text, expected", [
+    ("(RDC 5/2020)", "RDC_5_2020"), ("art. 2º da IN 7", "IN_7"), ("1RE 3", "RE_3"), ("x_NT_4_2021", "NT_4_2021"),
+])
+def test_type_accepts_digits_underscores_and_punctuation_around_it(text, expected):
+    assert canonical_id(text) == expected
+
+def test_yearless_citation_resolves_to_unique_corpus_act(graph):
+    # Um único ato do corpus com tipo e número: "Portaria nº 344" é a PORTARIA_344_1998
+    assert graph.neighbors("RDC_658_2022", "cites") == ["IN_3", "Portaria_344_1998"]
+    assert graph.cited_by("Portaria nº 344/1998") == ["RDC_658_2022"]
+    assert graph.cited_by("Portaria 344") == ["RDC_658_2022"]
+
+def test_yearless_citation_is_ambiguous_with_several_acts(graph):
+    # IN_3_2013 e IN_3_2020: a citação sem ano fica em um nó próprio, fora do corpus
+    assert graph.cited_by("IN_3") == ["RDC_658_2022"]
+    assert graph.cited_by("IN_3_2013") == [] and graph.cited_by("IN_3_2020") == []
+    assert "IN_3" not in graph.in_force() and "IN_3" in graph.in_force(corpus_only=False)
+
+def test_in_force_and_amended_by(graph):
+    assert graph.in_force() == ["RDC_658_2022", "Portaria_344_1998", "IN_3_2013", "IN_3_2020"]
+    assert not graph.is_in_force("RDC 301/2019")
+    assert not graph.is_in_force("RDC_17_2010") and "RDC_17_2010" not in graph.in_force(corpus_only=False)
+    # Revoga RDC 301, que revoga RDC 17; complementa a Lei 6.437; citações simples não contam
+    assert graph.amended_by("RDC_658_2022") == ["Lei_6437_1977", "RDC_17_2010", "RDC_301_2019"]
+    assert graph.reachable("RDC_17_2010", reverse=True) == ["RDC_301_2019", "RDC_658_2022"]
+    with pytest.raises(KeyError):
+        graph.neighbors("RDC_999_2000")
+
+def test_save_and_load_round_trip(graph, tmp_path):
+    path = str(tmp_path / "citation_graph.bin")
+    graph.save(path)
+    loaded = CitationGraph.load(path)
+
+    assert loaded.names == graph.names
+    assert loaded.in_corpus == graph.in_corpus
+    assert loaded.adjacency == graph.adjacency
+    assert loaded.amended_by("RDC_658_2022") == graph.amended_by("RDC_658_2022")
+    assert loaded.cited_by("Portaria 344") == ["RDC_658_2022"]
+    assert os.listdir(tmp_path) == ["citation_graph.bin"]
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"PK\x03\x04")
+    with pytest.raises(ValueError):
+        CitationGraph.load(str(path))
+
+def test_empty_graph_round_trip(tmp_path):
+    path = str(tmp_path / "empty.bin")
+    CitationGraph.from_legislation_map({}).save(path)
+    assert CitationGraph.load(path).names == []
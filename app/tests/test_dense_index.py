@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import dense_index
+from dense_index import DenseIndex, HashingEncoder, _bucket, build_index
+from jsonl_corpus import save_legislation
+from search_index import CURRENT_FILE, generation_dir
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "rdc_segmenter.json"), "r", encoding="utf-8") as f:
+    LEGISLATION = json.load(f)
+
+DOCUMENTS = {
+    "RDC_1_2020": "Rotulagem nutricional de alimentos embalados e tabela de informação nutricional.",
+    "RDC_2_2020": "Boas práticas de fabricação de medicamentos e controle de qualidade dos lotes.",
+    "RDC_3_2020": "Gerenciamento de resíduos de serviços de saúde e descarte de materiais.",
+}
+
+def _save_corpus(corpus_dir, documents):
+    os.makedirs(corpus_dir, exist_ok=True)
+    for name, text in documents.items():
+        legislation = {"header": "Dispõe sobre o tema.", "art1": {"chapter": None, "section": None, "text": text}}
+        save_legislation(legislation, os.path.join(corpus_dir, f"{name}.jsonl"), "jsonl")
+
+@pytest.fixture
+def index_dir(tmp_path):
+    _save_corpus(str(tmp_path / "corpus"), DOCUMENTS)
+    build_index(str(tmp_path / "corpus"), str(tmp_path / "index"))
+    return str(tmp_path / "index")
+
+def test_hashing_encoder_is_deterministic_and_normalized():
+    encoder = HashingEncoder(dim=64)
+    first = encoder.encode(["Boas práticas de fabricação"])
+    second = HashingEncoder(dim=64).encode(["boas praticas fabricacao"])
+    assert first.shape == (1, 64) and np.allclose(first, second)
+    assert np.isclose(np.linalg.norm(first), 1.0)
+    assert not encoder.encode([""]).any()
+    assert encoder.features("boas práticas") == ["boa", "pratic", "boa pratic"]
+
+def test_idf_table_weights_rare_features_higher():
+    encoder = HashingEncoder(dim=64, idf_buckets=1 << 12).fit(["comum raro", "comum", "comum"])
+    common, rare, absent = (_bucket(encoder.features(word)[0], 64, 1 << 12)[2] for word in ("comum", "raro", "ausente"))
+    assert encoder.idf.shape == (1 << 12,) and encoder.idf.dtype == np.float32
+    assert encoder.idf[common] < encoder.idf[rare] < encoder.idf[absent]
+
+def test_build_load_query_returns_nearest_document(index_dir):
+    index = DenseIndex(index_dir)
+    assert [hit.document for hit in index.search("fabricação de medicamentos", k=3)][0] == "RDC_2_2020"
+    assert index.search("resíduos de saúde", k=1)[0][:3] == ("RDC_3_2020", "art1", "text")
+    hits = index.search_many(["rotulagem de alimentos", "controle de qualidade"], k=1)
+    assert [batch[0].document for batch in hits] == ["RDC_1_2020", "RDC_2_2020"]
+    # A matriz é gravada no .npy (float16) e aberta mapeada; o IDF vem de idf.npy
+    assert isinstance(index.vectors, np.memmap) and index.vectors.dtype == np.float16
+    assert index.vectors.shape == (len(index.ids), dense_index.DEFAULT_DIM)
+    assert isinstance(index.encoder.idf, np.memmap) and index.encoder.idf.shape == (dense_index.IDF_BUCKETS,)
+
+def test_blockwise_top_k_matches_full_ranking(tmp_path, monkeypatch):
+    corpus_dir = str(tmp_path / "corpus")
+    _save_corpus(corpus_dir, DOCUMENTS)
+    save_legislation(LEGISLATION, os.path.join(corpus_dir, "RDC_658_2022.jsonl"), "jsonl")
+    build_index(corpus_dir, str(tmp_path / "index"), dtype="float32", batch_size=4)
+    index = DenseIndex(str(tmp_path / "index"))
+    queries = index.encoder.encode(["medicamentos", "farmácias", "rotulagem"])
+    full = queries @ np.asarray(index.vectors).T
+
+    monkeypatch.setattr(dense_index, "BLOCK_ROWS", 3)
+    rows, scores = index.search_vectors(queries, k=5)
+    # Mesmos scores do ranking completo (empates podem trocar a ordem das linhas)
+    assert np.allclose(scores, -np.sort(-full, axis=1)[:, :5])
+    assert np.allclose(np.take_along_axis(full, rows, axis=1), scores)
+    assert all(len(set(row)) == 5 for row in rows.tolist())
+
+def test_rebuild_replaces_index_atomically(tmp_path, index_dir):
+    opened = DenseIndex(index_dir)
+    first = generation_dir(index_dir)
+
+    _save_corpus(str(tmp_path / "corpus"), {"RDC_2_2020": "Vigilância de cosméticos."})
+    os.remove(tmp_path / "corpus" / "RDC_1_2020.jsonl")
+    build_index(str(tmp_path / "corpus"), index_dir)
+
+    # O índice aberto continua com a geração anterior inteira (vetores e ids do mesmo build)
+    assert len(opened.ids) == 6 and opened.search("rotulagem de alimentos", k=1)[0].document == "RDC_1_2020"
+    reopened = DenseIndex(index_dir)
+    assert generation_dir(index_dir) != first
+    assert len(reopened.ids) == len(reopened.vectors) == 4
+    assert {hit.document for hit in reopened.search("rotulagem de alimentos")} == {"RDC_2_2020", "RDC_3_2020"}
+    assert sorted(os.listdir(index_dir)) == sorted([CURRENT_FILE, os.path.basename(first),
+                                                    os.path.basename(generation_dir(index_dir))])
@@ -0,0 +1,297 @@
+import os
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("urllib3")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import download_convert
+from blob_store import BlobStore
+from download_convert import HostPool, DownloadManifest, download_documents, download_file, fetch
+from text_normalization import NORMALIZATION_VERSION
+
+HTML = b"<html><body><p>Art. 1 Texto da norma.</p></body></html>"
+ETAG = '"v1"'
+PAGES = ["Art. 1 Texto da primeira pagina.", "Art. 2 Texto da segunda pagina.", "Art. 3 Texto da terceira pagina."]
+
+def make_pdf(pages):
+    """PDF mínimo (uma linha de texto Helvetica por página), com a tabela xref calculada"""
+    count = len(pages)
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(count))
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", f"<< /Type /Pages /Kids [{kids}] /Count {count} >>".encode()]
+    font = 3 + 2 * count
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+PDF = make_pdf(PAGES)
+
+class Server:
+    """Servidor HTTP local: registra cada requisição e responde conforme `behavior`"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.active = 0
+        self.max_active = 0
+        self.delay = 0.0
+        self.failures = 0  # Respostas 503 antes da primeira 200
+        self.conditional = []  # If-None-Match recebido em cada requisição
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server.lock:
+                    server.hits[self.path] = server.hits.get(self.path, 0) + 1
+                    hit = server.hits[self.path]
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    server.conditional.append(self.headers.get("If-None-Match"))
+                try:
+                    time.sleep(server.delay)
+                    if hit <= server.failures:
+                        self._reply(503, b"")
+                    elif self.headers.get("If-None-Match") == ETAG:
+                        self._reply(304, None)
+                    elif self.path.endswith(".pdf"):
+                        self._reply(200, PDF, "application/pdf")
+                    else:
+                        self._reply(200, HTML)
+                finally:
+                    with server.lock:
+                        server.active -= 1
+
+            def _reply(self, status, body, content_type="text/html; charset=utf-8"):
+                self.send_response(status)
+                self.send_header("ETag", ETAG)
+                if body is not None:
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    server = Server()
+    yield server
+    server.close()
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_convert, "TEXT_DIR", str(tmp_path / "texts"))
+    os.makedirs(tmp_path / "texts")
+    return tmp_path
+
+def test_download_respects_per_host_limit(server, data_dir):
+    server.delay = 0.2
+    documents = [{"name": f"RDC_{i}_2020", "link": f"{server.url}/doc/{i}"} for i in range(8)]
+
+    results = download_documents(documents, max_workers=8, max_per_host=2, convert=False,
+                                 manifest_path=str(data_dir / "manifest.json"), store_dir=str(data_dir / "blobs"))
+
+    assert all(path is not None and os.path.exists(path) for path in results.values())
+    assert len(results) == 8
+    assert server.max_active == 2
+
+def test_fetch_retries_transient_errors(server):
+    server.failures = 2
+    pool = HostPool()
+    try:
+        response = fetch(f"{server.url}/doc", pool, backoff=0)
+        with response:
+            assert response.status_code == 200
+    finally:
+        pool.close()
+    assert server.hits["/doc"] == 3
+
+def test_fetch_releases_host_slot_while_backing_off(server):
+    server.failures = 1
+    pool = HostPool(max_per_host=1)
+    url = f"{server.url}/doc"
+    slot = pool.slot(url)
+    statuses = []
+
+    def retrying():
+        with slot:
+            with fetch(url, pool, backoff=1.0, slot=slot) as response:
+                statuses.append(response.status_code)
+
+    thread = threading.Thread(target=retrying)
+    try:
+        thread.start()
+        time.sleep(0.3)
+        # Durante a espera de 1s, o único slot do host está livre para outra requisição
+        assert slot.acquire(timeout=0.5)
+        slot.release()
+        thread.join(5)
+    finally:
+        pool.close()
+    assert statuses == [200] and server.hits["/doc"] == 2
+
+def test_fetch_returns_last_response_when_retries_run_out(server):
+    server.failures = 10
+    pool = HostPool()
+    try:
+        response = fetch(f"{server.url}/doc", pool, retries=2, backoff=0)
+        with response:
+            assert response.status_code == 503
+    finally:
+        pool.close()
+    assert server.hits["/doc"] == 3
+
+def _converted(data_dir, manifest, name, url):
+    """Estado de um documento já baixado e convertido em uma execução anterior"""
+    with open(os.path.join(download_convert.TEXT_DIR, f"{name}.txt"), "w", encoding="utf-8") as f:
+        f.write("Art. 1 Texto da norma.")
+    manifest.update(name, url=url, etag=ETAG, normalization=NORMALIZATION_VERSION)
+
+def test_not_modified_reuses_blob(server, data_dir):
+    url = f"{server.url}/doc"
+    manifest = DownloadManifest(str(data_dir / "manifest.json"))
+    store = BlobStore(str(data_dir / "blobs"))
+    blob_path = download_file("RDC_1_2020", url, manifest=manifest, store=store, convert=False)
+    _converted(data_dir, manifest, "RDC_1_2020", url)
+
+    assert download_file("RDC_1_2020", url, manifest=manifest, store=store, convert=False) == blob_path
+    assert server.conditional == [None, ETAG]
+
+def test_not_modified_without_blob_downloads_again(server, data_dir):
+    # O manifesto registra o documento, mas o BlobStore não tem o corpo (ex.: pasta de blobs apagada)
+    url = f"{server.url}/doc"
+    manifest = DownloadManifest(str(data_dir / "manifest.json"))
+    store = BlobStore(str(data_dir / "blobs"))
+    _converted(data_dir, manifest, "RDC_1_2020", url)
+
+    blob_path = download_file("RDC_1_2020", url, manifest=manifest, store=store, convert=False)
+
+    assert server.conditional == [None]
+    assert blob_path == store.path(store.resolve("RDC_1_2020"))
+    with open(blob_path, "rb") as f:
+        assert f.read() == HTML
+
+def _text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def test_convert_html(server, data_dir):
+    pytest.importorskip("bs4")
+    results = download_documents([{"name": "RDC_1_2020", "link": f"{server.url}/doc"}], convert=True,
+                                 manifest_path=str(data_dir / "manifest.json"), store_dir=str(data_dir / "blobs"))
+
+    assert _text(results["RDC_1_2020"]).strip() == "Art. 1 Texto da norma."
+
+def test_convert_pdf_in_page_ranges(server, data_dir, monkeypatch):
+    pytest.importorskip("pypdf")
+    # Uma página por tarefa: cada página é extraída por um worker isolado e os parciais são concatenados em ordem
+    monkeypatch.setattr(download_convert, "PAGES_PER_TASK", 1)
+    store = BlobStore(str(data_dir / "blobs"))
+
+    text_path = download_file("RDC_2_2020", f"{server.url}/doc.pdf", store=store, convert=True)
+
+    assert [line.strip() for line in _text(text_path).splitlines() if line.strip()] == PAGES
+    assert not [name for name in os.listdir(download_convert.TEXT_DIR) if name.endswith(".part")]
+    assert store.history("RDC_2_2020")[-1]["content_type"] == "application/pdf"
+
+def test_conversion_reused_per_blob(server, data_dir, monkeypatch):
+    pytest.importorskip("pypdf")
+    calls = []
+    convert_pdf = download_convert.convert_pdf_to_text
+    monkeypatch.setattr(download_convert, "convert_pdf_to_text", lambda *args: calls.append(args) or convert_pdf(*args))
+    # Mesmo conteúdo sob dois nomes (e duas URLs): um único blob, convertido uma única vez
+    documents = [{"name": name, "link": f"{server.url}/{name}.pdf"} for name in ("RDC_3_2020", "RDC_4_2020")]
+
+    results = download_documents(documents, convert=True, manifest_path=str(data_dir / "manifest.json"),
+                                 store_dir=str(data_dir / "blobs"))
+
+    assert len(calls) == 1
+    assert _text(results["RDC_3_2020"]) == _text(results["RDC_4_2020"])
+    store = BlobStore(str(data_dir / "blobs"))
+    assert store.resolve("RDC_3_2020") == store.resolve("RDC_4_2020")
+    assert store.get_conversion(store.resolve("RDC_3_2020"), NORMALIZATION_VERSION)
+
+def test_convert_falls_back_to_next_extractor(server, data_dir, monkeypatch):
+    pytest.importorskip("pypdf")
+    monkeypatch.setitem(download_convert.EXTRACTORS["pdf"], "broken", (failing_extractor, None))
+    monkeypatch.setattr(download_convert, "PDF_BACKENDS", ["broken", "pypdf"])
+
+    text_path = download_file("RDC_5_2020", f"{server.url}/doc.pdf", store=BlobStore(str(data_dir / "blobs")))
+
+    assert "Art. 3 Texto da terceira pagina." in _text(text_path)
+
+def failing_extractor(pdf_path, start, end, out_path):
+    raise RuntimeError("extrator quebrado")
+
+def test_sandbox_enforces_timeout():
+    with pytest.raises(download_convert.ConversionError, match="tempo limite"):
+        download_convert.run_sandboxed(time.sleep, (5,), timeout=0.5)
+
+def test_sandbox_reports_worker_errors():
+    with pytest.raises(download_convert.ConversionError, match="ZeroDivisionError"):
+        download_convert.run_sandboxed(divmod, (1, 0), timeout=30)
+
+class QueuedSlots:
+    """EXTRACT_SLOTS em que a segunda tarefa espera `delay` segundos (atrás de páginas de outros documentos)"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.acquired = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        with self.lock:
+            self.acquired += 1
+            acquired = self.acquired
+        if acquired == 2:
+            time.sleep(self.delay)
+
+    def __exit__(self, *exc):
+        pass
+
+def test_budget_not_charged_while_waiting_for_a_worker(monkeypatch):
+    # A espera da segunda faixa é maior que o orçamento inteiro, mas não é tempo de extração
+    monkeypatch.setattr(download_convert, "EXTRACT_SLOTS", QueuedSlots(delay=3.0))
+    monkeypatch.setattr(download_convert, "EXTRACT_WORKERS", 1)
+
+    assert download_convert._run_tasks(time.sleep, [(0.1,), (0.1,)], timeout=2.0) == [None, None]
+
+def test_budget_is_the_sum_of_task_times(monkeypatch):
+    monkeypatch.setattr(download_convert, "EXTRACT_SLOTS", threading.BoundedSemaphore(1))
+
+    with pytest.raises(download_convert.ConversionError):
+        download_convert._run_tasks(time.sleep, [(1.0,), (1.0,), (1.0,)], timeout=1.5)
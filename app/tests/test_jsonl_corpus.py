@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from jsonl_corpus import (
+    CorpusReader, from_records, index_path_for, iter_corpus, load_legislation, remove_legislation, save_legislation,
+    to_records,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "rdc_segmenter.json"), "r", encoding="utf-8") as f:
+    LEGISLATION = json.load(f)
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    save_legislation(LEGISLATION, str(tmp_path / "RDC_658_2022.jsonl"), "jsonl")
+    undated = {key: value for key, value in LEGISLATION.items() if key != "date"}
+    save_legislation(undated, str(tmp_path / "RDC_1_2020.jsonl"), "jsonl")
+    return tmp_path
+
+def test_records_round_trip():
+    rebuilt = from_records(to_records("RDC_658_2022", LEGISLATION))
+    assert rebuilt == LEGISLATION
+    assert list(rebuilt) == list(LEGISLATION)  # Mesma ordem de chaves do JSON original
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+def test_save_and_load_are_lossless(tmp_path, output_format):
+    path = str(tmp_path / f"RDC_658_2022.{output_format}")
+    save_legislation(LEGISLATION, path, output_format)
+    loaded = load_legislation(path)
+    assert loaded == LEGISLATION
+    assert list(loaded) == list(LEGISLATION)
+
+@pytest.mark.parametrize("output_format", ["json", "jsonl"])
+def test_failed_save_keeps_previous_output(tmp_path, output_format):
+    path = str(tmp_path / f"RDC_658_2022.{output_format}")
+    save_legislation(LEGISLATION, path, output_format)
+    before = sorted(os.listdir(tmp_path))
+    with pytest.raises(TypeError):
+        save_legislation({"art0": {"text": object()}, **LEGISLATION}, path, output_format)
+    # A saída anterior continua inteira; a nova nunca substitui o arquivo pela metade
+    assert load_legislation(path) == LEGISLATION
+    assert [name for name in sorted(os.listdir(tmp_path)) if not name.endswith(".tmp")] == before
+
+def test_index_offsets_point_at_each_line(corpus_dir):
+    path = str(corpus_dir / "RDC_658_2022.jsonl")
+    with open(index_path_for(path), "r", encoding="utf-8") as f:
+        offsets = json.load(f)
+    with open(path, "rb") as f:
+        data = f.read()
+
+    assert list(offsets) == [record["key"] for record in to_records("RDC_658_2022", LEGISLATION)]
+    position = 0
+    for key, (offset, length) in offsets.items():
+        # Offsets em bytes (o texto tem acentos), linhas contíguas e completas
+        assert offset == position
+        line = data[offset:offset + length]
+        assert line.endswith(b"\n")
+        assert json.loads(line)["key"] == key
+        position += length
+    assert position == len(data)
+
+def test_reader_random_access(corpus_dir):
+    reader = CorpusReader(str(corpus_dir))
+
+    assert reader.documents() == ["RDC_1_2020", "RDC_658_2022"]
+    assert reader.get("RDC_658_2022/art3")["parts"] == {k: v for k, v in LEGISLATION["art3"].items()
+                                                      if k not in ("chapter", "section", "text")}
+    assert reader.get("RDC_658_2022", "anexo_ii")["text"] == LEGISLATION["anexo_ii"]
+    assert reader.get("RDC_658_2022/header")["date"] == LEGISLATION["date"]
+    assert "date" not in reader.get("RDC_1_2020/header")
+    with pytest.raises(KeyError):
+        reader.get("RDC_658_2022/art99")
+
+def test_reader_invalidate_picks_up_rewritten_document(corpus_dir):
+    reader = CorpusReader(str(corpus_dir))
+    assert reader.get("RDC_1_2020/art1")["text"] == LEGISLATION["art1"]["text"]
+
+    changed = {"header": "Dispõe sobre outro tema.", "art1": {"chapter": None, "section": None, "text": "Novo texto."}}
+    save_legislation(changed, str(corpus_dir / "RDC_1_2020.jsonl"), "jsonl")
+    reader.invalidate("RDC_1_2020")
+
+    assert reader.keys("RDC_1_2020") == ["header", "art1"]
+    assert reader.get("RDC_1_2020/art1")["text"] == "Novo texto."
+
+def test_iter_corpus_and_remove(corpus_dir):
+    # Os dois documentos têm as mesmas chaves (só o cabeçalho difere na data)
+    records = list(iter_corpus(str(corpus_dir)))
+    assert len(records) == 2 * len(list(to_records("RDC_658_2022", LEGISLATION)))
+    assert records[0]["document"] == "RDC_1_2020"
+    path = str(corpus_dir / "RDC_1_2020.jsonl")
+    remove_legislation(path)
+    assert not os.path.exists(path) and not os.path.exists(index_path_for(path))
@@ -0,0 +1,46 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import legislation_map
+from legislation_map import analyze_file, analyze_legislation_references
+
+TEXT = (
+    "RDC Nº 5, DE 2 DE JANEIRO DE 2020\n"
+    "Art. 1º Fica revogada a RDC nº 250/2005.\n"
+    "Art. 2º Conforme a Lei nº 6437, de 20 de agosto de 1977, e a Portaria nº 696/MS.\n"
+)
+
+def test_map_keeps_four_element_entries_and_writes_details_apart(tmp_path, monkeypatch):
+    texts = tmp_path / "texts"
+    os.makedirs(texts)
+    (texts / "RDC_5_2020.txt").write_text(TEXT, encoding="utf-8")
+    for name, filename in (("TEXT_DIR", "texts"), ("LEGISLATION_MAP_PATH", "legislation_map.json"),
+                           ("LEGISLATION_DETAILS_PATH", "legislation_map_details.json"),
+                           ("GRAPH_PATH", "citation_graph.bin")):
+        monkeypatch.setattr(legislation_map, name, str(tmp_path / filename))
+
+    assert analyze_legislation_references(workers=1) == []
+
+    with open(tmp_path / "legislation_map.json", "r", encoding="utf-8") as f:
+        references = json.load(f)["RDC_5_2020"]["references"]
+    with open(tmp_path / "legislation_map_details.json", "r", encoding="utf-8") as f:
+        details = json.load(f)["RDC_5_2020"]
+
+    assert [len(entry) for entry in references] == [4, 4]
+    assert [entry[2] for entry in references] == ["revokes", "cites"]
+    assert references[1][0] == ["Lei nº 6437, de 20 de agosto de 1977", "Portaria nº 696/MS"]
+    # Detalhes na mesma ordem das referências; posições relativas à linha da referência
+    assert [detail["forms"] for detail in details] == [["rdc_data", "rdc_numero_ano"], ["lei_data", "portaria_ms"]]
+    term, start, end = details[0]["relations"]["revokes"][0]
+    assert references[0][3][start:end] == term == "revogada"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+def test_analyze_file_returns_references_and_details(tmp_path):
+    path = tmp_path / "RDC_5_2020.txt"
+    path.write_text(TEXT, encoding="utf-8")
+    name, references, details = analyze_file(str(path))
+    assert name == "RDC_5_2020"
+    assert len(references) == len(details) == 2
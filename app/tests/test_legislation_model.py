@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from legislation_model import Annex, Article, Inciso, Legislation, Paragraph, StringPool, load_corpus, measure_memory
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "rdc_segmenter.json"), "r", encoding="utf-8") as f:
+    LEGISLATION = json.load(f)
+
+def _write_corpus(directory, names, legislation=LEGISLATION):
+    for name in names:
+        with open(os.path.join(directory, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(legislation, f, ensure_ascii=False)
+
+def test_round_trip_keeps_values_and_key_order():
+    data = Legislation.from_dict("RDC_658_2022", LEGISLATION).to_dict()
+    assert data == LEGISLATION
+    assert list(data) == list(LEGISLATION)
+    for key, value in LEGISLATION.items():
+        if isinstance(value, dict):
+            assert list(data[key]) == list(value)
+            for child_key, child in value.items():
+                if isinstance(child, dict):
+                    assert list(data[key][child_key]) == list(child)
+
+def test_round_trip_without_date():
+    undated = {key: value for key, value in LEGISLATION.items() if key != "date"}
+    legislation = Legislation.from_dict("RDC_1_2020", undated)
+    assert legislation.date is None
+    assert legislation.to_dict() == undated
+
+def test_model_structure():
+    legislation = Legislation.from_dict("RDC_658_2022", LEGISLATION)
+
+    assert [unit.key for unit in legislation.annexes] == ["anexo_i", "anexo_ii"]
+    assert isinstance(legislation["anexo_i"], Annex)
+    art2 = legislation["art2"]
+    assert isinstance(art2, Article) and (art2.chapter, art2.section) == ("I", "I")
+    assert [inciso.key for inciso in art2.incisos] == ["I", "II", "III"]
+    art3 = legislation["art3"]
+    assert [(p.key, p.incisos is None) for p in art3.paragraphs] == [("p1", True), ("p2", False)]
+    assert all(isinstance(inciso, Inciso) for inciso in art3.paragraphs[1].incisos)
+    assert isinstance(legislation["art4"].children[0], Paragraph) and legislation["art4"].children[0].key == "p"
+
+def test_string_pool_shares_repeated_texts(tmp_path):
+    _write_corpus(str(tmp_path), ["RDC_1_2020", "RDC_2_2020"])
+    corpus = load_corpus(str(tmp_path))
+    first, second = corpus["RDC_1_2020"], corpus["RDC_2_2020"]
+
+    # Textos iguais de documentos diferentes (lidos de arquivos distintos) são o mesmo objeto
+    assert first["art1"].text is second["art1"].text
+    assert first.header is second.header
+    assert first["art3"].paragraphs[1].incisos[0].text is second["art3"].paragraphs[1].incisos[0].text
+    # Chaves e rótulos são internados
+    assert first["art1"].key is sys.intern("art1")
+    assert first["art1"].chapter is second["art1"].chapter
+
+def test_string_pool():
+    pool = StringPool()
+    text = "".join(["Esta Resolução ", "entra em vigor."])
+    same = "".join(["Esta Resolução entra ", "em vigor."])
+    assert text is not same
+    assert pool(text) is text and pool(same) is text
+    assert pool(None) is None
+    assert len(pool) == 1
+
+def test_measure_memory_reports_saving_on_repeated_clauses(tmp_path):
+    _write_corpus(str(tmp_path), [f"RDC_{i}_2020" for i in range(5)])
+    result = measure_memory(str(tmp_path))
+    assert result["model"] < result["dicts"]
+    assert 0 < result["saving"] < 1
@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from pipeline import STAGES, parse_args, plan
+
+def _names(stages):
+    return [stage.name for stage in stages]
+
+def test_plan_pulls_in_dependencies():
+    assert _names(plan(["dense_index"])) == ["download", "text", "preprocess", "references", "dense_index"]
+    assert _names(plan(["map", "search_index"])) == ["download", "text", "map", "preprocess", "references", "search_index"]
+
+def test_only_runs_just_the_targets():
+    args = parse_args(["--only", "search_index", "dense_index"])
+    assert _names(plan(args.targets, with_deps=not args.only)) == ["search_index", "dense_index"]
+
+def test_indexes_depend_on_references():
+    stages = {stage.name: stage for stage in STAGES}
+    assert stages["search_index"].deps == stages["dense_index"].deps == ("references",)
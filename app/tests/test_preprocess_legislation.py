@@ -0,0 +1,58 @@
+import io
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from preprocess_legislation import CHUNK_SIZE, LOOKAHEAD, build_articles, extract_articles, iter_segments, process_legislation
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+TEXT_PATH = os.path.join(FIXTURES, "rdc_segmenter.txt")
+
+with open(TEXT_PATH, "r", encoding="utf-8") as f:
+    TEXT = f.read()
+# Marcadores com NBSP, tabulação e CRLF; a saída esperada é a do segmentador em blocos,
+# que difere da original nesses marcadores (ver iter_segments)
+WHITESPACE_PATH = os.path.join(FIXTURES, "rdc_whitespace.txt")
+with open(WHITESPACE_PATH, "r", encoding="utf-8", newline="") as f:
+    WHITESPACE_TEXT = f.read()
+with open(os.path.join(FIXTURES, "rdc_whitespace.json"), "r", encoding="utf-8") as f:
+    WHITESPACE_EXPECTED = json.load(f)
+# Saída do segmentador original (clean_text + re.split sobre o texto inteiro) para o mesmo texto
+with open(os.path.join(FIXTURES, "rdc_segmenter.json"), "r", encoding="utf-8") as f:
+    EXPECTED = json.load(f)
+
+# Blocos de 1 caractere, um bloco que termina no meio de "Art. 2º", blocos menores e maiores
+# que a margem LOOKAHEAD e o texto inteiro em um bloco só
+SPLIT_MARKER = TEXT.index("Art. 2º") + 3
+CHUNK_SIZES = [1, 2, 7, SPLIT_MARKER, LOOKAHEAD - 1, LOOKAHEAD + 1, 500, CHUNK_SIZE]
+
+def test_extract_articles_matches_original_segmenter():
+    assert extract_articles(TEXT) == EXPECTED
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_segmenter_is_invariant_to_chunk_size(chunk_size):
+    assert build_articles(iter_segments(io.StringIO(TEXT), chunk_size)) == EXPECTED
+
+def test_process_legislation_streams_file():
+    assert process_legislation(TEXT_PATH, chunk_size=SPLIT_MARKER) == EXPECTED
+
+def test_marker_split_across_chunks_is_recognized():
+    assert TEXT[SPLIT_MARKER - 3:SPLIT_MARKER] == "Art"
+    markers = [segment.marker for segment in iter_segments(io.StringIO(TEXT), SPLIT_MARKER)]
+    assert "Art. 2º" in markers
+
+@pytest.mark.parametrize("chunk_size", [1, 5, LOOKAHEAD + 1, CHUNK_SIZE])
+def test_markers_with_nbsp_tab_and_crlf(chunk_size):
+    assert "\r\n" in WHITESPACE_TEXT and "\xa0" in WHITESPACE_TEXT and "\t" in WHITESPACE_TEXT
+    articles = build_articles(iter_segments(io.StringIO(WHITESPACE_TEXT), chunk_size))
+    assert articles == WHITESPACE_EXPECTED
+    # Chaves sem NBSP nem "\r" (o re.split original gerava "art\xa02", "p\xa01" e "art\r3")
+    assert [key for key in articles if key.startswith("art")] == ["art1", "art2", "art3"]
+    assert list(articles["art2"]) == ["chapter", "section", "text", "p1", "p"]
+
+def test_crlf_file_is_read_with_universal_newlines():
+    assert process_legislation(WHITESPACE_PATH) == WHITESPACE_EXPECTED
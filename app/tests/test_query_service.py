@@ -0,0 +1,121 @@
+import os
+import sys
+import json
+import time
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import query_service
+from jsonl_corpus import save_legislation
+from search_index import SearchIndex, build_index
+from query_service import QueryService
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "rdc_segmenter.json"), "r", encoding="utf-8") as f:
+    LEGISLATION = json.load(f)
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    # Sem grafo de citações: os caminhos padrão apontam para a pasta temporária vazia
+    monkeypatch.setattr(query_service, "GRAPH_PATH", str(tmp_path / "citation_graph.bin"))
+    monkeypatch.setattr(query_service, "LEGISLATION_MAP_PATH", str(tmp_path / "legislation_map.json"))
+    corpus_dir, index_dir = tmp_path / "corpus", tmp_path / "index"
+    os.makedirs(corpus_dir)
+    save_legislation(LEGISLATION, str(corpus_dir / "RDC_658_2022.jsonl"), "jsonl")
+    build_index(str(corpus_dir), str(index_dir))
+    return QueryService(str(corpus_dir), str(index_dir))
+
+async def _serve(service):
+    await service.load()
+    return await asyncio.start_server(service.handle, "127.0.0.1", 0, limit=query_service.MAX_HEADER_BYTES)
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:] if line)
+    body = await reader.readexactly(int(headers["Content-Length"]))
+    return int(lines[0].split(" ")[1]), headers, json.loads(body) if body else None
+
+def _run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 30))
+
+def test_keep_alive_post_body_is_discarded(service):
+    async def scenario():
+        server = await _serve(service)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = b"GET /documents HTTP/1.1\r\n\r\n"  # Um corpo que pareceria uma requisição se não fosse lido
+        writer.write(b"POST /search HTTP/1.1\r\nHost: x\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+        writer.write(b"GET /RDC_658_2022/art1 HTTP/1.1\r\nHost: x\r\n\r\n")
+        await writer.drain()
+        first = await _read_response(reader)
+        second = await _read_response(reader)
+        writer.close()
+        server.close()
+        await server.wait_closed()
+        return first, second, service.requests
+
+    (status, headers, _), (status2, _, payload), requests = _run(scenario())
+    assert (status, headers["Connection"]) == (405, "keep-alive")
+    assert status2 == 200 and payload["value"]["text"] == LEGISLATION["art1"]["text"]
+    assert requests == 2
+
+def test_unreadable_body_closes_connection(service):
+    async def scenario():
+        server = await _serve(service)
+        port = server.sockets[0].getsockname()[1]
+        results = []
+        for head in (b"Transfer-Encoding: chunked", b"Content-Length: %d" % (query_service.MAX_BODY_BYTES + 1)):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"POST / HTTP/1.1\r\nHost: x\r\n%s\r\n\r\n" % head)
+            await writer.drain()
+            status, headers, _ = await _read_response(reader)
+            results.append((status, headers["Connection"], await reader.read()))
+            writer.close()
+        server.close()
+        await server.wait_closed()
+        return results
+
+    assert _run(scenario()) == [(405, "close", b""), (405, "close", b"")]
+
+def test_slow_search_does_not_block_other_connections(service, monkeypatch):
+    search = SearchIndex.search
+
+    def slow_search(self, query, k=10):
+        time.sleep(1.0)
+        return search(self, query, k)
+
+    monkeypatch.setattr(SearchIndex, "search", slow_search)
+
+    async def get(port, target):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        response = await _read_response(reader)
+        writer.close()
+        return response, time.perf_counter()
+
+    async def scenario():
+        server = await _serve(service)
+        port = server.sockets[0].getsockname()[1]
+        start = time.perf_counter()
+        slow = asyncio.create_task(get(port, "/search?q=medicamentos"))
+        await asyncio.sleep(0.1)
+        (status, _, _), fast_done = await get(port, "/documents")
+        (slow_status, _, hits), slow_done = await slow
+        # A mesma busca agora vem do LRU, sem passar pela busca lenta
+        cached_start = time.perf_counter()
+        (_, _, cached), cached_done = await get(port, "/search?q=medicamentos")
+        server.close()
+        await server.wait_closed()
+        return status, fast_done - start, slow_status, slow_done - start, hits, cached, cached_done - cached_start
+
+    status, fast, slow_status, slow, hits, cached, cached_time = _run(scenario())
+    assert status == 200 and slow_status == 200
+    assert fast < 0.8 < slow
+    assert hits["hits"] and cached == hits and cached_time < 0.8
+    assert service.snapshot.cache.info()["hits"] == 1
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from jsonl_corpus import save_legislation
+from search_index import (
+    CURRENT_FILE, SearchIndex, _decode_postings, _encode_varint, build_index, generation_dir, stem, tokenize,
+)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+with open(os.path.join(FIXTURES, "rdc_segmenter.json"), "r", encoding="utf-8") as f:
+    LEGISLATION = json.load(f)
+
+def _document(*articles):
+    return {"header": "Dispõe sobre o tema.", **{
+        f"art{number}": {"chapter": None, "section": None, "text": text} for number, text in enumerate(articles, 1)
+    }}
+
+def test_tokenize_removes_accents_stopwords_and_inflection():
+    assert tokenize("As Resoluções da ANVISA") == tokenize("resolução anvisa")
+    assert tokenize("de que para com") == []
+    # stem recebe o texto já sem acentos (tokenize)
+    assert stem("nacionais") == stem("nacional") and stem("papeis") == stem("papel")
+    assert stem("medicamentos") == stem("medicamento") == "medicament"
+    assert stem("2022") == "2022"
+
+@pytest.mark.parametrize("values", [[0], [1, 127, 128, 16383, 16384, 2 ** 32 + 5]])
+def test_varint_postings_round_trip(values):
+    postings = [(unit_id, frequency) for unit_id, frequency in zip(values, reversed(values))]
+    postings.sort()
+    buffer = bytearray()
+    previous = 0
+    for unit_id, frequency in postings:
+        _encode_varint(unit_id - previous, buffer)
+        _encode_varint(frequency, buffer)
+        previous = unit_id
+    assert _decode_postings(bytes(buffer), 0, len(postings)) == postings
+
+def test_bm25_ranks_frequent_term_in_short_unit_first(tmp_path):
+    corpus_dir, index_dir = tmp_path / "corpus", tmp_path / "index"
+    os.makedirs(corpus_dir)
+    save_legislation(_document(
+        "Ficam proibidos os medicamentos sem registro.",
+        "Os medicamentos e os medicamentos genéricos seguem as regras de rotulagem.",
+        "A rotulagem de alimentos segue a norma específica, com prazos, anexos, tabelas e modelos.",
+    ), str(corpus_dir / "RDC_1_2020.jsonl"), "jsonl")
+    build_index(str(corpus_dir), str(index_dir))
+
+    with SearchIndex(str(index_dir)) as index:
+        hits = index.search("medicamento")
+        assert [hit.article for hit in hits] == ["art2", "art1"]
+        assert hits[0].score > hits[1].score > 0
+        assert [hit.article for hit in index.search("rotulagem de alimentos", k=1)] == ["art3"]
+        assert index.search("inexistente") == []
+
+def test_rebuild_publishes_a_new_generation_atomically(tmp_path):
+    corpus_dir, index_dir = tmp_path / "corpus", tmp_path / "index"
+    os.makedirs(corpus_dir)
+    save_legislation(LEGISLATION, str(corpus_dir / "RDC_658_2022.jsonl"), "jsonl")
+    build_index(str(corpus_dir), str(index_dir))
+    first = generation_dir(str(index_dir))
+    opened = SearchIndex(str(index_dir))
+    before = opened.search("medicamentos")
+
+    save_legislation(_document("Texto sobre cosméticos."), str(corpus_dir / "RDC_658_2022.jsonl"), "jsonl")
+    build_index(str(corpus_dir), str(index_dir))
+    second = generation_dir(str(index_dir))
+
+    # O índice aberto continua lendo a geração anterior, inteira; um novo vê só a nova
+    assert second != first and os.path.isdir(first)
+    assert opened.search("medicamentos") == before and before
+    opened.close()
+    with SearchIndex(str(index_dir)) as index:
+        assert index.search("medicamentos") == [] and index.search("cosméticos")
+
+    # A terceira construção remove a primeira geração e mantém a anterior
+    build_index(str(corpus_dir), str(index_dir))
+    assert not os.path.exists(first) and os.path.isdir(second)
+    assert sorted(os.listdir(index_dir)) == sorted([CURRENT_FILE, os.path.basename(second),
+                                                    os.path.basename(generation_dir(str(index_dir)))])
+
+def test_legacy_index_without_generations_is_still_read(tmp_path):
+    corpus_dir, index_dir = tmp_path / "corpus", tmp_path / "index"
+    os.makedirs(corpus_dir)
+    save_legislation(LEGISLATION, str(corpus_dir / "RDC_658_2022.jsonl"), "jsonl")
+    build_index(str(corpus_dir), str(index_dir))
+    generation = generation_dir(str(index_dir))
+    for name in os.listdir(generation):
+        os.replace(os.path.join(generation, name), os.path.join(index_dir, name))
+    os.rmdir(generation)
+    os.remove(os.path.join(index_dir, CURRENT_FILE))
+
+    with SearchIndex(str(index_dir)) as index:
+        assert index.search("medicamentos")
+    build_index(str(corpus_dir), str(index_dir))
+    assert sorted(os.listdir(index_dir)) == [CURRENT_FILE, os.path.basename(generation_dir(str(index_dir)))]
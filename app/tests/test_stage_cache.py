@@ -0,0 +1,49 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from stage_cache import StageCache
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+def _run(cache_dir, fingerprint, outputs, processed):
+    """Uma execução do estágio: refaz as entradas de `processed` que não estão atuais"""
+    cache = StageCache("stage", fingerprint, str(cache_dir))
+    fresh = {}
+    for input_path, output_path in outputs.items():
+        fresh[input_path] = cache.is_fresh(input_path, output_path)
+        if not fresh[input_path] and input_path in processed:
+            _write(output_path, fingerprint)
+            cache.record(input_path, output_path)
+    removed = cache.prune(outputs)
+    cache.save()
+    return fresh, removed
+
+def test_unchanged_inputs_are_fresh(tmp_path):
+    outputs = {_write(tmp_path / "a.txt", "a"): str(tmp_path / "a.json")}
+    assert _run(tmp_path / "cache", "v1", outputs, outputs) == (dict.fromkeys(outputs, False), [])
+    assert _run(tmp_path / "cache", "v1", outputs, outputs) == (dict.fromkeys(outputs, True), [])
+    _write(next(iter(outputs)), "changed")
+    assert _run(tmp_path / "cache", "v1", outputs, outputs)[0] == dict.fromkeys(outputs, False)
+
+def test_entries_not_redone_after_fingerprint_change_stay_tracked(tmp_path):
+    a, b = _write(tmp_path / "a.txt", "a"), _write(tmp_path / "b.txt", "b")
+    outputs = {a: str(tmp_path / "a.json"), b: str(tmp_path / "b.json")}
+    _run(tmp_path / "cache", "v1", outputs, outputs)
+
+    # Com o código novo, b falha: a saída antiga continua no disco
+    fresh, _ = _run(tmp_path / "cache", "v2", outputs, {a})
+    assert fresh == {a: False, b: False}
+    # Na execução seguinte (mesmo fingerprint), b não é tomada como atual
+    fresh, _ = _run(tmp_path / "cache", "v2", outputs, set())
+    assert fresh == {a: True, b: False}
+
+    # Quando b deixa de existir, prune ainda remove a saída gerada pelo fingerprint anterior
+    os.remove(b)
+    del outputs[b]
+    _, removed = _run(tmp_path / "cache", "v2", outputs, set())
+    assert removed == [str(tmp_path / "b.json")] and not os.path.exists(tmp_path / "b.json")